@@ -2,11 +2,20 @@
 # All rights reserved.
 # Distributed under the terms of the Modified BSD License.
 
-from .agent import Agent, SelfNamingAgent, TwoStageAgent, IdentifierHelper
+from .agent import Agent, SelfNamingAgent, TwoStageAgent, IdentifierHelper, AgentStore, BatchAgent
+from .analysis import RegionCounter
 from .environment import Environment, NullEnvironment, NetworkEnvironment
-from .observer import Observer, ChainedObserver, KeyPauseObserver, PauseObserver, PauseAtEndObserver
+from .network import CSRNetwork
+from .observer import Observer, ChainedObserver, KeyPauseObserver, PauseObserver, PauseAtEndObserver,\
+    RecorderObserver, AsyncObserver, TrajectoryObserver, TrajectoryReader
+from .runner import Runner, RunResults
 from .scheduling import Scheduler, BasicScheduler, RandomOrderScheduler, RandomSampleScheduler,\
-    BernoulliScheduler, FastBernoulliScheduler
-from .simulation import Simulation, BasicSimulation, TwoStageSimulation
-from .space import Grid
-from .time import Time, BasicTime, InfiniteTime, Terminator, ScheduledTime
+    WeightedSampleScheduler, EpochSampleScheduler, BernoulliScheduler, FastBernoulliScheduler,\
+    StreamingBernoulliScheduler, NextReactionScheduler, EventScheduler, ColoringScheduler, BatchSchedule,\
+    ActiveSetScheduler
+from .simulation import Simulation, BasicSimulation, TwoStageSimulation, EventSimulation
+from .space import Grid, Neighborhood, MooreNeighborhood, VonNeumannNeighborhood,\
+    ContinuousSpace, FieldLayer
+from .sweep import Design, FullFactorialDesign, LatinHypercubeDesign, SobolDesign, ResultTable, Sweep
+from .time import Time, BasicTime, InfiniteTime, Terminator, ScheduledTime, DeadlineTerminator, EventTime,\
+    StableTerminator, EdgeTerminator
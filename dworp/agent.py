@@ -44,6 +44,9 @@ class Agent(ABC):
 
     def __init__(self, agent_id, size):
         self.agent_id = agent_id
+        # set when the agent is added to an AgentStore
+        self._store = None
+        self._row = None
         if size > 0:
             self.state = np.zeros(size, dtype='f')
         else:
@@ -72,6 +75,9 @@ class Agent(ABC):
         Args:
             now (int, float): Current time of the simulation
             env (Environment): environment object
+
+        Returns:
+            Optional time of the agent's next activation (only used by EventSimulation)
         """
         pass
 
@@ -111,6 +117,9 @@ class TwoStageAgent(Agent):
     Then the future state is copied to their public state at the end of time step.
     This solves the problem of the order of agent updates mattering with respect to neighbors.
 
+    When the agent belongs to a two stage AgentStore, state and next_state are rows
+    of the store's two buffers and the store copies the rows to complete a time step.
+
     Args:
         agent_id (int, str): unique identifier for the agent
         size (int): length of the state vector (must be > 0)
@@ -142,11 +151,255 @@ class TwoStageAgent(Agent):
         """Complete a time step
 
         This copies the next state to current state.
+        Agents in a two stage AgentStore skip this because the store copies all the rows at once.
 
         Args:
             now (int, float): Current time of the simulation
             env (Environment): environment object
         """
-        # Could replace with reference swap
         if self.state is not None:
             np.copyto(self.state, self.next_state)
+
+
+class BatchAgent(Agent):
+    """Agent whose class updates a whole cohort of agents in one call
+
+    Implement step_batch() as vectorized operations on the state array of an AgentStore.
+    When the agents are in an AgentStore, the simulation groups the schedule by class
+    and calls step_batch() once per class each time step.
+    Agents that only implement step() can be mixed with batch agents.
+    For a two stage update, also inherit from TwoStageAgent and use a two stage AgentStore:
+        class MyAgent(BatchAgent, TwoStageAgent)
+
+    Args:
+        agent_id (int, str): unique identifier for the agent
+        size (int): length of the state vector
+
+    Attributes:
+        agent_id (int, str): unique identifier for the agent
+        state (np.array): public state vector
+    """
+    @classmethod
+    @abstractmethod
+    def step_batch(cls, now, env, agents, indices):
+        """Update the state of a cohort of agents of this class
+
+        Args:
+            now (int, float): Current time of the simulation
+            env (Environment): environment object
+            agents (AgentStore): the population (use agents.state or agents.next_state)
+            indices (np.array): rows of the agents to update in schedule order
+
+        Returns:
+            Optional array of the agents' next activation times (only used by EventSimulation)
+        """
+        pass
+
+    def step(self, now, env):
+        """Update this agent alone with step_batch()
+
+        The agent must belong to an AgentStore.
+        """
+        assert(self._store is not None)
+        next_times = type(self).step_batch(now, env, self._store, np.array([self._row]))
+        return None if next_times is None else next_times[0]
+
+
+class AgentStore:
+    """Population of agents whose state vectors live in a single array
+
+    Each agent's state is a view of one row of a 2D array so the state of the whole
+    population is one contiguous block of memory.
+    The store acts like the list of agents given to the simulation (row i is agents[i]),
+    so observers, terminators and environments can use a single numpy expression over
+    the state matrix instead of looping over the agents.
+
+    Example:
+        agents = AgentStore(5, [MyAgent(x, 5) for x in range(1000)])
+        avg = agents.state.mean(axis=0)
+
+    A two stage store holds TwoStageAgents and keeps state and next_state in two buffers.
+    Completing a time step copies the next state rows of the agents that were updated
+    to the state buffer with one vectorized copy instead of a pass over the agents.
+    Like a list of agents, the state of agents that were not updated is left alone
+    (including changes made to it by the environment or other agents).
+
+    Adding agents may reallocate the array.
+    The agents' state attributes are updated when that happens,
+    but do not hold onto a reference to an agent's state across additions.
+
+    Args:
+        size (int): length of the state vector of every agent (must be > 0)
+        agents (list): optional initial list of agents
+        capacity (int): optional number of rows to preallocate
+        dtype (str, np.dtype): data type of the state (default is float32 like Agent)
+        two_stage (bool): whether to double buffer the state of TwoStageAgents
+
+    Attributes:
+        state (np.array): num_agents x size array of the agents' public state
+        next_state (np.array): num_agents x size array of next state (two stage only)
+    """
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, size, agents=None, capacity=0, dtype='f', two_stage=False):
+        assert(size > 0)
+        agents = list(agents) if agents else []
+        self.size = size
+        self.two_stage = two_stage
+        self.agents = []
+        capacity = max(capacity, len(agents), 1)
+        self.buffers = [np.zeros((capacity, size), dtype=dtype) for _ in range(2 if two_stage else 1)]
+        # whether each agent has its own complete() that must still be called
+        self.completes = np.zeros(capacity, dtype=bool)
+        # code of each agent's class for grouping a schedule by class
+        self.kinds = np.zeros(capacity, dtype=int)
+        self.classes = []
+        self.extend(agents)
+
+    @property
+    def state(self):
+        return self.buffers[0][:len(self.agents)]
+
+    @property
+    def next_state(self):
+        if not self.two_stage:
+            return None
+        return self.buffers[1][:len(self.agents)]
+
+    def __len__(self):
+        return len(self.agents)
+
+    def __getitem__(self, index):
+        return self.agents[index]
+
+    def __iter__(self):
+        return iter(self.agents)
+
+    def append(self, agent):
+        """Add an agent and move its state into the store
+
+        Args:
+            agent (Agent): agent with a state vector of the store's size
+        """
+        assert(agent.state is not None and agent.state.shape == (self.size,))
+        assert(not self.two_stage or isinstance(agent, TwoStageAgent))
+        row = len(self.agents)
+        if row == self.buffers[0].shape[0]:
+            self._grow(2 * row)
+        for buffer in self.buffers:
+            buffer[row] = agent.state
+        self.completes[row] = type(agent).complete is not TwoStageAgent.complete
+        if type(agent) not in self.classes:
+            self.classes.append(type(agent))
+        self.kinds[row] = self.classes.index(type(agent))
+        self._bind(agent, row)
+        self.agents.append(agent)
+
+    def extend(self, agents):
+        """Add a list of agents"""
+        for agent in agents:
+            self.append(agent)
+
+    def pop(self, index=-1):
+        """Remove and return an agent
+
+        Like list.pop(), the agents after this one shift down one position.
+        The removed agent gets its own copy of its state.
+        """
+        index = range(len(self.agents))[index]
+        agent = self.agents.pop(index)
+        self._unbind(agent)
+        num_agents = len(self.agents)
+        for array in self.buffers + [self.completes, self.kinds]:
+            array[index:num_agents] = array[index + 1:num_agents + 1]
+        for row in range(index, num_agents):
+            self._bind(self.agents[row], row)
+        return agent
+
+    @property
+    def batched(self):
+        """Whether any agent updates with BatchAgent.step_batch()"""
+        return any(issubclass(cls, BatchAgent) for cls in self.classes)
+
+    def step(self, now, env, rows):
+        """Update a cohort of agents grouped by class
+
+        Batch agents of a class are updated with one call to step_batch().
+        Other agents are updated one at a time with step().
+        The classes are processed in the order they first appear in the schedule.
+
+        Args:
+            now (int, float): Current time of the simulation
+            env (Environment): environment object
+            rows (np.array): indices of the agents to update
+
+        Returns:
+            np.array of the next activation times returned by the agents (nan if none)
+        """
+        kinds = self.kinds[rows]
+        next_times = np.full(len(rows), np.nan)
+        _, first = np.unique(kinds, return_index=True)
+        for kind in kinds[np.sort(first)].tolist():
+            cls = self.classes[kind]
+            members = kinds == kind
+            cohort = rows[members]
+            if issubclass(cls, BatchAgent):
+                times = cls.step_batch(now, env, self, cohort)
+                if times is not None:
+                    next_times[members] = times
+            else:
+                times = [self.agents[row].step(now, env) for row in cohort.tolist()]
+                next_times[members] = [np.nan if t is None else t for t in times]
+        return next_times
+
+    def sync(self):
+        """Copy the public state to the next state of every agent
+
+        The simulation calls this after the agents are initialized.
+        """
+        if self.two_stage:
+            np.copyto(self.next_state, self.state)
+
+    def complete(self, now, env, rows):
+        """Complete a time step of a two stage update
+
+        Copies the next state of the updated agents to their state
+        and calls complete() on the agents that implement their own.
+
+        Args:
+            now (int, float): Current time of the simulation
+            env (Environment): environment object
+            rows (np.array): indices of the agents that were updated this time step
+        """
+        self.state[rows] = self.next_state[rows]
+        for row in rows[self.completes[rows]].tolist():
+            self.agents[row].complete(now, env)
+
+    def _bind(self, agent, row):
+        agent._store = self
+        agent._row = row
+        agent.state = self.buffers[0][row]
+        if self.two_stage:
+            agent.next_state = self.buffers[1][row]
+
+    def _unbind(self, agent):
+        state = agent.state.copy()
+        if self.two_stage:
+            agent.next_state = agent.next_state.copy()
+        agent._store = None
+        agent._row = None
+        agent.state = state
+
+    def _grow(self, capacity):
+        num_agents = len(self.agents)
+        for i, buffer in enumerate(self.buffers):
+            self.buffers[i] = np.zeros((capacity, self.size), dtype=buffer.dtype)
+            self.buffers[i][:num_agents] = buffer[:num_agents]
+        completes = np.zeros(capacity, dtype=bool)
+        completes[:num_agents] = self.completes[:num_agents]
+        self.completes = completes
+        kinds = np.zeros(capacity, dtype=int)
+        kinds[:num_agents] = self.kinds[:num_agents]
+        self.kinds = kinds
+        for row, agent in enumerate(self.agents):
+            self._bind(agent, row)
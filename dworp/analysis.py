@@ -0,0 +1,191 @@
+# Copyright 2018, The Johns Hopkins University Applied Physics Laboratory LLC
+# All rights reserved.
+# Distributed under the terms of the Modified BSD License.
+
+import logging
+import numpy as np
+from .network import CSRNetwork
+
+
+class RegionCounter:
+    """Counts the connected regions of neighboring agents with identical state
+
+    Regions are the connected components of the network after removing the edges
+    between agents with different states.
+    They are found with a vectorized union-find over the edges.
+
+    The first call to update() labels every agent.
+    Later calls only relabel the regions that contain or touch agents whose state changed.
+    An index from each region to its members and the network's rows of the relabeled agents
+    keep an update proportional to the size of those regions.
+
+    Example:
+        counter = RegionCounter(env.network)
+        num_regions = counter.update(agents.state)
+
+    Args:
+        network (CSRNetwork): network over the agents (or anything CSRNetwork.from_network accepts)
+
+    Attributes:
+        labels (np.array): region label of each agent (-1 for inactive agents)
+        num_regions (int): number of regions at the last update
+        members (dict): map from region label to array of its agents
+    """
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, network):
+        self.network = CSRNetwork.from_network(network)
+        self.sources = self.network.sources()
+        self.labels = None
+        self.num_regions = 0
+        self.states = None
+        self.active = None
+        self.members = None
+        self.next_label = 0
+        self._scratch = None
+
+    @classmethod
+    def from_grid(cls, grid, neighborhood=None):
+        """Create the counter over the cells of a Grid
+
+        The states are arrays over the flattened cells, like grid.layers['color'].ravel().
+        Pass active=grid.occupancy().ravel() to ignore empty cells.
+
+        Args:
+            grid (Grid): grid
+            neighborhood (Neighborhood): optional neighborhood (default is the grid's)
+        """
+        neighborhood = neighborhood if neighborhood is not None else grid.neighborhood
+        table = neighborhood.table(grid.width, grid.height)
+        sources = np.repeat(np.arange(len(table)), table.shape[1])
+        targets = table.ravel()
+        inside = targets >= 0
+        edges = np.column_stack((sources[inside], targets[inside]))
+        return cls(CSRNetwork.from_edges(edges, len(table), directed=True))
+
+    def count(self, states, active=None):
+        """Count the regions from scratch
+
+        Args:
+            states (np.array): state of each agent (one row per agent)
+            active (np.array): optional boolean array of agents to include
+
+        Returns:
+            int
+        """
+        labels = self._label(np.arange(len(self.network)), self._as_rows(states), active)
+        return len(np.unique(labels[labels >= 0]))
+
+    def update(self, states, active=None, changed=None):
+        """Update the regions after agents changed state
+
+        When changed is given, the work is proportional to the size of the relabeled regions
+        and their edges rather than the whole network.
+
+        Args:
+            states (np.array): state of each agent (one row per agent)
+            active (np.array): optional boolean array of agents to include
+            changed (np.array): optional indices of the agents that changed
+                                (default is to compare with the states at the last update)
+
+        Returns:
+            number of regions
+        """
+        states = self._as_rows(states)
+        if self.labels is None:
+            nodes = np.arange(len(self.network))
+            self.labels = np.full(len(nodes), -1, dtype=np.int64)
+            self.members = {}
+            self.states = states.copy()
+            self.active = np.ones(len(nodes), dtype=bool) if active is None else np.array(active, dtype=bool)
+        else:
+            if changed is None:
+                active_now = np.ones(len(states), dtype=bool) if active is None else np.asarray(active, dtype=bool)
+                changed = np.flatnonzero(np.any(states != self.states, axis=1) | (active_now != self.active))
+            changed = np.unique(np.asarray(changed, dtype=np.int64))
+            self.states[changed] = states[changed]
+            self.active[changed] = True if active is None else np.asarray(active, dtype=bool)[changed]
+            nodes = self._affected(changed)
+        old = np.unique(self.labels[nodes])
+        for region in old[old >= 0].tolist():
+            del self.members[region]
+        self.num_regions -= np.count_nonzero(old >= 0)
+        labels = self._label(nodes, states, self.active)
+        # new labels for the relabeled regions
+        inside = labels >= 0
+        unique, labels[inside] = np.unique(labels[inside], return_inverse=True)
+        labels[inside] += self.next_label
+        self.labels[nodes] = labels
+        self._add_members(nodes[inside], labels[inside])
+        self.next_label += len(unique)
+        self.num_regions += len(unique)
+        return self.num_regions
+
+    def _add_members(self, nodes, labels):
+        if len(labels) == 0:
+            return
+        order = np.argsort(labels, kind='stable')
+        nodes = nodes[order]
+        labels = labels[order]
+        starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+        for start, stop in zip(starts, np.r_[starts[1:], len(labels)]):
+            self.members[int(labels[start])] = nodes[start:stop]
+
+    def _affected(self, changed):
+        # all agents in the old regions of the changed agents and their neighbors
+        touched = np.concatenate((changed, self.network.indices[self.network.edges_of(changed)]))
+        regions = np.unique(self.labels[touched])
+        regions = regions[regions >= 0]
+        return np.unique(np.concatenate([changed] + [self.members[r] for r in regions.tolist()]))
+
+    def _label(self, nodes, states, active):
+        # union-find over the edges between the nodes with identical states
+        # returns the label of each node (index of its root in nodes or -1 if inactive)
+        nodes = np.asarray(nodes, dtype=np.int64)
+        if active is None:
+            selected = np.ones(len(nodes), dtype=bool)
+        else:
+            selected = np.asarray(active, dtype=bool)[nodes]
+        edges = self.network.edges_of(nodes)
+        u = np.repeat(np.arange(len(nodes)), self.network.indptr[nodes + 1] - self.network.indptr[nodes])
+        v = self._positions(nodes, self.network.indices[edges])
+        keep = v >= 0
+        u = u[keep]
+        v = v[keep]
+        keep = selected[u] & selected[v]
+        u = u[keep]
+        v = v[keep]
+        same = np.all(states[nodes[u]] == states[nodes[v]], axis=1)
+        u = u[same]
+        v = v[same]
+
+        parent = np.arange(len(nodes))
+        while True:
+            pu = parent[u]
+            pv = parent[v]
+            different = pu != pv
+            if not np.any(different):
+                break
+            # hook the larger root under the smaller one and then compress the paths
+            np.minimum.at(parent, np.maximum(pu, pv)[different], np.minimum(pu, pv)[different])
+            while True:
+                grandparent = parent[parent]
+                if np.array_equal(grandparent, parent):
+                    break
+                parent = grandparent
+        parent[~selected] = -1
+        return parent
+
+    def _positions(self, nodes, targets):
+        # position of each target in nodes (-1 if not in nodes) using a reused scratch array
+        if self._scratch is None:
+            self._scratch = np.full(len(self.network), -1, dtype=np.int64)
+        self._scratch[nodes] = np.arange(len(nodes))
+        positions = self._scratch[targets]
+        self._scratch[nodes] = -1
+        return positions
+
+    @staticmethod
+    def _as_rows(states):
+        states = np.asarray(states)
+        return states.reshape(len(states), -1)
@@ -5,6 +5,7 @@
 from abc import ABC, abstractmethod
 import logging
 import numpy as np
+from .network import CSRNetwork
 
 
 class Environment(ABC):
@@ -68,10 +69,93 @@ class NullEnvironment(Environment):
 class NetworkEnvironment(Environment):
     """Environment with a network over the agents
 
+    The network can be any object, but a CSRNetwork gives fast access to the neighbors of an agent.
+    If the network is the path of a directory with a saved CSRNetwork, it is opened memory mapped.
+    The neighbor aggregates (sum, mean, count) compute a value for every agent with one pass
+    over the edges of the network (an igraph or networkx network is converted on first use).
+    Node i of the network is agent i.
+
+    In a two stage update, every agent reads the same aggregates, so they can be computed once per step.
+    For example, with an AgentStore named store:
+        count = env.aggregate('shorts', now, lambda: env.neighbor_sum(store.state[:, 0]))
+
     Attributes:
         state (np.array): environment state vector of floats
         network (obj): network object
     """
     def __init__(self, size, network):
         super().__init__(size)
+        if isinstance(network, str):
+            network = CSRNetwork.load(network)
         self.network = network
+        self.aggregates = {}
+        self.aggregate_time = None
+        self._csr = None
+        self._sources = None
+
+    @property
+    def csr(self):
+        """The network as a CSRNetwork"""
+        if self._csr is None:
+            self._csr = CSRNetwork.from_network(self.network)
+        return self._csr
+
+    def neighbor_sum(self, values, weighted=False):
+        """Sum the values of the neighbors of every agent
+
+        Args:
+            values (np.array): value of each agent
+            weighted (bool): whether to multiply the values by the edge weights
+
+        Returns:
+            np.array of sums
+        """
+        network = self.csr
+        if self._sources is None:
+            self._sources = network.sources()
+        contributions = np.asarray(values)[network.indices]
+        if weighted:
+            contributions = contributions * network.weights
+        return np.bincount(self._sources, weights=contributions, minlength=len(network))
+
+    def neighbor_mean(self, values):
+        """Average the values of the neighbors of every agent (0 for agents without neighbors)"""
+        degree = self.csr.degree()
+        return self.neighbor_sum(values) / np.maximum(degree, 1)
+
+    def neighbor_count_equal(self, values, value=None):
+        """Count the neighbors of every agent with a value
+
+        Args:
+            values (np.array): value of each agent
+            value: value to count (default is the agent's own value)
+
+        Returns:
+            np.array of counts
+        """
+        values = np.asarray(values)
+        network = self.csr
+        if value is None:
+            if self._sources is None:
+                self._sources = network.sources()
+            equal = values[network.indices] == values[self._sources]
+            return np.bincount(self._sources, weights=equal, minlength=len(network)).astype(np.int64)
+        return self.neighbor_sum(values == value).astype(np.int64)
+
+    def aggregate(self, name, now, compute):
+        """Compute a value once per time step and return the cached value after that
+
+        Args:
+            name (str): name of the value
+            now (int, float): current time of the simulation
+            compute (callable): function without arguments that computes the value
+
+        Returns:
+            the value returned by compute
+        """
+        if now != self.aggregate_time:
+            self.aggregates = {}
+            self.aggregate_time = now
+        if name not in self.aggregates:
+            self.aggregates[name] = compute()
+        return self.aggregates[name]
@@ -0,0 +1,106 @@
+# Copyright 2018, The Johns Hopkins University Applied Physics Laboratory LLC
+# All rights reserved.
+# Distributed under the terms of the Modified BSD License.
+
+import logging
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Note: do not include this in __init__.py so that dworp does not have a hard requirement
+# for scipy.
+
+
+class KDTreeIndex:
+    """Nearest neighbor queries over the agents of a ContinuousSpace
+
+    The KD-tree is periodic when the space is a torus.
+    It is only rebuilt when an agent has moved more than tolerance since the last build
+    (or agents were added or removed).
+    Queries against an older tree are still exact: extra candidates are fetched from the tree
+    and ranked by their current positions.
+    A tolerance of about the distance an agent moves in a few time steps avoids most rebuilds.
+
+    Args:
+        space (ContinuousSpace): space with the positions of the agents
+        tolerance (float): maximum distance an agent can move before the tree is rebuilt
+    """
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, space, tolerance=0.0):
+        self.space = space
+        self.tolerance = tolerance
+        self.tree = None
+        self.rows = None
+        self.reference = None
+        self.builds = 0
+
+    def query(self, points, k=1):
+        """Find the k nearest agents to each point
+
+        Returns:
+            tuple of distances and agent indices (number of points x k)
+            with inf and -1 where there are fewer than k agents
+        """
+        return self._query(np.asarray(points, dtype=float), k, None)
+
+    def query_agents(self, k=1, indices=None):
+        """Find the k nearest neighbors of agents (not including themselves)
+
+        Args:
+            k (int): number of neighbors
+            indices (np.array): optional agents to query (default is all agents in the space)
+
+        Returns:
+            tuple of distances and agent indices (number of agents x k)
+            with inf and -1 where there are fewer than k neighbors
+        """
+        if indices is None:
+            indices = np.arange(len(self.space))
+        indices = np.asarray(indices, dtype=int)
+        return self._query(self.space.positions[indices], k, indices)
+
+    def _query(self, points, k, exclude):
+        self._refresh()
+        distances = np.full((len(points), k), np.inf)
+        neighbors = np.full((len(points), k), -1, dtype=int)
+        pending = np.arange(len(points))
+        num_candidates = k + (exclude is not None) + 1
+        while len(pending):
+            num_candidates = min(num_candidates, len(self.rows))
+            if num_candidates == 0:
+                break
+            stale, tree_ids = self.tree.query(points[pending], num_candidates)
+            stale = stale.reshape(len(pending), num_candidates)
+            tree_ids = tree_ids.reshape(len(pending), num_candidates)
+            candidates = self.rows[tree_ids]
+            current = self.space.distance(points[pending, np.newaxis], self.space.positions[candidates])
+            if exclude is not None:
+                current[candidates == exclude[pending, np.newaxis]] = np.inf
+            order = np.argsort(current, axis=1, kind='stable')[:, :k]
+            best = np.take_along_axis(current, order, axis=1)
+            # a point that was not a candidate is now at least its old distance minus the tolerance
+            kth = best[:, -1] if best.shape[1] == k else np.full(len(pending), np.inf)
+            done = (stale[:, -1] - self.tolerance >= kth) | (num_candidates == len(self.rows))
+            found = best.shape[1]
+            distances[pending[done], :found] = best[done]
+            neighbors[pending[done], :found] = np.where(np.isinf(best[done]), -1,
+                                                        np.take_along_axis(candidates, order, axis=1)[done])
+            pending = pending[~done]
+            num_candidates *= 2
+        return distances, neighbors
+
+    def _refresh(self):
+        space = self.space
+        rows = np.flatnonzero(space.active)
+        if self.tree is not None and np.array_equal(rows, self.rows):
+            moved = space.distance(space.positions[rows], self.reference)
+            if len(moved) == 0 or moved.max() <= self.tolerance:
+                return
+        positions = space.positions[rows]
+        if space.torus:
+            positions = np.mod(positions, space.size)
+            positions[positions >= space.size] = 0
+        self.tree = cKDTree(positions, boxsize=space.size if space.torus else None)
+        self.rows = rows
+        self.reference = space.positions[rows].copy()
+        self.builds += 1
@@ -0,0 +1,270 @@
+# Copyright 2018, The Johns Hopkins University Applied Physics Laboratory LLC
+# All rights reserved.
+# Distributed under the terms of the Modified BSD License.
+
+import json
+import logging
+import numpy as np
+import os
+import pickle
+
+
+class CSRNetwork:
+    """Network stored as compressed sparse rows of numpy arrays
+
+    The neighbors of node i are indices[indptr[i]:indptr[i + 1]].
+    Nodes are numbered 0 to n-1 which is the index of the node's agent in the agents list.
+    An undirected network stores each edge in both directions.
+
+    Example:
+        network = CSRNetwork.from_network(igraph.Graph.Erdos_Renyi(n=100, p=0.05))
+        for neighbor in network.neighbors(agent.agent_id):
+            ...
+
+    A network can be saved to a directory of .npy files and opened as memory mapped arrays,
+    which is fast for large networks and lets worker processes share the pages of the files.
+
+    Args:
+        indptr (np.array): start of the neighbors of each node (length is number of nodes + 1)
+        indices (np.array): neighbor nodes
+        weights (np.array): optional weight of each edge (aligned with indices)
+        nodes (list): optional labels of the nodes (like the networkx node names)
+    """
+    logger = logging.getLogger(__name__)
+    FORMAT = 'dworp-csr'
+    VERSION = 1
+
+    def __init__(self, indptr, indices, weights=None, nodes=None):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.weights = None if weights is None else np.asarray(weights, dtype=float)
+        self.nodes = None if nodes is None else list(nodes)
+        self._positions = None
+        assert(len(self.indptr) > 0 and self.indptr[-1] == len(self.indices))
+        assert(self.weights is None or len(self.weights) == len(self.indices))
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @property
+    def num_edges(self):
+        """Number of stored (directed) edges"""
+        return len(self.indices)
+
+    def neighbors(self, index):
+        """Get the neighbors of a node as a view of the indices array"""
+        return self.indices[self.indptr[index]:self.indptr[index + 1]]
+
+    def neighbor_weights(self, index):
+        """Get the weights of the edges to the neighbors of a node"""
+        return self.weights[self.indptr[index]:self.indptr[index + 1]]
+
+    def edges_of(self, nodes):
+        """Get the positions in indices of the edges out of nodes
+
+        Args:
+            nodes (np.array): node indices
+
+        Returns:
+            np.array of edge positions
+        """
+        nodes = np.asarray(nodes, dtype=np.int64)
+        starts = self.indptr[nodes]
+        lengths = self.indptr[nodes + 1] - starts
+        return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+    def reverse(self):
+        """Get the network with the direction of every edge reversed
+
+        Returns:
+            CSRNetwork (the same network if it is undirected)
+        """
+        order = np.argsort(self.indices, kind='stable')
+        indptr = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.indices, minlength=len(self)), out=indptr[1:])
+        weights = None if self.weights is None else self.weights[order]
+        return CSRNetwork(indptr, self.sources()[order], weights, self.nodes)
+
+    def degree(self, index=None):
+        """Get the out degree of a node or an array of the degrees of all nodes"""
+        if index is None:
+            return np.diff(self.indptr)
+        return int(self.indptr[index + 1] - self.indptr[index])
+
+    def sources(self):
+        """Get the source node of each edge (aligned with indices)"""
+        return np.repeat(np.arange(len(self)), self.degree())
+
+    def index_of(self, node):
+        """Get the index of a node label"""
+        if self.nodes is None:
+            return node
+        if self._positions is None:
+            self._positions = {label: i for i, label in enumerate(self.nodes)}
+        return self._positions[node]
+
+    def node_of(self, index):
+        """Get the label of the node at an index"""
+        return index if self.nodes is None else self.nodes[index]
+
+    @classmethod
+    def from_edges(cls, edges, num_nodes=None, weights=None, directed=False, nodes=None):
+        """Create the network from a list of (source, target) edges of node indices
+
+        Args:
+            edges (list, np.array): list of pairs of node indices
+            num_nodes (int): optional number of nodes (default is the largest index + 1)
+            weights (list, np.array): optional weight of each edge
+            directed (bool): whether edges only go from source to target
+            nodes (list): optional labels of the nodes
+        """
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        sources, targets = edges[:, 0], edges[:, 1]
+        if weights is not None:
+            weights = np.asarray(weights, dtype=float)
+        if not directed:
+            sources, targets = np.concatenate((sources, targets)), np.concatenate((targets, sources))
+            if weights is not None:
+                weights = np.concatenate((weights, weights))
+        if num_nodes is None:
+            num_nodes = len(nodes) if nodes is not None else int(edges.max()) + 1 if len(edges) else 0
+        order = np.argsort(sources, kind='stable')
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=num_nodes), out=indptr[1:])
+        return cls(indptr, targets[order], None if weights is None else weights[order], nodes)
+
+    @classmethod
+    def from_igraph(cls, graph, weight=None):
+        """Create the network from an igraph Graph
+
+        Args:
+            graph (igraph.Graph): the agent index is the vertex index
+            weight (str): optional name of the edge attribute with the weights
+        """
+        weights = graph.es[weight] if weight else None
+        return cls.from_edges(graph.get_edgelist(), graph.vcount(), weights, graph.is_directed())
+
+    @classmethod
+    def from_networkx(cls, graph, weight=None):
+        """Create the network from a networkx graph
+
+        Args:
+            graph (networkx.Graph): the agent index is the position in graph.nodes()
+            weight (str): optional name of the edge attribute with the weights
+        """
+        nodes = list(graph.nodes())
+        positions = {node: i for i, node in enumerate(nodes)}
+        edges = [(positions[u], positions[v]) for u, v in graph.edges()]
+        weights = [data.get(weight, 1.0) for _, _, data in graph.edges(data=True)] if weight else None
+        return cls.from_edges(edges, len(nodes), weights, graph.is_directed(), nodes)
+
+    @classmethod
+    def from_network(cls, network, weight=None):
+        """Create the network from an igraph or networkx graph, the path of a saved network,
+        or return a CSRNetwork
+        """
+        if isinstance(network, CSRNetwork):
+            return network
+        if isinstance(network, str):
+            return cls.load(network)
+        if hasattr(network, 'get_edgelist'):
+            return cls.from_igraph(network, weight)
+        return cls.from_networkx(network, weight)
+
+    def save(self, path, allow_pickle=False):
+        """Save the network to a directory
+
+        The directory has a header.json file and indptr.npy, indices.npy,
+        and optionally weights.npy and nodes.json files.
+        Node labels can be strings, numbers, booleans, None and tuples of those.
+        Other labels are pickled to nodes.pkl if allow_pickle is set.
+
+        Args:
+            path (str): path of the directory (created if it does not exist)
+            allow_pickle (bool): whether to pickle labels that JSON cannot represent
+
+        Raises:
+            ValueError: if the labels cannot be saved
+        """
+        labels = None
+        if self.nodes is not None:
+            try:
+                labels = json.dumps([self._encode_label(node) for node in self.nodes])
+            except TypeError as e:
+                if not allow_pickle:
+                    raise ValueError("Node labels need allow_pickle: {}".format(e))
+        os.makedirs(path, exist_ok=True)
+        header = {
+            'format': self.FORMAT,
+            'version': self.VERSION,
+            'num_nodes': len(self),
+            'num_edges': self.num_edges,
+            'weighted': self.weights is not None,
+            'labels': None if self.nodes is None else 'json' if labels is not None else 'pickle',
+        }
+        np.save(os.path.join(path, 'indptr.npy'), self.indptr)
+        np.save(os.path.join(path, 'indices.npy'), self.indices)
+        if self.weights is not None:
+            np.save(os.path.join(path, 'weights.npy'), self.weights)
+        if labels is not None:
+            with open(os.path.join(path, 'nodes.json'), 'w') as fp:
+                fp.write(labels)
+        elif self.nodes is not None:
+            with open(os.path.join(path, 'nodes.pkl'), 'wb') as fp:
+                pickle.dump(self.nodes, fp)
+        with open(os.path.join(path, 'header.json'), 'w') as fp:
+            json.dump(header, fp)
+
+    @classmethod
+    def load(cls, path, mmap=True, allow_pickle=False):
+        """Load a network saved with save()
+
+        Args:
+            path (str): path of the directory
+            mmap (bool): whether to memory map the arrays (read only) instead of reading them
+            allow_pickle (bool): whether to load pickled node labels
+                                 (unpickling can run arbitrary code so only use for trusted files)
+
+        Returns:
+            CSRNetwork
+
+        Raises:
+            ValueError: if the labels are pickled and allow_pickle is not set
+        """
+        with open(os.path.join(path, 'header.json')) as fp:
+            header = json.load(fp)
+        assert(header['format'] == cls.FORMAT)
+        if header['version'] > cls.VERSION:
+            raise ValueError("Network format version {} is not supported".format(header['version']))
+        if header['labels'] == 'pickle' and not allow_pickle:
+            raise ValueError("Node labels are pickled and allow_pickle is not set")
+        mode = 'r' if mmap else None
+        indptr = np.load(os.path.join(path, 'indptr.npy'), mmap_mode=mode)
+        indices = np.load(os.path.join(path, 'indices.npy'), mmap_mode=mode)
+        assert(len(indptr) == header['num_nodes'] + 1 and len(indices) == header['num_edges'])
+        weights = np.load(os.path.join(path, 'weights.npy'), mmap_mode=mode) if header['weighted'] else None
+        nodes = None
+        if header['labels'] == 'json':
+            with open(os.path.join(path, 'nodes.json')) as fp:
+                nodes = [cls._decode_label(node) for node in json.load(fp)]
+        elif header['labels'] == 'pickle':
+            with open(os.path.join(path, 'nodes.pkl'), 'rb') as fp:
+                nodes = pickle.load(fp)
+        return cls(indptr, indices, weights, nodes)
+
+    @classmethod
+    def _encode_label(cls, label):
+        # tuples become {"tuple": [...]} since JSON only has lists
+        if isinstance(label, tuple):
+            return {'tuple': [cls._encode_label(x) for x in label]}
+        if isinstance(label, np.generic):
+            label = label.item()
+        if label is None or isinstance(label, (str, bool, int, float)):
+            return label
+        raise TypeError("label {!r} is not a string, number, or tuple".format(label))
+
+    @classmethod
+    def _decode_label(cls, label):
+        if isinstance(label, dict):
+            return tuple(cls._decode_label(x) for x in label['tuple'])
+        return label
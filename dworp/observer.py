@@ -3,8 +3,17 @@
 # Distributed under the terms of the Modified BSD License.
 
 from abc import ABC, abstractmethod
+import glob
+import importlib.util
+import json
 import logging
+import multiprocessing
+import numpy as np
+import os
+import queue
+import threading
 import time
+from .agent import AgentStore
 
 
 class Observer(ABC):
@@ -144,3 +153,434 @@ class PauseAtEndObserver(Observer):
 
     def stop(self, now, agents, env):
         time.sleep(self.delay)
+
+
+class RecorderObserver(Observer):
+    """Record metrics into numpy columns that are written to disk in chunks
+
+    Each metric is evaluated after initialization and after every time step.
+    The values go into preallocated columns (float64 unless a dtype is given)
+    and every chunk_size rows the columns are written to a chunk file in the directory and reused,
+    so the memory of a long run is bounded.
+    The last partial chunk is written when the simulation stops.
+    The chunks are numpy .npz files or Parquet (requires pyarrow) or HDF5 (requires h5py) files.
+
+    Example:
+        metrics = {'happy': lambda agents, env: np.mean([a.happy for a in agents])}
+        observer = RecorderObserver(metrics, 'output/run1')
+        ...
+        data = RecorderObserver.load('output/run1')
+        plt.plot(data['time'], data['happy'])
+
+    Args:
+        metrics (dict): map from metric name to function metric(agents, env) that returns a number
+        path (str): directory for the chunk files (created if it does not exist)
+        chunk_size (int): number of rows in each chunk
+        format (str): "npz", "parquet", or "hdf5"
+        dtypes (dict): optional map from metric name to numpy dtype
+
+    Raises:
+        ImportError: if the library for the format is not installed
+
+    Attributes:
+        columns (dict): map from column name to numpy array of the current chunk (time is a column)
+        size (int): number of rows in the current chunk
+        num_chunks (int): number of chunks written
+        num_rows (int): number of rows recorded
+    """
+    EXTENSIONS = {'npz': 'npz', 'parquet': 'parquet', 'hdf5': 'h5'}
+    REQUIRES = {'parquet': 'pyarrow', 'hdf5': 'h5py'}
+
+    def __init__(self, metrics, path, chunk_size=1000, format='npz', dtypes=None):
+        assert('time' not in metrics)
+        assert(format in self.EXTENSIONS)
+        assert(chunk_size > 0)
+        # fail before the run rather than at the first write
+        if format in self.REQUIRES and importlib.util.find_spec(self.REQUIRES[format]) is None:
+            raise ImportError("The {} format requires {} (or use npz)".format(format, self.REQUIRES[format]))
+        self.metrics = metrics
+        self.path = path
+        self.chunk_size = chunk_size
+        self.format = format
+        dtypes = dtypes if dtypes else {}
+        self.columns = {'time': np.zeros(chunk_size, dtype=np.float64)}
+        for name in metrics:
+            self.columns[name] = np.zeros(chunk_size, dtype=dtypes.get(name, np.float64))
+        self.size = 0
+        self.num_chunks = 0
+        self.num_rows = 0
+
+    def __len__(self):
+        return self.num_rows
+
+    def start(self, now, agents, env):
+        os.makedirs(self.path, exist_ok=True)
+        self.record(now, agents, env)
+
+    def step(self, now, agents, env):
+        self.record(now, agents, env)
+
+    def stop(self, now, agents, env):
+        self.flush()
+
+    def record(self, now, agents, env):
+        """Evaluate the metrics and add a row"""
+        self.columns['time'][self.size] = now
+        for name, metric in self.metrics.items():
+            self.columns[name][self.size] = metric(agents, env)
+        self.size += 1
+        self.num_rows += 1
+        if self.size == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Write the rows of the current chunk and start a new chunk"""
+        if self.size == 0:
+            return
+        data = {name: column[:self.size] for name, column in self.columns.items()}
+        filename = os.path.join(self.path, "chunk-{:05d}.{}".format(self.num_chunks, self.EXTENSIONS[self.format]))
+        getattr(self, '_write_' + self.format)(filename, data)
+        self.logger.debug("Wrote {} rows to {}".format(self.size, filename))
+        self.num_chunks += 1
+        self.size = 0
+
+    @classmethod
+    def load(cls, path):
+        """Load the chunks written to a directory
+
+        Args:
+            path (str): directory of the chunk files
+
+        Returns:
+            dict from column name to numpy array
+        """
+        chunks = []
+        for format, extension in cls.EXTENSIONS.items():
+            filenames = sorted(glob.glob(os.path.join(path, 'chunk-*.' + extension)))
+            chunks.extend(getattr(cls, '_read_' + format)(filename) for filename in filenames)
+        if not chunks:
+            return {}
+        return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+
+    @staticmethod
+    def _write_npz(filename, data):
+        np.savez(filename, **data)
+
+    @staticmethod
+    def _read_npz(filename):
+        with np.load(filename) as data:
+            return {name: data[name] for name in data.files}
+
+    @staticmethod
+    def _write_parquet(filename, data):
+        import pyarrow
+        import pyarrow.parquet
+        pyarrow.parquet.write_table(pyarrow.table(data), filename)
+
+    @staticmethod
+    def _read_parquet(filename):
+        import pyarrow.parquet
+        table = pyarrow.parquet.read_table(filename)
+        return {name: table.column(name).to_numpy() for name in table.column_names}
+
+    @staticmethod
+    def _write_hdf5(filename, data):
+        import h5py
+        with h5py.File(filename, 'w') as fp:
+            for name, values in data.items():
+                fp.create_dataset(name, data=values)
+
+    @staticmethod
+    def _read_hdf5(filename):
+        import h5py
+        with h5py.File(filename, 'r') as fp:
+            return {name: fp[name][()] for name in fp.keys()}
+
+
+class AsyncObserver(Observer):
+    """Run an observer in a background thread or process
+
+    After each time step, a snapshot of what the observer needs is put on a bounded queue
+    and the simulation continues while the observer works through the queue.
+    The snapshot is the (agents, env) pair that capture(now, agents, env) returns.
+    Without a capture function, the agents must be an AgentStore and the observer receives
+    a copy of the state matrix as agents and None as the environment.
+    In a thread, the copies are made into a pool of reused buffers
+    so the observer must not hold onto the state array after step() returns.
+
+    When the queue is full, the policy determines what happens to a new snapshot:
+        "block": wait for room in the queue (every step is observed)
+        "drop": discard the new snapshot
+        "coalesce": discard the oldest waiting snapshot so the observer sees the latest state
+    start() waits for the observer to start and stop() waits for the queue to drain.
+    An exception in the observer is raised from stop().
+
+    In a process, the observer and the snapshots must be picklable and any state the observer
+    collects stays in the process, so it should write its results (like RecorderObserver).
+
+    Args:
+        observer (Observer): observer to run in the background
+        capture (callable): optional capture(now, agents, env) that returns a snapshot (agents, env) pair
+        maxsize (int): maximum number of snapshots waiting in the queue
+        policy (str): "block", "drop", or "coalesce"
+        process (bool): whether to use a process instead of a thread
+
+    Attributes:
+        num_dropped (int): number of time steps that were not observed
+    """
+    POLICIES = ('block', 'drop', 'coalesce')
+
+    def __init__(self, observer, capture=None, maxsize=1, policy='block', process=False):
+        assert(policy in self.POLICIES)
+        assert(maxsize > 0)
+        self.observer = observer
+        self.capture = capture
+        self.maxsize = maxsize
+        self.policy = policy
+        self.process = process
+        self.num_dropped = 0
+        self.queue = None
+        self.worker = None
+        self.error = None
+        # buffers of state copies that the thread is done with
+        self.buffers = queue.Queue()
+
+    def start(self, now, agents, env):
+        assert(self.capture is not None or isinstance(agents, AgentStore))
+        if self.process:
+            self.queue = multiprocessing.JoinableQueue(self.maxsize)
+            self.worker = multiprocessing.Process(target=_observe_in_process, args=(self.observer, self.queue))
+        else:
+            self.queue = queue.Queue(self.maxsize)
+            self.worker = threading.Thread(target=self._run)
+        self.worker.daemon = True
+        self.worker.start()
+        self.queue.put(self._snapshot('start', now, agents, env))
+        # the start snapshot is never coalesced
+        self.queue.join()
+
+    def step(self, now, agents, env):
+        item = self._snapshot('step', now, agents, env)
+        if self.policy == 'block':
+            self.queue.put(item)
+            return
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.num_dropped += 1
+            if self.policy == 'drop':
+                self._release(item)
+                return
+            try:
+                self._release(self.queue.get_nowait())
+                self.queue.task_done()
+            except queue.Empty:
+                # the observer took it first
+                self.num_dropped -= 1
+            self.queue.put(item)
+
+    def stop(self, now, agents, env):
+        self.queue.put(self._snapshot('stop', now, agents, env))
+        self.queue.put(None)
+        self.worker.join()
+        if self.num_dropped:
+            self.logger.info("Dropped {} time steps".format(self.num_dropped))
+        if self.error is not None:
+            raise self.error
+        if self.process and self.worker.exitcode != 0:
+            raise RuntimeError("Observer process failed with exit code {}".format(self.worker.exitcode))
+
+    def _snapshot(self, method, now, agents, env):
+        if self.capture is not None:
+            agents, env = self.capture(now, agents, env)
+            return method, now, agents, env, None
+        state = agents.state
+        if self.process:
+            return method, now, state.copy(), None, None
+        try:
+            buffer = self.buffers.get_nowait()
+        except queue.Empty:
+            buffer = None
+        if buffer is None or buffer.shape != state.shape or buffer.dtype != state.dtype:
+            buffer = np.empty_like(state)
+        np.copyto(buffer, state)
+        return method, now, buffer, None, buffer
+
+    def _release(self, item):
+        if item[4] is not None:
+            self.buffers.put(item[4])
+
+    def _run(self):
+        self.error = _observe(self.observer, self.queue, self._release)
+
+
+def _observe(observer, items, release=None):
+    # run the observer on the snapshots until None and return its exception
+    # after an exception, the queue is drained without calling the observer so the simulation does not block
+    error = None
+    while True:
+        item = items.get()
+        try:
+            if item is None:
+                break
+            if error is None:
+                method, now, agents, env, _ = item
+                try:
+                    getattr(observer, method)(now, agents, env)
+                except Exception as e:
+                    error = e
+            if release is not None:
+                release(item)
+        finally:
+            items.task_done()
+    return error
+
+
+def _observe_in_process(observer, items):
+    error = _observe(observer, items)
+    if error is not None:
+        raise error
+
+
+class TrajectoryObserver(Observer):
+    """Write the state of every agent at every time step to a memory mapped file
+
+    The trajectory is a T x N x S array (time steps by agents by state size)
+    in the raw file trajectory.dat of a directory with a header.json file
+    and the times of the steps in times.dat.
+    The state of an AgentStore is written with a single copy into the mapped file.
+    The number of agents must not change during the simulation.
+
+    The file is sized for num_steps (the initial state plus the time steps) if given.
+    Otherwise (like with InfiniteTime) it grows by chunk_steps at a time.
+    The header is written at the start and updated every chunk_steps states
+    so the states recorded before a crash can still be read.
+    The file is trimmed to the recorded steps when the simulation stops.
+    Use TrajectoryReader to load it.
+
+    Args:
+        path (str): path of the directory (created if it does not exist)
+        num_steps (int): optional number of states to record (number of time steps + 1)
+        chunk_steps (int): number of states to grow the file by (and between header updates)
+        dtype (str, np.dtype): optional data type (default is the data type of the state)
+
+    Attributes:
+        size (int): number of states recorded
+    """
+    FORMAT = 'dworp-trajectory'
+    VERSION = 1
+
+    def __init__(self, path, num_steps=None, chunk_steps=1000, dtype=None):
+        assert(chunk_steps > 0)
+        assert(num_steps is None or num_steps > 0)
+        self.path = path
+        self.num_steps = num_steps
+        self.chunk_steps = chunk_steps
+        self.dtype = dtype
+        self.shape = None
+        self.data = None
+        self.times = None
+        self.size = 0
+
+    def start(self, now, agents, env):
+        os.makedirs(self.path, exist_ok=True)
+        state = agents.state if isinstance(agents, AgentStore) else agents[0].state
+        self.dtype = np.dtype(self.dtype if self.dtype is not None else state.dtype)
+        self.shape = (len(agents), len(state) if state.ndim == 1 else state.shape[1])
+        self.size = 0
+        self._map(self.num_steps if self.num_steps else self.chunk_steps, 'w+')
+        self.step(now, agents, env)
+        self.flush()
+
+    def step(self, now, agents, env):
+        assert(len(agents) == self.shape[0])
+        if self.size == len(self.times):
+            self._map(self.size + self.chunk_steps, 'r+')
+        if isinstance(agents, AgentStore):
+            self.data[self.size] = agents.state
+        else:
+            for i, agent in enumerate(agents):
+                self.data[self.size, i] = agent.state
+        self.times[self.size] = now
+        self.size += 1
+        if self.size % self.chunk_steps == 0:
+            self.flush()
+
+    def stop(self, now, agents, env):
+        self._map(self.size, 'r+')
+        self.flush()
+        self.logger.info("Wrote {} states to {}".format(self.size, self.path))
+
+    def flush(self):
+        """Write the mapped states to disk and update the header with the number of states"""
+        self.data.flush()
+        self.times.flush()
+        header = {
+            'format': self.FORMAT,
+            'version': self.VERSION,
+            'num_steps': self.size,
+            'num_agents': self.shape[0],
+            'state_size': self.shape[1],
+            'dtype': self.dtype.str,
+        }
+        # replace the header at once so a reader never sees a partial file
+        filename = os.path.join(self.path, 'header.json')
+        with open(filename + '.tmp', 'w') as fp:
+            json.dump(header, fp)
+        os.replace(filename + '.tmp', filename)
+
+    def _map(self, num_steps, mode):
+        # (re)map the files with room for num_steps states after unmapping the old maps
+        if self.data is not None:
+            self.data.flush()
+            self.times.flush()
+        self.data = self.times = None
+        self.data = self._resize(os.path.join(self.path, 'trajectory.dat'), self.dtype,
+                                 (num_steps,) + self.shape, mode)
+        self.times = self._resize(os.path.join(self.path, 'times.dat'), np.float64, (num_steps,), mode)
+
+    @staticmethod
+    def _resize(filename, dtype, shape, mode):
+        if mode == 'r+':
+            with open(filename, 'r+b') as fp:
+                fp.truncate(int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        return np.memmap(filename, dtype=dtype, mode=mode, shape=shape)
+
+
+class TrajectoryReader:
+    """Read a trajectory written by TrajectoryObserver without loading it into memory
+
+    Indexing the reader slices the T x N x S memory mapped array,
+    so reader[100:200] reads only those states and reader[:, 5] is the trajectory of agent 5.
+
+    Args:
+        path (str): path of the directory
+
+    Attributes:
+        data (np.memmap): read only T x N x S array of the states
+        times (np.memmap): time of each state
+    """
+    def __init__(self, path):
+        with open(os.path.join(path, 'header.json')) as fp:
+            header = json.load(fp)
+        assert(header['format'] == TrajectoryObserver.FORMAT)
+        if header['version'] > TrajectoryObserver.VERSION:
+            raise ValueError("Trajectory format version {} is not supported".format(header['version']))
+        shape = (header['num_steps'], header['num_agents'], header['state_size'])
+        self.data = np.memmap(os.path.join(path, 'trajectory.dat'), dtype=header['dtype'], mode='r', shape=shape)
+        self.times = np.memmap(os.path.join(path, 'times.dat'), dtype=np.float64, mode='r', shape=shape[:1])
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        return self.data[index]
+
+    def window(self, start, stop):
+        """Get the states with start <= time < stop
+
+        Returns:
+            tuple of times and states (views of the files)
+        """
+        first, last = np.searchsorted(self.times, [start, stop])
+        return self.times[first:last], self.data[first:last]
@@ -0,0 +1,133 @@
+# Copyright 2018, The Johns Hopkins University Applied Physics Laboratory LLC
+# All rights reserved.
+# Distributed under the terms of the Modified BSD License.
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import logging
+import numpy as np
+import time
+from .time import DeadlineTerminator
+
+
+class RunResults:
+    """Results of the replications of a simulation
+
+    Arrays are indexed by [parameter set, replicate].
+
+    Attributes:
+        params (list): parameter sets
+        results (np.array): result of each run (extra dimensions if results are vectors)
+        timings (np.array): wall clock time in seconds of each run
+        seeds (list): list of lists of the numpy SeedSequence for each run
+    """
+    def __init__(self, params, results, timings, seeds):
+        self.params = params
+        self.results = results
+        self.timings = timings
+        self.seeds = seeds
+
+
+class Runner:
+    """Run replications of a simulation over a list of parameter sets in parallel
+
+    Each run gets its own random number generator from an independent stream
+    spawned from a single root seed, so results do not depend on the number of workers.
+    The global numpy generator is also seeded per run for models that use np.random directly.
+
+    The factory and measure functions are sent to worker processes so they must be
+    picklable (defined at the top level of a module).
+
+    Example:
+        def create(params, rng):
+            return MySimulation(params, rng)
+
+        def count(sim):
+            return sim.count
+
+        runner = Runner(create, measure=count, seed=8675)
+        output = runner.run([{'size': 10}, {'size': 20}], replicates=10)
+        print(output.results.mean(axis=1))
+
+    Args:
+        factory (callable): factory(params, rng) returns a Simulation
+        measure (callable): optional measure(sim) returns the result of a completed run
+        max_workers (int): number of worker processes (default is the number of CPUs)
+                           If 1, the runs are done in this process.
+        seed (int): optional seed for the root of the random number streams
+    """
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, factory, measure=None, max_workers=None, seed=None):
+        self.factory = factory
+        self.measure = measure
+        self.max_workers = max_workers
+        self.seed = seed
+
+    def run(self, params, replicates):
+        """Run every parameter set a number of times
+
+        Args:
+            params (list): list of parameter sets to pass to the factory
+            replicates (int): number of runs for each parameter set
+
+        Returns:
+            RunResults
+        """
+        streams = np.random.SeedSequence(self.seed).spawn(len(params) * replicates)
+        seeds = [streams[i * replicates:(i + 1) * replicates] for i in range(len(params))]
+        jobs = [(i, k) for i in range(len(params)) for k in range(replicates)]
+        results = {}
+        timings = np.zeros((len(params), replicates))
+
+        if self.max_workers == 1:
+            outputs = ((job, run_once(self.factory, self.measure, params[job[0]], seeds[job[0]][job[1]]))
+                       for job in jobs)
+            self._collect(outputs, results, timings)
+        else:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {executor.submit(run_once, self.factory, self.measure,
+                                           params[job[0]], seeds[job[0]][job[1]]): job for job in jobs}
+                outputs = ((futures[future], future.result()) for future in as_completed(futures))
+                self._collect(outputs, results, timings)
+
+        values = np.array([[results[(i, k)] for k in range(replicates)] for i in range(len(params))])
+        return RunResults(params, values, timings, seeds)
+
+    def _collect(self, outputs, results, timings):
+        for job, (result, elapsed) in outputs:
+            results[job] = result
+            timings[job] = elapsed
+            self.logger.info("Run {} of parameter set {} finished in {:.2f}s".format(job[1], job[0], elapsed))
+
+
+def run_once(factory, measure, params, seed, timeout=None):
+    """Create and run a single realization of a simulation
+
+    Args:
+        factory (callable): factory(params, rng) returns a Simulation
+        measure (callable): optional measure(sim) returns the result of the run
+        params (object): parameter set passed to the factory
+        seed (np.random.SeedSequence): seed of this run's random number stream
+        timeout (float): optional wall clock limit in seconds checked after each time step
+                         (requires the simulation to have a terminator attribute)
+
+    Returns:
+        tuple of (result, elapsed time in seconds)
+
+    Raises:
+        TimeoutError: if the run is stopped by the timeout
+    """
+    start = time.perf_counter()
+    # child streams derived without spawn() so the seed can be reused to repeat a run
+    rng_seed, global_seed = [np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key + (x,))
+                             for x in range(2)]
+    np.random.seed(global_seed.generate_state(4))
+    rng = np.random.RandomState(np.random.MT19937(rng_seed))
+    sim = factory(params, rng)
+    if timeout is not None:
+        sim.terminator = DeadlineTerminator(timeout - (time.perf_counter() - start), sim.terminator)
+    sim.run()
+    if timeout is not None and sim.terminator.expired:
+        raise TimeoutError("Run exceeded {}s".format(timeout))
+    result = measure(sim) if measure else None
+    return result, time.perf_counter() - start
@@ -3,8 +3,12 @@
 # Distributed under the terms of the Modified BSD License.
 
 from abc import ABC, abstractmethod
+import bisect
+import heapq
 import itertools
 import logging
+import numpy as np
+from .network import CSRNetwork
 
 
 class Scheduler(ABC):
@@ -28,6 +32,24 @@ class Scheduler(ABC):
         """
         pass
 
+    def record_changes(self, now, agents, changed):
+        """Receive the agents whose state changed this time step
+
+        Implement this to have the simulation track changes.
+        It is called after the agents are updated.
+
+        Args:
+            now (int, float): current time of the simulation
+            agents (list): list of Agent objects
+            changed (np.array): indices of the updated agents whose state changed
+        """
+        pass
+
+    @property
+    def tracks_changes(self):
+        """Whether this scheduler needs the changed agents"""
+        return type(self).record_changes is not Scheduler.record_changes
+
 
 class BasicScheduler(Scheduler):
     """Schedules all agents in the order of the agents list"""
@@ -51,6 +73,8 @@ class RandomOrderScheduler(Scheduler):
 class RandomSampleScheduler(Scheduler):
     """Uniformly sample from the list of agents
 
+    Each step costs O(size) rather than O(number of agents).
+
     Args:
         size (int): size of the sample (number of agents to update at each time step)
         rng (numpy.random.RandomState): numpy random generator
@@ -60,7 +84,131 @@ class RandomSampleScheduler(Scheduler):
         self.rng = rng
 
     def step(self, now, agents, env):
-        return self.rng.permutation(len(agents))[:self.size]
+        return sample_without_replacement(len(agents), min(self.size, len(agents)), self.rng)
+
+
+class WeightedSampleScheduler(Scheduler):
+    """Sample agents with probability proportional to their weights
+
+    Sampling is with replacement using an alias table (Vose's method) so each step costs O(size).
+    The table is rebuilt in O(number of agents) only when a step follows a change to the weights.
+
+    Args:
+        weights (list, np.array): non-negative weight of each agent
+        size (int): size of the sample (number of agents to update at each time step)
+        rng (numpy.random.RandomState): numpy random generator
+    """
+    def __init__(self, weights, size, rng):
+        self.weights = np.array(weights, dtype=float)
+        assert np.all(self.weights >= 0)
+        self.size = size
+        self.rng = rng
+        self.probabilities = None
+        self.aliases = None
+
+    def set_weight(self, index, weight):
+        """Change the weight of an agent"""
+        assert weight >= 0
+        self.weights[index] = weight
+        self.probabilities = None
+
+    def set_weights(self, weights):
+        """Replace the weights of all agents"""
+        self.weights = np.array(weights, dtype=float)
+        assert np.all(self.weights >= 0)
+        self.probabilities = None
+
+    def add(self, weight):
+        """Add an agent to the end of the agents list and return its index"""
+        self.weights = np.append(self.weights, float(weight))
+        self.probabilities = None
+        return len(self.weights) - 1
+
+    def step(self, now, agents, env):
+        if self.probabilities is None:
+            self.probabilities, self.aliases = self._build_table(self.weights)
+        columns = self.rng.randint(0, len(self.weights), size=self.size)
+        keep = self.rng.uniform(size=self.size) < self.probabilities[columns]
+        return np.where(keep, columns, self.aliases[columns])
+
+    @staticmethod
+    def _build_table(weights):
+        num = len(weights)
+        assert num > 0 and weights.sum() > 0
+        scaled = weights * num / weights.sum()
+        probabilities = np.ones(num)
+        aliases = np.arange(num)
+        small = np.flatnonzero(scaled < 1).tolist()
+        large = np.flatnonzero(scaled >= 1).tolist()
+        scaled = scaled.tolist()
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            probabilities[less] = scaled[less]
+            aliases[less] = more
+            scaled[more] -= 1 - scaled[less]
+            if scaled[more] < 1:
+                small.append(more)
+            else:
+                large.append(more)
+        # anything left over is 1 up to rounding error
+        return probabilities, aliases
+
+
+class EpochSampleScheduler(Scheduler):
+    """Sample agents without replacement across time steps
+
+    Every agent is updated once per epoch in a random order, size agents per time step.
+    The last step of an epoch can have fewer agents.
+    A new epoch includes any agents added during the previous epoch.
+
+    Args:
+        size (int): number of agents to update at each time step
+        rng (numpy.random.RandomState): numpy random generator
+    """
+    def __init__(self, size, rng):
+        assert size > 0
+        self.size = size
+        self.rng = rng
+        self.order = np.empty(0, dtype=int)
+        self.position = 0
+
+    def step(self, now, agents, env):
+        if self.position >= len(self.order):
+            self.order = self.rng.permutation(len(agents))
+            self.position = 0
+        schedule = self.order[self.position:self.position + self.size]
+        self.position += self.size
+        # agents removed from the end of the list during the epoch
+        return schedule[schedule < len(agents)]
+
+
+def sample_without_replacement(n, k, rng):
+    """Uniform random sample of k integers from range(n) in random order
+
+    Takes O(k) expected time.
+    A sparse sample draws with replacement and discards repeats, which is equivalent to
+    sequential sampling without replacement.
+    A dense sample (k > n / 4) uses a permutation, which is O(n) = O(k).
+
+    Args:
+        n (int): size of the population
+        k (int): size of the sample
+        rng (numpy.random.RandomState): numpy random generator
+
+    Returns:
+        np.array
+    """
+    assert 0 <= k <= n
+    if 4 * k > n:
+        return rng.permutation(n)[:k]
+    sample = np.empty(0, dtype=int)
+    while len(sample) < k:
+        draws = np.concatenate((sample, rng.randint(0, n, size=k - len(sample) + 8)))
+        # keep the first occurrence of each value in draw order
+        _, first = np.unique(draws, return_index=True)
+        sample = draws[np.sort(first)]
+    return sample[:k]
 
 
 class BernoulliScheduler(Scheduler):
@@ -108,8 +256,11 @@ class FastBernoulliScheduler(Scheduler):
         self.t0 = start
         self.tN = stop
         self.schedule = self._create_schedule()
+        self.times = None
+        self.last_time = start
 
     def step(self, now, agents, env):
+        self.last_time = now
         try:
             return self.schedule[now]
         except KeyError:
@@ -120,6 +271,16 @@ class FastBernoulliScheduler(Scheduler):
     def get_times(self):
         return sorted(self.schedule.keys())
 
+    def next_time(self):
+        """Get the first scheduled time after the last time step (None if done)
+
+        This lets EventTime skip time steps with no agents scheduled.
+        """
+        if self.times is None:
+            self.times = self.get_times()
+        index = bisect.bisect_right(self.times, self.last_time)
+        return self.times[index] if index < len(self.times) else None
+
     def _create_schedule(self):
         gen = self._get_wait_times(self.p, self.rng, self.SAMPLE_SIZE)
         times = []
@@ -148,3 +309,542 @@ class FastBernoulliScheduler(Scheduler):
             if not samples:
                 samples = rng.geometric(p=p, size=num_samples).tolist()
             yield samples.pop()
+
+
+class EventScheduler(Scheduler):
+    """Schedules agents from a priority queue of (time, agent index) events
+
+    Agents are scheduled with push().
+    Each step returns the agents with events at or before the current time
+    in time order (ties in the order they were pushed).
+    An agent with multiple events at the same time is updated multiple times.
+    Use with EventTime or EventSimulation to skip times with no events.
+    """
+    def __init__(self):
+        self.queue = []
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.queue)
+
+    def push(self, time, index):
+        """Schedule an agent
+
+        Args:
+            time (int, float): time to update the agent
+            index (int): index of the agent in the agents list
+        """
+        heapq.heappush(self.queue, (time, next(self.counter), index))
+
+    def push_many(self, times, indices):
+        """Schedule a collection of events
+
+        Args:
+            times (list, np.array): times of the events
+            indices (list, np.array): agent indices of the events
+        """
+        events = [(time, next(self.counter), index) for time, index in zip(times, indices)]
+        if len(events) >= len(self.queue):
+            # rebuilding is cheaper than pushing when the events are most of the queue
+            self.queue.extend(events)
+            heapq.heapify(self.queue)
+        else:
+            for event in events:
+                heapq.heappush(self.queue, event)
+
+    def next_time(self):
+        """Get the time of the next event (None if there are no events)"""
+        return self.queue[0][0] if self.queue else None
+
+    def step(self, now, agents, env):
+        schedule = []
+        while self.queue and self.queue[0][0] <= now:
+            schedule.append(heapq.heappop(self.queue)[2])
+        return schedule
+
+
+class StreamingBernoulliScheduler(Scheduler):
+    """Bernoulli process scheduler that creates its schedule a window at a time
+
+    Like FastBernoulliScheduler, the schedule comes from geometric wait times,
+    but only the next arrival time of each agent is stored and the schedule is created
+    for a window of time steps when the simulation reaches it.
+    Memory is proportional to the number of agents plus the updates in one window
+    and there is no cost before the first time step.
+    Works with EventTime to skip time steps with no agents scheduled.
+
+    Agents appended to the agents list are added automatically.
+    An agent removed with remove() is never scheduled again.
+    Indices are positions in the agents list so do not remove agents from the middle of the list.
+
+    Args:
+        p (float): probability of heads (probability an agent updates)
+        rng (numpy.random.RandomState): numpy random generator
+        num_agents (int): initial number of agents
+        start (int): start time of the simulation (exclusive)
+        window (int): number of time steps in a window
+    """
+    NEVER = np.iinfo(np.int64).max
+
+    def __init__(self, p, rng, num_agents, start=0, window=100):
+        assert 0 < p <= 1
+        assert window > 0
+        self.p = p
+        self.rng = rng
+        self.window = window
+        self.next_arrivals = start + rng.geometric(p, size=num_agents).astype(np.int64)
+        self.schedule = {}
+        # end of the last window created (inclusive)
+        self.window_end = start
+        self.last_time = start
+
+    def step(self, now, agents, env):
+        if len(agents) > len(self.next_arrivals):
+            self.add(len(agents) - len(self.next_arrivals), self.last_time)
+        self.last_time = now
+        if now > self.window_end:
+            self._create_window(now + self.window - 1)
+        schedule = self.schedule.pop(now, None)
+        if schedule is None:
+            return np.empty(0, dtype=np.int64)
+        # the agents list may have shrunk
+        schedule = schedule[schedule < len(agents)]
+        return schedule[self.next_arrivals[schedule] != self.NEVER]
+
+    def next_time(self):
+        """Get the first scheduled time after the last time step (None if no agents are left)"""
+        while True:
+            times = [t for t in self.schedule if t > self.last_time]
+            if times:
+                return min(times)
+            first = self.next_arrivals.min() if len(self.next_arrivals) else self.NEVER
+            if first == self.NEVER:
+                return None
+            # jump over the empty time steps
+            self.window_end = max(self.window_end, int(first) - 1)
+            self._create_window(self.window_end + self.window)
+
+    def add(self, num_agents=1, now=None):
+        """Add agents to the end of the agents list
+
+        Args:
+            num_agents (int): number of agents to add
+            now (int): current time (default is the time of the last step)
+
+        Returns:
+            np.array of the new agents' indices
+        """
+        now = self.last_time if now is None else now
+        first = len(self.next_arrivals)
+        arrivals = now + self.rng.geometric(self.p, size=num_agents).astype(np.int64)
+        self.next_arrivals = np.concatenate((self.next_arrivals, arrivals))
+        indices = np.arange(first, first + num_agents)
+        # schedule any arrivals that fall in the window that has already been created
+        self._create_window(self.window_end, indices)
+        return indices
+
+    def remove(self, index):
+        """Stop scheduling an agent
+
+        Args:
+            index (int): index of the agent
+        """
+        self.next_arrivals[index] = self.NEVER
+
+    def _create_window(self, end, candidates=None):
+        # arrivals up to end are moved from next_arrivals into the schedule
+        candidates = np.arange(len(self.next_arrivals)) if candidates is None else candidates
+        due = candidates[self.next_arrivals[candidates] <= end]
+        times = []
+        indices = []
+        while due.size:
+            times.append(self.next_arrivals[due])
+            indices.append(due)
+            self.next_arrivals[due] += self.rng.geometric(self.p, size=due.size)
+            due = due[self.next_arrivals[due] <= end]
+        self.window_end = max(self.window_end, end)
+        if not times:
+            return
+        times = np.concatenate(times)
+        indices = np.concatenate(indices)
+        order = np.lexsort((indices, times))
+        times = times[order]
+        indices = indices[order]
+        unique_times, starts = np.unique(times, return_index=True)
+        for time, chunk in zip(unique_times.tolist(), np.split(indices, starts[1:])):
+            if time in self.schedule:
+                chunk = np.sort(np.concatenate((self.schedule[time], chunk)))
+            self.schedule[time] = chunk
+
+
+class IndexedPriorityQueue:
+    """Binary min heap of (time, index) that supports changing the time of an index
+
+    Args:
+        times (list): initial time for each index 0 to n-1
+    """
+    def __init__(self, times):
+        self.times = list(times)
+        order = sorted(range(len(self.times)), key=self.times.__getitem__)
+        # a sorted list is a valid heap
+        self.heap = order
+        self.positions = [0] * len(order)
+        for position, index in enumerate(order):
+            self.positions[index] = position
+
+    def __len__(self):
+        return len(self.heap)
+
+    def top(self):
+        """Get the (time, index) with the smallest time"""
+        index = self.heap[0]
+        return self.times[index], index
+
+    def append(self, time):
+        """Add a new index with this time and return the index"""
+        index = len(self.times)
+        self.times.append(time)
+        self.positions.append(len(self.heap))
+        self.heap.append(index)
+        self._sift_up(self.positions[index])
+        return index
+
+    def update(self, index, time):
+        """Change the time of an index"""
+        old_time = self.times[index]
+        self.times[index] = time
+        if time < old_time:
+            self._sift_up(self.positions[index])
+        else:
+            self._sift_down(self.positions[index])
+
+    def _swap(self, i, j):
+        heap = self.heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self.positions[heap[i]] = i
+        self.positions[heap[j]] = j
+
+    def _sift_up(self, position):
+        times = self.times
+        heap = self.heap
+        while position > 0:
+            parent = (position - 1) >> 1
+            if times[heap[position]] >= times[heap[parent]]:
+                break
+            self._swap(position, parent)
+            position = parent
+
+    def _sift_down(self, position):
+        times = self.times
+        heap = self.heap
+        size = len(heap)
+        while True:
+            child = 2 * position + 1
+            if child >= size:
+                break
+            if child + 1 < size and times[heap[child + 1]] < times[heap[child]]:
+                child += 1
+            if times[heap[position]] <= times[heap[child]]:
+                break
+            self._swap(position, child)
+            position = child
+
+
+class NextReactionScheduler(Scheduler):
+    """Poisson process scheduler with a different rate for each agent
+
+    Uses the next reaction method (Gibson and Bruck 2000):
+    each agent's next activation time is kept in an indexed priority queue,
+    so each activation costs O(log n) regardless of the number of agents.
+    Changing a rate rescales the agent's remaining wait time.
+
+    Activation times are continuous.
+    With EventTime the simulation jumps to each activation.
+    With BasicTime each step returns the agents activated since the last step
+    (an agent activated more than once is returned more than once).
+
+    Args:
+        rates (list, np.array): activation rate of each agent (0 for never)
+        rng (numpy.random.RandomState): numpy random generator
+        start (int, float): start time of the simulation
+    """
+    def __init__(self, rates, rng, start=0):
+        self.rng = rng
+        self.rates = [float(rate) for rate in rates]
+        self.last_time = start
+        self.queue = IndexedPriorityQueue([self._wait(rate, start) for rate in self.rates])
+
+    @classmethod
+    def from_agents(cls, agents, rates, rng, start=0):
+        """Create the scheduler with a rate for each class of agent
+
+        Args:
+            agents (list): list of agents
+            rates (dict): map from agent class to rate
+            rng (numpy.random.RandomState): numpy random generator
+            start (int, float): start time of the simulation
+        """
+        return cls([rates[type(agent)] for agent in agents], rng, start)
+
+    def step(self, now, agents, env):
+        schedule = []
+        queue = self.queue
+        while len(queue):
+            time, index = queue.top()
+            if time > now:
+                break
+            schedule.append(index)
+            queue.update(index, self._wait(self.rates[index], time))
+        self.last_time = now
+        return schedule
+
+    def next_time(self):
+        """Get the time of the next activation (None if all rates are 0)"""
+        if not len(self.queue):
+            return None
+        time, _ = self.queue.top()
+        return None if time == float('inf') else time
+
+    def set_rate(self, index, rate, now=None):
+        """Change the activation rate of an agent
+
+        Args:
+            index (int): index of the agent
+            rate (float): new rate (0 for never)
+            now (int, float): current time (default is the time of the last step)
+        """
+        now = self.last_time if now is None else now
+        old_rate = self.rates[index]
+        old_time = self.queue.times[index]
+        rate = float(rate)
+        self.rates[index] = rate
+        if rate == 0:
+            time = float('inf')
+        elif old_rate == 0 or old_time == float('inf'):
+            time = self._wait(rate, now)
+        else:
+            time = now + (old_time - now) * old_rate / rate
+        self.queue.update(index, time)
+
+    def add(self, rate, now=None):
+        """Add an agent to the end of the agents list and return its index"""
+        now = self.last_time if now is None else now
+        self.rates.append(float(rate))
+        return self.queue.append(self._wait(float(rate), now))
+
+    def remove(self, index):
+        """Stop scheduling an agent"""
+        self.set_rate(index, 0)
+
+    def _wait(self, rate, now):
+        if rate == 0:
+            return float('inf')
+        return now + self.rng.exponential(1.0 / rate)
+
+
+class BatchSchedule:
+    """Schedule divided into batches of agents that can be updated at the same time
+
+    Iterating over the schedule gives the agent indices batch by batch,
+    so it can be used anywhere a list of indices is expected.
+    A simulation with an executor or batch agents updates one batch at a time.
+
+    Args:
+        batches (list): list of np.array of agent indices
+    """
+    def __init__(self, batches):
+        self.batches = batches
+
+    def __iter__(self):
+        for batch in self.batches:
+            yield from batch.tolist()
+
+    def __len__(self):
+        return sum(len(batch) for batch in self.batches)
+
+
+class ColoringScheduler(Scheduler):
+    """Schedules all agents as batches of agents that do not interact
+
+    The interaction graph is colored once with a greedy coloring (largest degree first).
+    Agents with the same color form a batch.
+    With distance 1, neighbors are in different batches.
+    With distance 2 (default), agents that share a neighbor are also in different batches,
+    which is required when agents change their neighbors or the environment around them.
+    The interaction graph must not change during the simulation.
+
+    Args:
+        neighbors (list): list of the neighbor indices of each agent
+        rng (numpy.random.RandomState): optional generator to shuffle the order of the batches
+        distance (int): 1 or 2
+    """
+    def __init__(self, neighbors, rng=None, distance=2):
+        assert distance in (1, 2)
+        self.rng = rng
+        self.colors = self._color(neighbors, distance)
+        order = np.argsort(self.colors, kind='stable')
+        _, starts = np.unique(self.colors[order], return_index=True)
+        self.batches = np.split(order, starts[1:]) if len(order) else []
+
+    @classmethod
+    def from_network(cls, network, rng=None, distance=2):
+        """Create the scheduler from a CSRNetwork, igraph or networkx graph
+
+        The agent index is the vertex index (igraph) or the position in network.nodes() (networkx).
+        """
+        if isinstance(network, CSRNetwork):
+            neighbors = [network.neighbors(i) for i in range(len(network))]
+        elif hasattr(network, 'get_adjlist'):
+            neighbors = network.get_adjlist()
+        else:
+            nodes = list(network.nodes())
+            position = {node: i for i, node in enumerate(nodes)}
+            neighbors = [[position[n] for n in network.neighbors(node)] for node in nodes]
+        return cls(neighbors, rng, distance)
+
+    @classmethod
+    def from_grid(cls, grid, agents, rng=None, distance=2):
+        """Create the scheduler from the neighbors of the agents on a Grid
+
+        Args:
+            grid (Grid): grid with the agents at their (fixed) locations
+            agents (list): list of agents
+        """
+        position = {id(agent): i for i, agent in enumerate(agents)}
+        neighbors = [[] for _ in agents]
+        for x in range(grid.width):
+            for y in range(grid.height):
+                agent = grid.get(x, y)
+                if agent is not None and id(agent) in position:
+                    neighbors[position[id(agent)]] = [position[id(a)] for a in grid.neighbors(x, y)
+                                                      if id(a) in position]
+        return cls(neighbors, rng, distance)
+
+    @property
+    def num_colors(self):
+        return len(self.batches)
+
+    def step(self, now, agents, env):
+        batches = self.batches
+        if self.rng is not None:
+            batches = [batches[i] for i in self.rng.permutation(len(batches))]
+        return BatchSchedule(batches)
+
+    @staticmethod
+    def _color(neighbors, distance):
+        num_agents = len(neighbors)
+        adjacency = [set(n) for n in neighbors]
+        # interactions go both ways
+        neighbors = [set(n) for n in adjacency]
+        for i, adjacent in enumerate(adjacency):
+            for j in adjacent:
+                neighbors[j].add(i)
+        if distance == 2:
+            conflicts = [set(n) for n in neighbors]
+            for i, adjacent in enumerate(neighbors):
+                for j in adjacent:
+                    conflicts[i].update(neighbors[j])
+                conflicts[i].discard(i)
+        else:
+            conflicts = neighbors
+        colors = np.full(num_agents, -1, dtype=int)
+        for i in sorted(range(num_agents), key=lambda x: len(conflicts[x]), reverse=True):
+            used = {colors[j] for j in conflicts[i]}
+            color = 0
+            while color in used:
+                color += 1
+            colors[i] = color
+        return colors
+
+
+class ActiveSetScheduler(Scheduler):
+    """Schedules only the agents whose neighborhood changed in the previous step
+
+    All agents are scheduled at the first step (and when they are added).
+    After that, an agent is scheduled if a neighbor changed state in the previous step
+    or if it changed state itself.
+    An agent can declare itself with a stable attribute:
+    if True, its own changes do not keep it awake (only changes of its neighbors wake it),
+    and if False, it stays awake even if nothing changed.
+    Steps cost time proportional to the number of awake agents rather than the population.
+    The simulation tracks changes for this scheduler (see BasicSimulation).
+
+    Args:
+        neighbors (CSRNetwork, callable): network over the agents (or anything CSRNetwork.from_network accepts)
+                                          or neighbors(indices) that returns the agents to wake
+                                          when the agents at indices change
+        rng (numpy.random.RandomState): optional generator to shuffle the order of the updates
+    """
+    def __init__(self, neighbors, rng=None):
+        if callable(neighbors):
+            self.neighbors = neighbors
+        else:
+            # wake the agents that have a changed agent as a neighbor
+            self.network = CSRNetwork.from_network(neighbors).reverse()
+            self.neighbors = lambda indices: self.network.indices[self.network.edges_of(indices)]
+        self.rng = rng
+        self.num_agents = 0
+        self.pending = np.empty(0, dtype=int)
+        self.scheduled = np.empty(0, dtype=int)
+        # set by from_grid to wake the neighbors of agents that move
+        self.locate = None
+        self.around = None
+        self.locations = None
+
+    @classmethod
+    def from_grid(cls, grid, locate, rng=None):
+        """Create the scheduler for agents on a Grid
+
+        The grid's id layer must hold the agent indices (agent_id is the index in the agents list).
+        The locations of the scheduled agents are compared before and after their updates.
+        An agent that moved wakes itself and the agents around its old and new locations.
+        Agents moved by other agents are not detected.
+
+        Args:
+            grid (Grid): grid with the agents
+            locate (callable): locate(index) returns the (x, y) location of an agent
+            rng (numpy.random.RandomState): optional generator to shuffle the order of the updates
+        """
+        def around(locations):
+            if len(locations) == 0:
+                return np.empty(0, dtype=int)
+            cells = grid.neighbors_of(locations[:, 0], locations[:, 1]).ravel()
+            ids = grid.ids.ravel()[cells[cells >= 0]]
+            return ids[ids >= 0]
+
+        scheduler = cls(lambda indices: around(scheduler._locate_all(indices)), rng)
+        scheduler.locate = locate
+        scheduler.around = around
+        return scheduler
+
+    @property
+    def num_awake(self):
+        return len(self.pending)
+
+    def step(self, now, agents, env):
+        if len(agents) > self.num_agents:
+            added = np.arange(self.num_agents, len(agents))
+            self.pending = np.union1d(self.pending, added)
+            self.num_agents = len(agents)
+        schedule = self.pending[self.pending < len(agents)]
+        if self.rng is not None:
+            schedule = self.rng.permutation(schedule)
+        self.scheduled = schedule
+        self.pending = np.empty(0, dtype=int)
+        if self.locate is not None:
+            self.locations = self._locate_all(schedule)
+        return schedule
+
+    def record_changes(self, now, agents, changed):
+        changed = np.asarray(changed, dtype=int)
+        stay = [i for i in changed.tolist() if getattr(agents[i], 'stable', None) is not True]
+        unstable = [i for i in self.scheduled.tolist() if getattr(agents[i], 'stable', None) is False]
+        wake = [np.asarray(self.neighbors(changed), dtype=int), np.array(stay + unstable, dtype=int)]
+        if self.locate is not None:
+            locations = self._locate_all(self.scheduled)
+            moved = np.any(locations != self.locations, axis=1)
+            wake.extend([self.scheduled[moved], self.around(self.locations[moved]), self.around(locations[moved])])
+        self.pending = np.union1d(self.pending, np.concatenate(wake))
+
+    def _locate_all(self, indices):
+        return np.array([self.locate(i) for i in indices.tolist()], dtype=int).reshape(-1, 2)
@@ -4,7 +4,10 @@
 
 from abc import ABC, abstractmethod
 import logging
-from .time import NullTerminator
+import numpy as np
+from .agent import AgentStore
+from .scheduling import Scheduler, EventScheduler, BatchSchedule
+from .time import Terminator, NullTerminator, EventTime
 
 
 class Simulation(ABC):
@@ -24,16 +27,37 @@ class BasicSimulation(Simulation):
     This will initialize the agents and the environment.
 
     Args:
-        agents (list): list of initial agents
+        agents (list, AgentStore): list of initial agents
         env (Environment): environment object
         time (Time): time generation object
         scheduler (Scheduler): schedule generation object
         observer (Observer): records and logs data from the simulation
         terminator (Terminator): Optional simulation terminator
         two_stage (bool): Whether to perform a 2 stage update for agents
+        executor (concurrent.futures.Executor): Optional thread pool for updating batches of agents
+        track_changes (bool): Whether to always track the agents whose state changed
+
+    Attributes:
+        changed (np.array): indices of the updated agents whose state changed in the last time step
+                            (None when changes are not tracked)
+
+    Changes are tracked when track_changes is set or when the scheduler or terminator implements
+    record_changes().
+    In a two stage update, an agent changed if its next state differs from its state.
+    Otherwise, an agent changed if its state differs from before its update.
+    Only the state of the updated agents is compared.
+
+    When the scheduler returns a BatchSchedule, the batches are updated one after another.
+    The agents in a batch are updated concurrently with the executor or with step_batch().
+
+    With two_stage and a two stage AgentStore, the agents' next state becomes public by
+    swapping the store's buffers rather than calling complete() on every agent.
+    With an AgentStore that holds BatchAgents, the schedule is grouped by agent class
+    and each class of batch agents is updated with one call to step_batch().
     """
 
-    def __init__(self, agents, env, time, scheduler, observer, terminator=None, two_stage=False):
+    def __init__(self, agents, env, time, scheduler, observer, terminator=None, two_stage=False,
+                 executor=None, track_changes=False):
         self.agents = agents
         self.env = env
         self.time = time
@@ -41,41 +65,129 @@ class BasicSimulation(Simulation):
         self.observer = observer
         self.terminator = terminator if terminator else NullTerminator()
         self.two_stage = two_stage
+        self.executor = executor
+        self.track_changes = track_changes
+        self.changed = None
 
         self.env.init(self.time.start_time)
         for agent in self.agents:
             agent.init(self.time.start_time, self.env)
+        self.double_buffered = two_stage and isinstance(agents, AgentStore) and agents.two_stage
+        if self.double_buffered:
+            self.agents.sync()
 
     def run(self):
         """Run the realization to completion"""
         self.observer.start(self.time.start_time, self.agents, self.env)
+        # decided here since the terminator can be replaced after construction
+        tracking = self._tracking()
         current_time = 0
         for current_time in self.time:
             self.env.step(current_time, self.agents)
             schedule = self.scheduler.step(current_time, self.agents, self.env)
             if self.two_stage:
-                self._update_agents_two_stage(current_time, schedule)
+                self._update_agents_two_stage(current_time, schedule, tracking)
             else:
-                self._update_agents_one_stage(current_time, schedule)
+                self._update_agents_one_stage(current_time, schedule, tracking)
+            if tracking:
+                if isinstance(self.scheduler, Scheduler):
+                    self.scheduler.record_changes(current_time, self.agents, self.changed)
+                self.terminator.record_changes(current_time, self.agents, self.changed)
             self.env.complete(current_time, self.agents)
             self.observer.step(current_time, self.agents, self.env)
             if self.terminator.test(current_time, self.agents, self.env):
                 break
         self.observer.stop(current_time, self.agents, self.env)
 
-    def _update_agents_one_stage(self, current_time, schedule):
-        for index in schedule:
-            self.agents[index].step(current_time, self.env)
+    def _update_agents_one_stage(self, current_time, schedule, tracking=False):
+        if not tracking:
+            self._step_agents(current_time, schedule)
+            return
+        if isinstance(schedule, BatchSchedule):
+            rows = np.concatenate(schedule.batches) if schedule.batches else np.empty(0, dtype=int)
+        else:
+            rows = schedule = self._as_rows(schedule)
+        before = self._states(rows)
+        self._step_agents(current_time, schedule)
+        if isinstance(before, np.ndarray):
+            different = np.any(before != self.agents.state[rows], axis=1)
+        else:
+            different = [state != self._bytes(self.agents[i].state) for i, state in zip(rows.tolist(), before)]
+        self.changed = np.unique(rows[np.array(different, dtype=bool)])
 
-    def _update_agents_two_stage(self, current_time, schedule):
+    def _update_agents_two_stage(self, current_time, schedule, tracking=False):
         # this caches the schedule and reruns it for 2nd stage
+        updated_agents = self._step_agents(current_time, schedule)
+        if self.double_buffered:
+            rows = self._as_rows(updated_agents)
+            if tracking:
+                different = np.any(self.agents.state[rows] != self.agents.next_state[rows], axis=1)
+                self.changed = np.unique(rows[different])
+            # the store copies the updated rows in place of a 2nd pass over the agents
+            self.agents.complete(current_time, self.env, rows)
+            return
+        # agents copy state to complete time step or perform final step calculations
+        if not tracking:
+            for index in updated_agents:
+                self.agents[index].complete(current_time, self.env)
+            return
+        # record the agents whose state changes in the same pass
+        changed = []
+        for index in updated_agents:
+            agent = self.agents[index]
+            state = agent.state
+            if state is not None and state.tobytes() != agent.next_state.tobytes():
+                changed.append(index)
+            agent.complete(current_time, self.env)
+        self.changed = np.unique(np.array(changed, dtype=int))
+
+    def _step_agents(self, current_time, schedule):
+        """Update the scheduled agents and return the indices of the agents that were updated"""
+        if isinstance(schedule, BatchSchedule) and (self.executor or self._batched()):
+            return self._step_batches(current_time, schedule)
+        if self._batched():
+            rows = self._as_rows(schedule)
+            self.agents.step(current_time, self.env, rows)
+            return rows
         updated_agents = []
         for index in schedule:
             self.agents[index].step(current_time, self.env)
             updated_agents.append(index)
-        # agents copy state to complete time step or perform final step calculations
-        for index in updated_agents:
-            self.agents[index].complete(current_time, self.env)
+        return updated_agents
+
+    def _step_batches(self, current_time, schedule):
+        for batch in schedule.batches:
+            if self._batched():
+                self.agents.step(current_time, self.env, batch)
+            else:
+                # consume the iterator to wait for the batch and raise any exceptions
+                list(self.executor.map(lambda index: self.agents[index].step(current_time, self.env),
+                                       batch.tolist()))
+        return np.concatenate(schedule.batches) if schedule.batches else np.empty(0, dtype=int)
+
+    def _batched(self):
+        return isinstance(self.agents, AgentStore) and self.agents.batched
+
+    def _tracking(self):
+        return self.track_changes or \
+            (isinstance(self.terminator, Terminator) and self.terminator.tracks_changes) or \
+            (isinstance(self.scheduler, Scheduler) and self.scheduler.tracks_changes)
+
+    def _states(self, rows):
+        """Copy of the states of agents (a 2D array for a store, otherwise a list of bytes)"""
+        if isinstance(self.agents, AgentStore):
+            return self.agents.state[rows]
+        return [self._bytes(self.agents[i].state) for i in rows.tolist()]
+
+    @staticmethod
+    def _bytes(state):
+        # comparing the raw bytes is much faster than np.array_equal for short vectors
+        # (it treats nan as unchanged and -0.0 as different from 0.0)
+        return None if state is None else state.tobytes()
+
+    @staticmethod
+    def _as_rows(schedule):
+        return schedule if isinstance(schedule, np.ndarray) else np.fromiter(schedule, dtype=int)
 
 
 class TwoStageSimulation(BasicSimulation):
@@ -85,14 +197,73 @@ class TwoStageSimulation(BasicSimulation):
     Each update has two stages for the agents.
 
     Args:
-        agents (list): list of initial agents
+        agents (list, AgentStore): list of initial agents
         env (Environment): environment object
         time (Time): time generation object
         scheduler (Scheduler): schedule generation object
         observer (Observer): records and logs data from the simulation
         terminator (Terminator): Optional simulation terminator
+        executor (concurrent.futures.Executor): Optional thread pool for updating batches of agents
+        track_changes (bool): Whether to always track the agents whose state changed
     """
     logger = logging.getLogger(__name__)
 
-    def __init__(self, agents, env, time, scheduler, observer, terminator=None):
-        super().__init__(agents, env, time, scheduler, observer, terminator, True)
+    def __init__(self, agents, env, time, scheduler, observer, terminator=None, executor=None,
+                 track_changes=False):
+        super().__init__(agents, env, time, scheduler, observer, terminator, True, executor, track_changes)
+
+
+class EventSimulation(BasicSimulation):
+    """Discrete event simulation master
+
+    Runs a single realization of the simulation driven by a queue of (time, agent) events.
+    The simulation jumps directly to the next time with scheduled agents,
+    so times with no activity cost nothing.
+
+    An agent schedules its own next activation by returning a time from step()
+    (batch agents return an array of times from step_batch()).
+    Any other component can schedule an agent with schedule().
+    Scheduling requires a scheduler with a push() method like EventScheduler.
+
+    Args:
+        agents (list, AgentStore): list of initial agents
+        env (Environment): environment object
+        scheduler (Scheduler): scheduler with next_time() or None for a new EventScheduler
+        observer (Observer): records and logs data from the simulation
+        terminator (Terminator): Optional simulation terminator
+        two_stage (bool): Whether to perform a 2 stage update for agents
+        start (int, float): Start time of the simulation
+        stop (int, float): Optional last time of the simulation (inclusive)
+        track_changes (bool): Whether to always track the agents whose state changed
+    """
+    def __init__(self, agents, env, scheduler, observer, terminator=None, two_stage=False,
+                 start=0, stop=None, track_changes=False):
+        scheduler = scheduler if scheduler else EventScheduler()
+        time = EventTime(scheduler, start, stop)
+        super().__init__(agents, env, time, scheduler, observer, terminator, two_stage,
+                         track_changes=track_changes)
+
+    def schedule(self, time, index):
+        """Schedule an agent to update at a time
+
+        Args:
+            time (int, float): time of the update
+            index (int): index of the agent in the agents list
+        """
+        self.scheduler.push(time, index)
+
+    def _step_agents(self, current_time, schedule):
+        if self._batched():
+            rows = self._as_rows(schedule)
+            next_times = self.agents.step(current_time, self.env, rows)
+            scheduled = ~np.isnan(next_times)
+            if np.any(scheduled):
+                self.scheduler.push_many(next_times[scheduled].tolist(), rows[scheduled].tolist())
+            return rows
+        updated_agents = []
+        for index in schedule:
+            next_time = self.agents[index].step(current_time, self.env)
+            if next_time is not None:
+                self.scheduler.push(next_time, index)
+            updated_agents.append(index)
+        return updated_agents
@@ -2,8 +2,94 @@
 # All rights reserved.
 # Distributed under the terms of the Modified BSD License.
 
+import itertools
 import logging
+import numbers
 import numpy as np
+from .scheduling import sample_without_replacement
+
+
+class Neighborhood:
+    """Neighborhood of a grid cell defined by a stencil of offsets
+
+    The neighbors of a single cell are computed from the offsets.
+    For batched queries, the table of neighbor cells for a grid size is computed
+    on first use and reused.
+
+    Args:
+        offsets (list): list of (dx, dy) offsets
+        torus (bool): whether the grid wraps around at the edges
+
+    Attributes:
+        offsets (np.array): offsets (number of neighbors x 2)
+    """
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, offsets, torus=False):
+        self.offsets = np.array(offsets, dtype=int).reshape(-1, 2)
+        self.torus = torus
+        self.tables = {}
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @property
+    def radius(self):
+        return int(np.abs(self.offsets).max()) if len(self.offsets) else 0
+
+    def cells(self, x, y, width, height):
+        """Get the neighbor cells of one cell of a grid
+
+        Cells are flat indices x * height + y.
+        Neighbors outside a bounded grid are dropped.
+
+        Returns:
+            np.array of cells
+        """
+        xs = x + self.offsets[:, 0]
+        ys = y + self.offsets[:, 1]
+        if self.torus:
+            return (xs % width) * height + ys % height
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        return xs[inside] * height + ys[inside]
+
+    def table(self, width, height):
+        """Get the neighbor cells of every cell of a grid
+
+        Cells are flat indices x * height + y.
+        Neighbors outside a bounded grid are -1.
+        The table is built on first use for a grid size (int32 when the cells fit).
+
+        Returns:
+            np.array (width * height x number of neighbors)
+        """
+        key = (width, height)
+        if key not in self.tables:
+            dtype = np.int32 if width * height <= np.iinfo(np.int32).max else np.int64
+            x, y = np.divmod(np.arange(width * height, dtype=dtype), dtype(height))
+            xs = x[:, np.newaxis] + self.offsets[:, 0].astype(dtype)
+            ys = y[:, np.newaxis] + self.offsets[:, 1].astype(dtype)
+            if self.torus:
+                cells = (xs % width) * height + ys % height
+            else:
+                inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+                cells = np.where(inside, xs * height + ys, -1)
+            self.tables[key] = cells.astype(dtype, copy=False)
+        return self.tables[key]
+
+
+class MooreNeighborhood(Neighborhood):
+    """Cells within Chebyshev distance radius (8 neighbors for radius 1)"""
+    def __init__(self, radius=1, torus=False):
+        r = range(-radius, radius + 1)
+        super().__init__([(dx, dy) for dx in r for dy in r if dx != 0 or dy != 0], torus)
+
+
+class VonNeumannNeighborhood(Neighborhood):
+    """Cells within Manhattan distance radius (4 neighbors for radius 1)"""
+    def __init__(self, radius=1, torus=False):
+        r = range(-radius, radius + 1)
+        super().__init__([(dx, dy) for dx in r for dy in r if 0 < abs(dx) + abs(dy) <= radius], torus)
 
 
 class Grid:
@@ -12,26 +98,106 @@ class Grid:
     Only one agent per grid location.
     Zero-based indexing.
 
+    Besides the agent objects, the grid keeps an integer layer of agent ids
+    (EMPTY for empty cells and NO_ID for agents without an integer id)
+    and optional attribute layers that move with the agents (like a color code).
+    The layers support whole grid neighbor statistics as array operations.
+    An index of the empty cells supports picking random empty cells in O(1).
+
     Args:
         width (int): width of the grid (x dimension)
         height (int): height of the grid (y dimension)
+        layers (dict): optional map from layer name to numpy dtype
+        neighborhood (Neighborhood): optional neighborhood (default is Moore with radius 1)
+
+    Attributes:
+        data (np.array): agent objects (width x height)
+        ids (np.array): agent ids (width x height)
+        layers (dict): map from layer name to np.array (width x height)
     """
     logger = logging.getLogger(__name__)
+    EMPTY = -1
+    NO_ID = -2
 
-    def __init__(self, width, height):
+    def __init__(self, width, height, layers=None, neighborhood=None):
         self.width = width
         self.height = height
         self.data = np.empty(shape=(width, height), dtype=object)
+        self.ids = np.full((width, height), self.EMPTY, dtype=np.int64)
+        self.layers = {}
+        self.fills = {}
+        # empty cells as flat indices (x * height + y): dense array and each cell's position in it
+        self.empties = np.arange(width * height)
+        self.empty_positions = np.arange(width * height)
+        self.num_empty = width * height
+        self.neighborhood = neighborhood if neighborhood is not None else MooreNeighborhood()
+        if layers:
+            for name, dtype in layers.items():
+                self.add_layer(name, dtype)
+
+    def add_layer(self, name, dtype=int, fill=0):
+        """Add an attribute layer
+
+        Args:
+            name (str): name of the layer
+            dtype (numpy dtype): type of the values
+            fill: value of empty cells
+        """
+        self.layers[name] = np.full((self.width, self.height), fill, dtype=dtype)
+        self.fills[name] = fill
 
     def occupied(self, x, y):
         """Does anyone live here"""
-        return self.data[x, y] is not None
+        return self.ids[x, y] != self.EMPTY
+
+    def occupancy(self):
+        """Get a boolean array of the occupied cells"""
+        return self.ids != self.EMPTY
+
+    def random_empty(self, rng):
+        """Pick an empty cell uniformly at random
+
+        Args:
+            rng (numpy.random.RandomState): numpy random generator
+
+        Returns:
+            tuple of (x, y) or None if the grid is full
+        """
+        if self.num_empty == 0:
+            return None
+        cell = self.empties[rng.randint(self.num_empty)]
+        return int(cell // self.height), int(cell % self.height)
 
-    def add(self, agent, x, y):
+    def random_empties(self, k, rng):
+        """Pick k different empty cells uniformly at random
+
+        Args:
+            k (int): number of cells (at most the number of empty cells)
+            rng (numpy.random.RandomState): numpy random generator
+
+        Returns:
+            tuple of np.array of x coordinates and np.array of y coordinates
+        """
+        assert(k <= self.num_empty)
+        cells = self.empties[sample_without_replacement(self.num_empty, k, rng)]
+        return cells // self.height, cells % self.height
+
+    def add(self, agent, x, y, **values):
         """Add an agent at the specified location
         Does not check if anyone else lives here first!
+
+        Args:
+            agent (Agent): agent to add
+            x (int): x coordinate
+            y (int): y coordinate
+            values: optional values of the attribute layers for this agent
         """
         self.data[x, y] = agent
+        self._fill(x, y)
+        agent_id = getattr(agent, 'agent_id', None)
+        self.ids[x, y] = agent_id if isinstance(agent_id, numbers.Integral) else self.NO_ID
+        for name, value in values.items():
+            self.layers[name][x, y] = value
 
     def get(self, x, y):
         """Get the current agent that lives here (or None)"""
@@ -40,14 +206,24 @@ class Grid:
     def remove(self, x, y):
         """Remove the agent from here"""
         self.data[x, y] = None
+        self._empty(x, y)
+        self.ids[x, y] = self.EMPTY
+        for name, layer in self.layers.items():
+            layer[x, y] = self.fills[name]
 
     def move(self, x1, y1, x2, y2):
         """Move an agent from location 1 to location 2
         Does not check if anyone lives at location 2!
         """
         agent = self.get(x1, y1)
+        agent_id = self.ids[x1, y1]
+        values = {name: layer[x1, y1] for name, layer in self.layers.items()}
         self.remove(x1, y1)
         self.data[x2, y2] = agent
+        self._fill(x2, y2)
+        self.ids[x2, y2] = agent_id
+        for name, value in values.items():
+            self.layers[name][x2, y2] = value
 
     def neighbors(self, x, y):
         """Get the neighbor agents of this location
@@ -55,11 +231,409 @@ class Grid:
         Returns:
             list of agents
         """
-        neighbors = []
-        positions = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
-        for position in positions:
-            x1 = x + position[0]
-            y1 = y + position[1]
-            if 0 <= x1 < self.width and 0 <= y1 < self.height and self.occupied(x1, y1):
-                neighbors.append(self.data[x1, y1])
-        return neighbors
+        cells = self._neighbor_cells(x, y)
+        cells = cells[self.ids.ravel()[cells] != self.EMPTY]
+        return list(self.data.ravel()[cells])
+
+    def neighbors_of(self, xs, ys, neighborhood=None):
+        """Get the neighbor cells of many cells at once
+
+        Cells are flat indices x * height + y, so they index raveled arrays like grid.ids.ravel().
+        Neighbors outside a bounded grid are -1 and must be masked before indexing.
+
+        Args:
+            xs (np.array): x coordinates
+            ys (np.array): y coordinates
+            neighborhood (Neighborhood): optional neighborhood to use instead of the grid's
+
+        Returns:
+            np.array (number of cells x number of neighbors)
+        """
+        neighborhood = neighborhood if neighborhood is not None else self.neighborhood
+        table = neighborhood.table(self.width, self.height)
+        return table[np.asarray(xs) * self.height + np.asarray(ys)]
+
+    def neighbor_sum(self, values, neighborhood=None):
+        """Sum values over the neighbors of every cell
+
+        Args:
+            values (np.array): array of values (width x height)
+            neighborhood (Neighborhood): optional neighborhood to use instead of the grid's
+
+        Returns:
+            np.array of sums (width x height)
+        """
+        neighborhood = neighborhood if neighborhood is not None else self.neighborhood
+        return neighbor_sum(values, neighborhood)
+
+    def neighbor_count(self, neighborhood=None):
+        """Count the occupied neighbors of every cell
+
+        Returns:
+            np.array of counts (width x height)
+        """
+        return self.neighbor_sum(self.occupancy(), neighborhood)
+
+    def similar_neighbors(self, name, neighborhood=None):
+        """Count the neighbors that have the same layer value for every cell
+
+        Example:
+            similar, total = grid.similar_neighbors('color')
+            happy = similar >= similarity * total
+
+        Args:
+            name (str): name of the layer
+            neighborhood (Neighborhood): optional neighborhood to use instead of the grid's
+
+        Returns:
+            tuple of np.array (width x height) of the number of similar neighbors
+            and the number of occupied neighbors (similar is 0 for empty cells)
+        """
+        occupied = self.occupancy()
+        layer = self.layers[name]
+        total = self.neighbor_sum(occupied, neighborhood)
+        similar = np.zeros_like(total)
+        for value in np.unique(layer[occupied]):
+            same = occupied & (layer == value)
+            similar[same] = self.neighbor_sum(same, neighborhood)[same]
+        return similar, total
+
+    def similar_neighbors_at(self, name, x, y):
+        """Count the neighbors of one cell that have the same layer value as the cell
+
+        Returns:
+            tuple of the number of similar neighbors and the number of occupied neighbors
+        """
+        cells = self._neighbor_cells(x, y)
+        cells = cells[self.ids.ravel()[cells] != self.EMPTY]
+        similar = np.count_nonzero(self.layers[name].ravel()[cells] == self.layers[name][x, y])
+        return int(similar), len(cells)
+
+    def _neighbor_cells(self, x, y):
+        return self.neighborhood.cells(x, y, self.width, self.height)
+
+    def _empty(self, x, y):
+        cell = x * self.height + y
+        if self.empty_positions[cell] == self.EMPTY:
+            self.empties[self.num_empty] = cell
+            self.empty_positions[cell] = self.num_empty
+            self.num_empty += 1
+
+    def _fill(self, x, y):
+        # swap the cell with the last empty cell and drop it
+        cell = x * self.height + y
+        position = self.empty_positions[cell]
+        if position != self.EMPTY:
+            last = self.empties[self.num_empty - 1]
+            self.empties[position] = last
+            self.empty_positions[last] = position
+            self.empty_positions[cell] = self.EMPTY
+            self.num_empty -= 1
+
+
+class FieldLayer:
+    """Array of values over the cells of a grid, like the sugar of each patch
+
+    The operators update every cell at once.
+
+    Args:
+        width (int): width of the grid (x dimension)
+        height (int): height of the grid (y dimension)
+        value (float, np.array): initial value of the cells
+        capacity (float, np.array): optional maximum value of the cells
+        dtype (numpy dtype): type of the values
+        neighborhood (Neighborhood): optional neighborhood for diffusion (default is Moore with radius 1)
+
+    Attributes:
+        values (np.array): values of the cells (width x height)
+        capacity (np.array): maximum values of the cells (width x height) or None
+    """
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, width, height, value=0, capacity=None, dtype=float, neighborhood=None):
+        self.width = width
+        self.height = height
+        self.values = np.zeros((width, height), dtype=dtype)
+        self.values[:] = value
+        self.capacity = None
+        if capacity is not None:
+            self.capacity = np.zeros((width, height), dtype=dtype)
+            self.capacity[:] = capacity
+        self.neighborhood = neighborhood if neighborhood is not None else MooreNeighborhood()
+        self.inside = None
+
+    @classmethod
+    def from_grid(cls, grid, value=0, capacity=None, dtype=float):
+        """Create a layer aligned with a grid that uses the grid's neighborhood"""
+        return cls(grid.width, grid.height, value, capacity, dtype, grid.neighborhood)
+
+    def growback(self, rate=1):
+        """Add rate to every cell up to its capacity"""
+        self.values += rate
+        if self.capacity is not None:
+            np.minimum(self.values, self.capacity, out=self.values)
+
+    def decay(self, rate):
+        """Remove a fraction of the value of every cell (use a float layer)"""
+        self.values *= 1 - rate
+
+    def diffuse(self, rate):
+        """Share a fraction of the value of every cell equally with its neighbors (use a float layer)
+
+        The shares of neighbors outside a bounded grid stay in the cell so the total is conserved.
+        """
+        if self.inside is None:
+            # number of neighbors of each cell that are in the grid
+            self.inside = neighbor_sum(np.ones((self.width, self.height)), self.neighborhood)
+        share = self.values * (rate / len(self.neighborhood))
+        self.values += neighbor_sum(share, self.neighborhood) - share * self.inside
+
+    def harvest(self, xs, ys, amount=None):
+        """Remove value from cells and return how much was taken
+
+        The positions should be different cells (like agents on a Grid).
+
+        Args:
+            xs (np.array): x coordinates
+            ys (np.array): y coordinates
+            amount (float, np.array): optional amount to take (default is everything)
+
+        Returns:
+            np.array of the amounts taken
+        """
+        taken = self.values[xs, ys]
+        if amount is not None:
+            taken = np.minimum(taken, amount)
+        self.values[xs, ys] -= taken
+        return taken
+
+
+def neighbor_sum(values, neighborhood):
+    """Sum values over the neighbors of every cell of a 2D array
+
+    Args:
+        values (np.array): 2D array of values
+        neighborhood (Neighborhood): neighborhood of the cells
+
+    Returns:
+        np.array of sums with the same shape as values
+    """
+    values = np.asarray(values)
+    if values.dtype == bool:
+        values = values.astype(np.int64)
+    width, height = values.shape
+    r = neighborhood.radius
+    padded = np.pad(values, r, mode='wrap' if neighborhood.torus else 'constant')
+    sums = np.zeros(values.shape, dtype=values.dtype)
+    for dx, dy in neighborhood.offsets.tolist():
+        sums += padded[r + dx:r + dx + width, r + dy:r + dy + height]
+    return sums
+
+
+class ContinuousSpace:
+    """Continuous 2D or 3D space with a uniform cell list for radius queries
+
+    Positions are stored in one array with a row per agent (the agent index).
+    The space is divided into cells with sides of at least cell_size
+    and the agents are bucketed by cell.
+    A radius query only compares against the agents in the nearby cells,
+    so queries are fast when cell_size is about the query radius.
+    The buckets are rebuilt lazily after agents move.
+    If the positions array is modified in place, call update() before querying.
+
+    Example:
+        space = ContinuousSpace((100, 100), cell_size=3, torus=True)
+        space.extend(rng.uniform(0, 100, size=(1000, 2)))
+        offsets, neighbors = space.query_agents(3)
+        # neighbors of agent i are neighbors[offsets[i]:offsets[i + 1]]
+
+    Args:
+        size (tuple): extent of the space in each dimension (2 or 3 dimensions)
+        cell_size (float): minimum side of a cell (usually the query radius)
+        torus (bool): whether the space wraps around at the edges
+        capacity (int): optional initial number of rows to allocate
+    """
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, size, cell_size, torus=False, capacity=0):
+        assert(len(size) in (2, 3))
+        assert(cell_size > 0)
+        self.size = np.array(size, dtype=float)
+        self.dims = len(size)
+        self.torus = torus
+        self.shape = np.maximum(np.floor(self.size / cell_size).astype(int), 1)
+        self.cell_width = self.size / self.shape
+        self._positions = np.zeros((capacity, self.dims))
+        self._active = np.zeros(capacity, dtype=bool)
+        self.count = 0
+        self.dirty = True
+        self.order = None
+        self.starts = None
+        self.counts = None
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def positions(self):
+        """Positions of the agents (rows of removed agents are not meaningful)"""
+        return self._positions[:self.count]
+
+    @property
+    def active(self):
+        """Boolean array of the agents that are in the space"""
+        return self._active[:self.count]
+
+    def add(self, position):
+        """Add an agent at a position and return its index"""
+        return int(self.extend(np.reshape(position, (1, self.dims)))[0])
+
+    def extend(self, positions):
+        """Add agents at the positions and return their indices"""
+        positions = np.asarray(positions, dtype=float)
+        start = self.count
+        self._grow(start + len(positions))
+        self.count += len(positions)
+        self._positions[start:self.count] = self.wrap(positions)
+        self._active[start:self.count] = True
+        self.dirty = True
+        return np.arange(start, self.count)
+
+    def remove(self, index):
+        """Remove the agent from the space (its index is not reused)"""
+        self._active[index] = False
+        self.dirty = True
+
+    def move(self, index, position):
+        """Move an agent to a position (wrapped on a torus)"""
+        self._positions[index] = self.wrap(np.asarray(position, dtype=float))
+        self.dirty = True
+
+    def set_positions(self, positions):
+        """Move all agents at once"""
+        self._positions[:self.count] = self.wrap(np.asarray(positions, dtype=float))
+        self.dirty = True
+
+    def update(self):
+        """Mark the positions as changed so the cells are rebuilt"""
+        self.dirty = True
+
+    def wrap(self, positions):
+        """Wrap positions into the space on a torus"""
+        return np.mod(positions, self.size) if self.torus else positions
+
+    def displacement(self, p1, p2):
+        """Vector from p2 to p1 (shortest across the edges on a torus)"""
+        d = np.asarray(p1, dtype=float) - np.asarray(p2, dtype=float)
+        if self.torus:
+            d -= self.size * np.round(d / self.size)
+        return d
+
+    def distance(self, p1, p2):
+        """Euclidean distance between positions (shortest across the edges on a torus)"""
+        return np.sqrt(np.sum(self.displacement(p1, p2) ** 2, axis=-1))
+
+    def neighbors(self, position, radius):
+        """Get the indices of the agents within radius of a position
+
+        Returns:
+            np.array of agent indices
+        """
+        _, indices = self.query(np.reshape(position, (1, self.dims)), radius)
+        return indices
+
+    def query(self, points, radius):
+        """Find the agents within radius of many points at once
+
+        Returns:
+            tuple of offsets and indices (compressed sparse rows)
+            where the agents near point i are indices[offsets[i]:offsets[i + 1]]
+        """
+        return self._query(np.asarray(points, dtype=float), radius, None)
+
+    def query_agents(self, radius, indices=None):
+        """Find the neighbors within radius of agents (not including themselves)
+
+        Args:
+            radius (float): query radius
+            indices (np.array): optional agents to query (default is all agents in the space)
+
+        Returns:
+            tuple of offsets and indices (compressed sparse rows)
+            where the neighbors of the i-th queried agent are indices[offsets[i]:offsets[i + 1]]
+        """
+        if indices is None:
+            indices = np.arange(self.count)
+        indices = np.asarray(indices, dtype=int)
+        return self._query(self._positions[indices], radius, indices)
+
+    def _query(self, points, radius, exclude):
+        self._build()
+        cells = self._cell_coords(points)
+        query_ids = []
+        candidate_cells = []
+        for offset in self._offsets(radius):
+            neighbor = cells + offset
+            if self.torus:
+                neighbor %= self.shape
+                valid = np.ones(len(points), dtype=bool)
+            else:
+                valid = np.all((neighbor >= 0) & (neighbor < self.shape), axis=1)
+            query_ids.append(np.flatnonzero(valid))
+            candidate_cells.append(np.ravel_multi_index(neighbor[valid].T, self.shape))
+        query_ids = np.concatenate(query_ids)
+        candidate_cells = np.concatenate(candidate_cells)
+
+        # expand each (query, cell) pair into the agents in the cell
+        counts = self.counts[candidate_cells]
+        queries = np.repeat(query_ids, counts)
+        first = np.repeat(self.starts[candidate_cells] - np.cumsum(counts) + counts, counts)
+        candidates = self.order[first + np.arange(len(queries))]
+
+        d = self.displacement(points[queries], self._positions[candidates])
+        keep = np.sum(d * d, axis=1) <= radius * radius
+        if exclude is not None:
+            keep &= candidates != exclude[queries]
+        queries = queries[keep]
+        candidates = candidates[keep]
+        sort = np.argsort(queries, kind='stable')
+        offsets = np.zeros(len(points) + 1, dtype=int)
+        np.cumsum(np.bincount(queries, minlength=len(points)), out=offsets[1:])
+        return offsets, candidates[sort]
+
+    def _offsets(self, radius):
+        ranges = []
+        for n, width in zip(self.shape, self.cell_width):
+            span = int(np.ceil(radius / width))
+            if self.torus and 2 * span + 1 > n:
+                # every cell once
+                ranges.append(range(-((n - 1) // 2), n - (n - 1) // 2))
+            else:
+                span = min(span, n - 1)
+                ranges.append(range(-span, span + 1))
+        return np.array(list(itertools.product(*ranges)), dtype=int)
+
+    def _cell_coords(self, points):
+        coords = np.floor(points / self.cell_width).astype(int)
+        return np.clip(coords, 0, self.shape - 1)
+
+    def _build(self):
+        if not self.dirty:
+            return
+        rows = np.flatnonzero(self.active)
+        cells = np.ravel_multi_index(self._cell_coords(self._positions[rows]).T, self.shape)
+        self.order = rows[np.argsort(cells, kind='stable')]
+        self.counts = np.bincount(cells, minlength=int(np.prod(self.shape)))
+        self.starts = np.cumsum(self.counts) - self.counts
+        self.dirty = False
+
+    def _grow(self, size):
+        capacity = len(self._positions)
+        if size > capacity:
+            capacity = max(size, 2 * capacity)
+            positions = np.zeros((capacity, self.dims))
+            positions[:self.count] = self._positions[:self.count]
+            active = np.zeros(capacity, dtype=bool)
+            active[:self.count] = self._active[:self.count]
+            self._positions = positions
+            self._active = active
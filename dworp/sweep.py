@@ -0,0 +1,411 @@
+# Copyright 2018, The Johns Hopkins University Applied Physics Laboratory LLC
+# All rights reserved.
+# Distributed under the terms of the Modified BSD License.
+
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import itertools
+import logging
+import numbers
+import numpy as np
+import os
+import time
+from .runner import Runner, run_once
+
+
+class Design(ABC):
+    """Experimental design over the parameters of a simulation
+
+    A design is a list of parameter sets.
+    Each parameter set is a dict from parameter name to value.
+    """
+    logger = logging.getLogger(__name__)
+
+    @abstractmethod
+    def points(self):
+        """Get the parameter sets of the design
+
+        Returns:
+            list of dicts
+        """
+        pass
+
+    def __len__(self):
+        return len(self.points())
+
+
+class FullFactorialDesign(Design):
+    """Every combination of the levels of the parameters
+
+    FullFactorialDesign({'features': [5, 10], 'traits': [5, 10, 15]}) has 6 parameter sets.
+
+    Args:
+        levels (dict): map from parameter name to list of values
+    """
+    def __init__(self, levels):
+        self.levels = levels
+
+    def points(self):
+        names = list(self.levels)
+        return [dict(zip(names, values)) for values in itertools.product(*self.levels.values())]
+
+
+class LatinHypercubeDesign(Design):
+    """Latin hypercube sample of continuous parameters
+
+    Each parameter's range is split into num_samples equal intervals
+    and every interval is sampled exactly once.
+
+    Args:
+        ranges (dict): map from parameter name to (low, high)
+        num_samples (int): number of parameter sets
+        rng (numpy.random.RandomState): numpy random generator
+    """
+    def __init__(self, ranges, num_samples, rng):
+        self.ranges = ranges
+        self.num_samples = num_samples
+        self.samples = self._sample(len(ranges), num_samples, rng)
+
+    def points(self):
+        return _scale(self.ranges, self.samples)
+
+    @staticmethod
+    def _sample(num_dims, num_samples, rng):
+        samples = np.zeros((num_samples, num_dims))
+        for dim in range(num_dims):
+            samples[:, dim] = (rng.permutation(num_samples) + rng.uniform(size=num_samples)) / num_samples
+        return samples
+
+
+class SobolDesign(Design):
+    """Sobol low discrepancy sequence over continuous parameters
+
+    Uses the direction numbers of Joe and Kuo (new-joe-kuo-6.21201) for up to 21 parameters.
+    The sequence starts at its first point (all parameters at the low end of their range)
+    unless skip is set.
+
+    Args:
+        ranges (dict): map from parameter name to (low, high)
+        num_samples (int): number of parameter sets
+        skip (int): optional number of initial points of the sequence to skip
+    """
+    BITS = 30
+    # (degree, coefficients, initial direction numbers) for dimensions 2 to 21
+    DIRECTION_NUMBERS = [
+        (1, 0, [1]), (2, 1, [1, 3]), (3, 1, [1, 3, 1]), (3, 2, [1, 1, 1]), (4, 1, [1, 1, 3, 3]),
+        (4, 4, [1, 3, 5, 13]), (5, 2, [1, 1, 5, 5, 17]), (5, 4, [1, 1, 5, 5, 5]),
+        (5, 7, [1, 1, 7, 11, 19]), (5, 11, [1, 1, 5, 1, 1]), (5, 13, [1, 1, 1, 3, 11]),
+        (5, 14, [1, 3, 5, 5, 31]), (6, 1, [1, 3, 3, 9, 7, 49]), (6, 13, [1, 1, 1, 15, 21, 21]),
+        (6, 16, [1, 3, 1, 13, 27, 49]), (6, 19, [1, 1, 1, 15, 7, 5]), (6, 22, [1, 3, 1, 15, 13, 25]),
+        (6, 25, [1, 1, 5, 5, 19, 61]), (7, 1, [1, 3, 7, 11, 23, 15, 103]),
+        (7, 4, [1, 3, 7, 13, 13, 15, 69]),
+    ]
+    MAX_DIMS = len(DIRECTION_NUMBERS) + 1
+
+    def __init__(self, ranges, num_samples, skip=0):
+        assert(len(ranges) <= self.MAX_DIMS)
+        assert(num_samples + skip <= 2 ** self.BITS)
+        self.ranges = ranges
+        self.num_samples = num_samples
+        self.samples = self._sample(len(ranges), num_samples + skip)[skip:]
+
+    def points(self):
+        return _scale(self.ranges, self.samples)
+
+    @classmethod
+    def _directions(cls, num_dims):
+        bits = cls.BITS
+        v = np.zeros((num_dims, bits), dtype=np.int64)
+        v[0] = [1 << (bits - 1 - i) for i in range(bits)]
+        for dim in range(1, num_dims):
+            degree, coeffs, m = cls.DIRECTION_NUMBERS[dim - 1]
+            for i in range(bits):
+                if i < degree:
+                    v[dim, i] = m[i] << (bits - 1 - i)
+                else:
+                    x = v[dim, i - degree] ^ (v[dim, i - degree] >> degree)
+                    for k in range(1, degree):
+                        if (coeffs >> (degree - 1 - k)) & 1:
+                            x ^= v[dim, i - k]
+                    v[dim, i] = x
+        return v
+
+    @classmethod
+    def _sample(cls, num_dims, num_samples):
+        # Gray code ordering: point i+1 flips the direction number of the lowest zero bit of i
+        v = cls._directions(num_dims)
+        index = np.arange(num_samples - 1)
+        lowest_zero = np.zeros(num_samples - 1, dtype=int)
+        while np.any(index & 1):
+            odd = (index & 1) == 1
+            lowest_zero[odd] += 1
+            index = np.where(odd, index >> 1, index)
+        codes = np.zeros((num_samples, num_dims), dtype=np.int64)
+        if num_samples > 1:
+            codes[1:] = np.bitwise_xor.accumulate(v[:, lowest_zero].T, axis=0)
+        return codes / float(2 ** cls.BITS)
+
+
+def _scale(ranges, samples):
+    names = list(ranges)
+    low = np.array([ranges[name][0] for name in names], dtype=float)
+    high = np.array([ranges[name][1] for name in names], dtype=float)
+    values = low + samples * (high - low)
+    return [dict(zip(names, row.tolist())) for row in values]
+
+
+class ResultTable:
+    """Columnar table that rows are appended to as runs finish
+
+    Columns are numpy arrays preallocated to the capacity of the table.
+    A column is created when it first appears in a row with a type based on that value:
+    bool, int64 (missing is -1), float64 (missing is nan), or object (missing is None).
+
+    Args:
+        capacity (int): maximum number of rows
+
+    Attributes:
+        columns (dict): map from column name to numpy array (includes unused rows)
+    """
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.size = 0
+        self.columns = {}
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, name):
+        return self.columns[name][:self.size]
+
+    def names(self):
+        return list(self.columns)
+
+    def append(self, row):
+        """Append a row
+
+        Args:
+            row (dict): map from column name to value
+        """
+        assert(self.size < self.capacity)
+        for name, value in row.items():
+            if name not in self.columns:
+                self.columns[name] = self._create_column(value)
+            column = self.columns[name]
+            if not self._fits(column, value):
+                column = self.columns[name] = column.astype(self._dtype(value, column.dtype))
+            column[self.size] = value
+        self.size += 1
+
+    def save(self, path):
+        """Save the finished rows to a numpy .npz file
+
+        Object columns are saved as strings.
+        """
+        data = {name: self[name] if self[name].dtype != object else self[name].astype(str)
+                for name in self.columns}
+        np.savez(path, **data)
+
+    def _create_column(self, value):
+        dtype = self._dtype(value)
+        column = np.empty(self.capacity, dtype=dtype)
+        column.fill(self._missing(dtype))
+        return column
+
+    @staticmethod
+    def _dtype(value, current=None):
+        if current is not None and current == object:
+            return object
+        if isinstance(value, (bool, np.bool_)) and current in (None, bool):
+            return bool
+        if isinstance(value, numbers.Integral) and not isinstance(value, (bool, np.bool_)) and \
+                current in (None, np.int64):
+            return np.int64
+        if isinstance(value, numbers.Real) and not isinstance(value, (bool, np.bool_)):
+            return np.float64
+        return object
+
+    @classmethod
+    def _fits(cls, column, value):
+        return cls._dtype(value, column.dtype) == column.dtype
+
+    @staticmethod
+    def _missing(dtype):
+        if dtype == bool:
+            return False
+        if dtype == np.int64:
+            return -1
+        if dtype == np.float64:
+            return np.nan
+        return None
+
+
+class Sweep:
+    """Run a simulation over an experimental design in parallel
+
+    Jobs are submitted longest expected first when a cost function is given
+    so that long runs do not start last and leave workers idle.
+    As runs finish, their parameters, replicate, status, time and result are appended
+    to a ResultTable that can be saved periodically.
+    A run that raises an exception has status "error" and its message is recorded.
+    A run that exceeds the timeout is stopped after its current time step with status "timeout".
+    Each worker process runs one job at a time, so a run that kills its process
+    is recorded as an error and the process is replaced without affecting the other runs.
+    A run that is still going grace seconds after the timeout (hung in the factory, a step, or the measure)
+    has its worker process killed and replaced and is recorded as a timeout.
+    Killing hung runs requires worker processes (max_workers other than 1).
+
+    Example:
+        design = FullFactorialDesign({'features': [5, 10, 15], 'traits': [5, 10, 15]})
+        sweep = Sweep(create, measure=count_regions, seed=8675, cost=lambda p: p['traits'])
+        table = sweep.run(design, replicates=20, path='table2.npz')
+
+    Args:
+        factory (callable): factory(params, rng) returns a Simulation
+        measure (callable): optional measure(sim) returns the result of a completed run
+        max_workers (int): number of worker processes (default is the number of CPUs)
+                           If 1, the runs are done in this process.
+        seed (int): optional seed for the root of the random number streams
+        cost (callable): optional cost(params) returns the expected run time (any units)
+        timeout (float): optional wall clock limit in seconds for each run
+        grace (float): seconds past the timeout before the worker of a run is killed
+
+    Attributes:
+        runner (Runner): runner with the factory, measure, workers and seed of the sweep
+    """
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, factory, measure=None, max_workers=None, seed=None, cost=None, timeout=None, grace=10):
+        self.runner = Runner(factory, measure, max_workers, seed)
+        self.cost = cost
+        self.timeout = timeout
+        self.grace = grace
+
+    def run(self, design, replicates=1, path=None, save_every=100):
+        """Run every parameter set of the design
+
+        Args:
+            design (Design, list): design or list of parameter sets (dicts)
+            replicates (int): number of runs for each parameter set
+            path (str): optional path of .npz file to save the table to
+            save_every (int): number of finished runs between saves
+
+        Returns:
+            ResultTable
+        """
+        runner = self.runner
+        params = design.points() if isinstance(design, Design) else list(design)
+        streams = np.random.SeedSequence(runner.seed).spawn(len(params) * replicates)
+        # (parameter set, replicate, run, seed)
+        jobs = [(i, k, i * replicates + k, streams[i * replicates + k])
+                for i in range(len(params)) for k in range(replicates)]
+        if self.cost:
+            costs = [self.cost(p) for p in params]
+            jobs.sort(key=lambda job: costs[job[0]], reverse=True)
+        table = ResultTable(len(jobs))
+
+        if runner.max_workers == 1:
+            outputs = ((job, run_job(runner.factory, runner.measure, params[job[0]], job[3], self.timeout))
+                       for job in jobs)
+        else:
+            outputs = self._parallel(jobs, params)
+        self._stream(outputs, params, table, path, save_every)
+        return table
+
+    def _parallel(self, jobs, params):
+        # one single process pool per worker so a dead process only breaks its own job
+        runner = self.runner
+        num_workers = runner.max_workers or os.cpu_count() or 1
+        executors = [ProcessPoolExecutor(max_workers=1) for _ in range(min(num_workers, len(jobs)))]
+        pending = iter(jobs)
+        # future -> (job, slot, start time)
+        running = {}
+
+        def submit(slot):
+            job = next(pending, None)
+            if job is not None:
+                future = executors[slot].submit(run_job, runner.factory, runner.measure, params[job[0]],
+                                                job[3], self.timeout)
+                running[future] = (job, slot, time.perf_counter())
+
+        def replace(slot, kill=False):
+            if kill:
+                # the executor has no public way to stop a running job
+                for process in list(executors[slot]._processes.values()):
+                    process.kill()
+            executors[slot].shutdown(wait=False)
+            executors[slot] = ProcessPoolExecutor(max_workers=1)
+
+        try:
+            for slot in range(len(executors)):
+                submit(slot)
+            while running:
+                limit = None
+                if self.timeout is not None:
+                    first = min(start for _, _, start in running.values())
+                    limit = max(0, first + self.timeout + self.grace - time.perf_counter())
+                done, _ = wait(running, timeout=limit, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job, slot, start = running.pop(future)
+                    output = self._output(future)
+                    if isinstance(future.exception(), BrokenProcessPool):
+                        replace(slot)
+                    yield job, output
+                    submit(slot)
+                if self.timeout is not None:
+                    now = time.perf_counter()
+                    hung = [future for future, (_, _, start) in running.items()
+                            if now - start >= self.timeout + self.grace and not future.done()]
+                    for future in hung:
+                        job, slot, start = running.pop(future)
+                        replace(slot, kill=True)
+                        yield job, ('timeout', "Run exceeded {}s and its worker was killed".format(self.timeout),
+                                    now - start)
+                        submit(slot)
+        finally:
+            for executor in executors:
+                executor.shutdown()
+
+    def _stream(self, outputs, params, table, path, save_every):
+        for job, (status, value, elapsed) in outputs:
+            row = {'run': job[2], 'param_set': job[0], 'replicate': job[1]}
+            row.update(params[job[0]])
+            row.update({'status': status, 'elapsed': elapsed})
+            row['result' if status == 'ok' else 'message'] = value
+            table.append(row)
+            if status != 'ok':
+                self.logger.warning("Run {} of parameter set {}: {} {}".format(job[1], job[0], status, value))
+            if path and len(table) % save_every == 0:
+                table.save(path)
+        if path:
+            table.save(path)
+
+    @staticmethod
+    def _output(future):
+        # a run that kills its worker process breaks the pool of that worker
+        try:
+            return future.result()
+        except BrokenProcessPool as e:
+            return 'error', 'worker process died: ' + repr(e), np.nan
+        except Exception as e:
+            return 'error', repr(e), np.nan
+
+
+def run_job(factory, measure, params, seed, timeout=None):
+    """Run a single realization and capture failures
+
+    Returns:
+        tuple of (status, result or error message, elapsed time in seconds)
+        where status is "ok", "error", or "timeout"
+    """
+    start = time.perf_counter()
+    try:
+        result, elapsed = run_once(factory, measure, params, seed, timeout)
+        return 'ok', result, elapsed
+    except TimeoutError as e:
+        return 'timeout', str(e), time.perf_counter() - start
+    except Exception as e:
+        return 'error', repr(e), time.perf_counter() - start
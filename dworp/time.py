@@ -5,6 +5,9 @@
 from abc import ABC, abstractmethod
 from collections.abc import Iterator
 import logging
+import numpy as np
+import time
+from .network import CSRNetwork
 
 
 class Time(Iterator):
@@ -98,6 +101,33 @@ class InfiniteTime(Time):
         return self.time
 
 
+class EventTime(Time):
+    """Jumps to the next time that has agents scheduled
+
+    The scheduler must implement next_time() which returns the next scheduled time
+    or None when there is nothing left to schedule.
+    Times with no agents scheduled are skipped so the simulation does not run
+    the environment, observer, or terminator at those times.
+
+    Args:
+        scheduler (Scheduler): scheduler with a next_time() method
+        start (int or float, optional): Start time of the simulation
+        stop (int or float, optional): Last time of the simulation (inclusive)
+    """
+    def __init__(self, scheduler, start=0, stop=None):
+        self.scheduler = scheduler
+        self.start_time = start
+        self.time = start
+        self.stop_time = stop
+
+    def __next__(self):
+        next_time = self.scheduler.next_time()
+        if next_time is None or (self.stop_time is not None and next_time > self.stop_time):
+            raise StopIteration
+        self.time = next_time
+        return self.time
+
+
 class Terminator(ABC):
     """Terminate the simulation when a convergence criteria is achieved"""
     logger = logging.getLogger(__name__)
@@ -116,8 +146,133 @@ class Terminator(ABC):
         """
         pass
 
+    def record_changes(self, now, agents, changed):
+        """Receive the agents whose state changed this time step
+
+        Implement this to have the simulation track changes.
+        It is called after the agents are updated and before test().
+
+        Args:
+            now: (int, float): current time of the simulation
+            agents (list): list of Agent objects
+            changed (np.array): indices of the updated agents whose state changed
+        """
+        pass
+
+    @property
+    def tracks_changes(self):
+        """Whether this terminator needs the changed agents"""
+        return type(self).record_changes is not Terminator.record_changes
+
 
 class NullTerminator(Terminator):
     """Never terminate!"""
     def test(self, now, agents, env):
         return False
+
+
+class DeadlineTerminator(Terminator):
+    """Terminate when a wall clock time limit is reached
+
+    Wraps another terminator so it can be added to an existing simulation.
+
+    Args:
+        seconds (float): wall clock time limit measured from creation
+        terminator (Terminator): optional terminator that can also stop the simulation
+
+    Attributes:
+        expired (bool): whether the time limit stopped the simulation
+    """
+    def __init__(self, seconds, terminator=None):
+        self.deadline = time.perf_counter() + seconds
+        self.terminator = terminator if terminator else NullTerminator()
+        self.expired = False
+
+    def test(self, now, agents, env):
+        if time.perf_counter() > self.deadline:
+            self.expired = True
+            return True
+        return self.terminator.test(now, agents, env)
+
+    def record_changes(self, now, agents, changed):
+        self.terminator.record_changes(now, agents, changed)
+
+    @property
+    def tracks_changes(self):
+        return isinstance(self.terminator, Terminator) and self.terminator.tracks_changes
+
+
+class StableTerminator(Terminator):
+    """Terminate when no agent has changed state for a number of time steps
+
+    Args:
+        steps (int): number of consecutive time steps without changes
+    """
+    def __init__(self, steps=1):
+        self.steps = steps
+        self.stable_steps = 0
+
+    def record_changes(self, now, agents, changed):
+        self.stable_steps = 0 if len(changed) else self.stable_steps + 1
+
+    def test(self, now, agents, env):
+        return self.stable_steps >= self.steps
+
+
+class EdgeTerminator(Terminator):
+    """Terminate when no edge of the network is active
+
+    An edge is active when the agents at its ends can still change each other
+    (like Axelrod neighbors that share some but not all features).
+    All edges are checked at the first test and after that only the edges of agents that changed.
+
+    Args:
+        active (callable): active(states1, states2) returns a boolean array for the rows of states
+                           of the agents at the two ends of edges
+        network (CSRNetwork): optional network over the agents (default is env.network)
+
+    Attributes:
+        num_active (int): number of active edges at the last test
+    """
+    def __init__(self, active, network=None):
+        self.active = active
+        self.network = network
+        self.sources = None
+        self.incoming = None
+        self.flags = None
+        self.num_active = None
+
+    def record_changes(self, now, agents, changed):
+        if self.flags is None or len(changed) == 0:
+            return
+        outgoing = self.network.edges_of(changed)
+        incoming = self.incoming.indices[self.incoming.edges_of(changed)]
+        edges = np.union1d(outgoing, incoming)
+        old = np.count_nonzero(self.flags[edges])
+        self.flags[edges] = self._test_edges(agents, edges)
+        self.num_active += np.count_nonzero(self.flags[edges]) - old
+
+    def test(self, now, agents, env):
+        if self.flags is None:
+            self.network = CSRNetwork.from_network(self.network if self.network is not None else env.network)
+            self.sources = self.network.sources()
+            # the edges into each node as rows of edge positions
+            indptr = np.zeros(len(self.network) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.network.indices, minlength=len(self.network)), out=indptr[1:])
+            self.incoming = CSRNetwork(indptr, np.argsort(self.network.indices, kind='stable'))
+            self.flags = self._test_edges(agents, np.arange(self.network.num_edges))
+            self.num_active = int(np.count_nonzero(self.flags))
+        return self.num_active == 0
+
+    def _test_edges(self, agents, edges):
+        if len(edges) == 0:
+            return np.zeros(0, dtype=bool)
+        sources = self.sources[edges]
+        targets = self.network.indices[edges]
+        if isinstance(getattr(agents, 'state', None), np.ndarray):
+            states = agents.state
+            return np.asarray(self.active(states[sources], states[targets]), dtype=bool)
+        states = {i: agents[i].state for i in np.union1d(sources, targets).tolist()}
+        return np.asarray(self.active(np.array([states[i] for i in sources.tolist()]),
+                                      np.array([states[i] for i in targets.tolist()])), dtype=bool)
+
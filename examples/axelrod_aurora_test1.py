@@ -98,60 +98,14 @@ class AxelrodEnvironment(dworp.NetworkEnvironment):
 class AxelrodObserver(dworp.Observer):
     def __init__(self, printby):
         self.printby = printby
+        self.counter = None
 
     def computenumregions(self, time, agents, env):
-        # Method: we construct a dictionary whose keys are a features array and whose values are a list of lists of
-        # contiguous agents. As we step through the entire list of agents, if that agent's features array is already in
-        # the dict, then we check if is is a neighbor of any of the agents in lists. If it's a neighbor to more than one
-        # list, then we merge the lists
-        regiondict = dict()
-        for i in range(0,len(agents)):
-            curstate = tuple(agents[i].state.tolist())
-            try:
-                curval = regiondict[curstate]
-                myneighbors = agents[i].vertex.neighbors()
-                myneighborIDs = [a["agent"].agent_id for a in myneighbors]
-                myNset = set(myneighborIDs)
-                indsIamIn = []
-                for k in range(0,len(curval)):
-                    curlistagents = curval[k]
-                    curlistagentIDs = [b.agent_id for b in curlistagents]
-                    if not myNset.isdisjoint(curlistagentIDs):
-                        indsIamIn.append(k)
-                # we should have a list now of indices of sublists I am in
-                if len(indsIamIn) > 1: # we need to merge
-                    newlist = []
-                    mergedlist = []
-                    newlist.append(mergedlist)
-                    place = 1
-                    for k in range(0,len(curval)):
-                        if k in indsIamIn:
-                            mergedlist.extend(curval[k])
-                        else:
-                            #newlist[place] = curval[k]
-                            newlist.append(curval[k])
-                            place = place + 1
-                    mergedlist.append(agents[i])
-                    regiondict[curstate] = newlist
-                elif len(indsIamIn) == 1: # just need to add to the right list
-                    thislist = curval[indsIamIn[0]]
-                    thislist.append(agents[i])
-                else: # need to make a new list
-                    newlist = []
-                    newlist.append(agents[i])
-                    curval.append(newlist)
-            except KeyError:
-                newlist = []
-                componentlist = []
-                componentlist.append(agents[i])
-                newlist.append(componentlist)
-                regiondict[curstate] = newlist
-        # when done, the count is the same as the number of element lists in the vals of the regiondict
-        count = 0
-        for key in regiondict.keys():
-            curval = regiondict[key]
-            count = count + len(curval)
-        return count
+        # A region is a connected set of neighboring agents with identical features.
+        # The counter only relabels the regions around agents that changed since the last count.
+        if self.counter is None:
+            self.counter = dworp.RegionCounter(env.network)
+        return self.counter.update(np.array([agent.state for agent in agents]))
 
     def step(self, now, agents, env):
         # A cultural region is defined as a set of contiguous sites with identical cultural features
@@ -165,37 +119,22 @@ class AxelrodObserver(dworp.Observer):
         print("Simulation over")
 
 
-class AxelrodTerminator(dworp.Terminator):
-    def __init__(self, printby):
-        self.printby = printby
+class AxelrodTerminator(dworp.EdgeTerminator):
+    def __init__(self):
+        # no more changes can happen when all neighboring sites have either no features in common
+        # or all features in common, so only the edges of sites that changed are checked each step
+        super().__init__(self.can_change)
+
+    @staticmethod
+    def can_change(states1, states2):
+        same = np.abs(states1 - states2) < 0.001
+        return np.any(same, axis=1) & ~np.all(same, axis=1)
 
     def test(self, now, agents, env):
-        # no more changes can happen when all neighboring sites either no features in common or all features in common
-        # make sure you only check this when current_time modulo printby == 0 (otherwise too much computation)
-        if now % self.printby != 0:
-            return False
-        else:
-            found_pair_that_can_change = False
-            for i in range(0,len(agents)):
-                curstate = agents[i].state
-                myneighbors = agents[i].vertex.neighbors()
-                for j in range(0,len(myneighbors)):
-                    curneivert = myneighbors[j]
-                    neistate = curneivert["agent"].state
-                    # are they all the same
-                    #if not np.all(curstate == neistate) or np.all(curstate != neistate):
-                    if not (np.sum(abs(curstate - neistate)) < 0.001 or np.all(abs(curstate - neistate) > 0.001)):
-                        # if not (this pair has the same features) or (this pair shares no common features),
-                        # => this pair must have some features that are the same, but not all
-                        found_pair_that_can_change = True
-                        #pdb.set_trace()
-                        break
-                if found_pair_that_can_change:
-                    break
-            terminate = not found_pair_that_can_change # dont terminate if you found change could happen
-            if terminate:
-                print("Terminating simulation early at time = {} because no neighboring agents can change".format(now))
-            return terminate
+        terminate = super().test(now, agents, env)
+        if terminate:
+            print("Terminating simulation early at time = {} because no neighboring agents can change".format(now))
+        return terminate
 
 
 class RegressionTest:
@@ -215,7 +154,7 @@ class RegressionTest:
         # ensuring reproducibility by setting the seed
         scheduler = dworp.RandomOrderScheduler(np.random.RandomState(4587))
         observer = AxelrodObserver(1000)
-        term = AxelrodTerminator(1000)
+        term = AxelrodTerminator()
         sim = dworp.TwoStageSimulation(agents, env, time, scheduler, observer,terminator=term)
 
         sim.run()
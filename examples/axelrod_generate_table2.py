@@ -21,7 +21,6 @@ numtraits_list = [5,10,15]
 N = 20 # Number of trials to average over
 
 printby = 1000
-checkby = 100
 
 logging.basicConfig(level=logging.WARN)
 
@@ -46,7 +45,7 @@ place = 0
 g = igraph.Graph.Lattice([xdim,ydim], nei=1, directed=False, circular=False)
 env = axelrod_aurora_test1.AxelrodEnvironment(g)
 observer = axelrod_aurora_test1.AxelrodObserver(printby)
-term = axelrod_aurora_test1.AxelrodTerminator(checkby)
+term = axelrod_aurora_test1.AxelrodTerminator()
 for i in range(0,len(features_list)):
     num_features = features_list[i]
     for j in range(0,len(numtraits_list)):
@@ -24,7 +24,6 @@ num_features = 5
 num_traits = 10
     
 printby = 1000
-checkby = 1000
 
 logging.basicConfig(level=logging.WARN)
 
@@ -47,7 +46,7 @@ allresults = np.zeros([len(square_dim_list),N])
 alltimings = np.zeros([len(square_dim_list),N])
 place = 0
 observer = axelrod_aurora_test1.AxelrodObserver(printby)
-term = axelrod_aurora_test1.AxelrodTerminator(checkby)
+term = axelrod_aurora_test1.AxelrodTerminator()
 for i in range(0,len(square_dim_list)):
     xdim = square_dim_list[i]
     ydim = square_dim_list[i]
@@ -1,7 +1,7 @@
 # Flocking
 #
-# To run, you must install pygame:
-# pip install pygame
+# To run, you must install pygame and scipy:
+# pip install pygame scipy
 #
 # Original paper:
 # Reynolds, Craig W. "Flocks, herds and schools: A distributed behavioral model."
@@ -15,89 +15,61 @@
 
 import argparse
 import dworp
+from dworp.kdtree import KDTreeIndex
 import logging
 import math
 import numpy as np
-from operator import itemgetter
 import pygame
 import statistics
 
 
-class Point2d:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-
-    def __repr__(self):
-        return "Point2d({}, {})".format(self.x, self.y)
-
-
-class Space2d:
-    """2D Torus continuous space"""
-    def __init__(self, width, height):
-        self.width = width
-        self.height = height
-        self.agents = {}
-
-    def add(self, agent, point):
-        # does not check if this goes outside the space
-        self.agents[agent] = point
-
-    def remove(self, agent):
-        del self.agents[agent]
-
-    def move(self, agent, point):
-        # does not check if this goes outside the space
-        self.agents[agent] = point
-
-    def move_by_vector(self, agent, mag, angle):
-        point = self.agents[agent]
-        dx = mag * math.cos(math.radians(angle))
-        dy = mag * math.sin(math.radians(angle))
-        point.x = (point.x + dx) % self.width
-        point.y = (point.y + dy) % self.height
-        return point
-
-    def get_neighbors(self, agent, radius):
-        neighbors = []
-        for a, p in self.agents.items():
-            if a == agent:
-                continue
-            if self.distance(agent.point, p) < radius:
-                neighbors.append(a)
-        return neighbors
-
-    def distance(self, p1, p2):
-        # wraps
-        dx = p1.x - p2.x
-        dy = p1.y - p2.y
-        dx2 = self.width - dx
-        dy2 = self.height - dy
-        dx_min = dx if abs(dx) < abs(dx2) else dx2
-        dy_min = dy if abs(dy) < abs(dy2) else dy2
-        return math.sqrt(dx_min * dx_min + dy_min * dy_min)
+class FlockingEnvironment(dworp.Environment):
+    """Finds the flockmates and nearest neighbor of every boid at the start of each time step"""
+    def __init__(self, space, vision):
+        super().__init__(0)
+        self.space = space
+        self.vision = vision
+        # boids move 1 unit per step so the tree is rebuilt every few steps
+        self.tree = KDTreeIndex(space, tolerance=3)
+        self.offsets = None
+        self.neighbors = None
+        self.nearest_distances = None
+        self.nearest = None
+        self.agents = None
+
+    def step(self, now, agents):
+        self.agents = agents
+        self.offsets, self.neighbors = self.space.query_agents(self.vision)
+        self.nearest_distances, self.nearest = self.tree.query_agents(1)
+
+    def flockmates(self, index):
+        return self.neighbors[self.offsets[index]:self.offsets[index + 1]]
 
 
 class Boid(dworp.SelfNamingAgent):
     """Bird-oid object that forms flocks"""
-    def __init__(self, point, heading, params, space):
+    def __init__(self, index, heading, params, space):
         super().__init__(0)
-        self.point = point
+        self.index = index
         self.heading = heading
         self.space = space
         self.flockmates = []
-        self.vision = params.vision
         self.min_separation = params.min_separation
         self.max_separate_turn = params.max_separate_turn
         self.max_align_turn = params.max_align_turn
         self.max_cohere_turn = params.max_cohere_turn
 
+    @property
+    def point(self):
+        return self.space.positions[self.index]
+
     def step(self, new_time, env):
         # calculate new heading (does not handle order of updates)
-        self.flockmates = self.space.get_neighbors(self, self.vision)
+        self.flockmates = [env.agents[i] for i in env.flockmates(self.index)]
         if self.flockmates:
-            nn = self.find_nearest_neighbor()
-            if self.space.distance(self.point, nn.point) < self.min_separation:
+            # the nearest neighbor is a flockmate since there is at least one within vision
+            nn = env.agents[env.nearest[self.index, 0]]
+            if env.nearest_distances[self.index, 0] < self.min_separation:
                 self.separate(nn)
             else:
                 self.align()
@@ -105,7 +77,9 @@ class Boid(dworp.SelfNamingAgent):
 
     def complete(self, new_time, env):
         # move forward 1 step according to heading
-        self.point = self.space.move_by_vector(self, 1, self.heading)
+        dx = math.cos(math.radians(self.heading))
+        dy = math.sin(math.radians(self.heading))
+        self.space.move(self.index, self.point + (dx, dy))
 
     def separate(self, neighbor):
         # boids don't want to fly too close to each other
@@ -119,11 +93,6 @@ class Boid(dworp.SelfNamingAgent):
         # try to fly closer together
         self.turns_towards(self.average_heading_towards_flockmates(), self.max_cohere_turn)
 
-    def find_nearest_neighbor(self):
-        distances = [self.space.distance(self.point, n.point) for n in self.flockmates]
-        index = min(enumerate(distances), key=itemgetter(1))[0]
-        return self.flockmates[index]
-
     def average_flockmate_heading(self):
         x_component = sum(math.cos(math.radians(n.heading)) for n in self.flockmates)
         y_component = sum(math.sin(math.radians(n.heading)) for n in self.flockmates)
@@ -136,8 +105,8 @@ class Boid(dworp.SelfNamingAgent):
         return math.degrees(math.atan2(y_component, x_component))
 
     def towards(self, neighbor):
-        dx = neighbor.point.x - self.point.x
-        dy = neighbor.point.y - self.point.y
+        dx = neighbor.point[0] - self.point[0]
+        dy = neighbor.point[1] - self.point[1]
         return math.degrees(math.atan2(dy, dx))
 
     def turns_towards(self, other_heading, max_turn):
@@ -176,14 +145,12 @@ class FlockingSimulation(dworp.TwoStageSimulation):
         self.rng = np.random.RandomState(params.seed)
         self.area_width = params.area_size[0]
         self.area_height = params.area_size[1]
-        env = dworp.NullEnvironment()
         time = dworp.BasicTime(params.steps)
         scheduler = dworp.BasicScheduler()
-        self.space = Space2d(self.area_width, self.area_height)
+        self.space = dworp.ContinuousSpace(params.area_size, params.vision, torus=True)
+        env = FlockingEnvironment(self.space, params.vision)
 
         boids = [self.create_boid(params) for x in range(params.pop)]
-        for boid in boids:
-            self.space.add(boid, boid.point)
 
         super().__init__(boids, env, time, scheduler, observer)
 
@@ -191,7 +158,7 @@ class FlockingSimulation(dworp.TwoStageSimulation):
         x = self.rng.uniform(0, self.area_width)
         y = self.rng.uniform(0, self.area_height)
         heading = self.rng.uniform(0, 360)
-        return Boid(Point2d(x, y), heading, params, self.space)
+        return Boid(self.space.add((x, y)), heading, params, self.space)
 
 
 class FlockingObserver(dworp.Observer):
@@ -229,8 +196,8 @@ class PyGameRenderer(dworp.Observer):
         offset = radius
         self.background.fill((0, 0, 0))
         for agent in agents:
-            x = round(self.zoom * agent.point.x + offset)
-            y = round(self.zoom * agent.point.y + offset)
+            x = round(self.zoom * agent.point[0] + offset)
+            y = round(self.zoom * agent.point[1] + offset)
             pygame.draw.circle(self.background, (0, 255, 0), (x, y), radius)
         self.screen.blit(self.background, (0, 0))
         pygame.display.flip()
@@ -32,14 +32,9 @@ class Household(dworp.Agent):
         if not self.check_happiness(env):
             env.move(self)
 
-    def complete(self, now, env):
-        self.happy = self.check_happiness(env)
-
     def check_happiness(self, env):
         """Check neighbors' color"""
-        neighbors = env.grid.neighbors(self.x, self.y)
-        similar = sum([neighbor.color == self.color for neighbor in neighbors])
-        total = len(neighbors)
+        similar, total = env.grid.similar_neighbors_at('color', self.x, self.y)
         return similar >= self.similarity * total
 
 
@@ -69,25 +64,34 @@ class HouseholdFactory:
 
 
 class SegregationEnvironment(dworp.Environment):
-    """Segregation environment that holds the grid"""
-    def __init__(self, grid, rng):
+    """Segregation environment that holds the grid
+
+    The grid has a color layer with the index of each household's color.
+    """
+    def __init__(self, grid, rng, similarity):
         super().__init__(0)
         self.grid = grid
         self.rng = rng
+        self.similarity = similarity
+        self.num_unhappy = None
 
     def move(self, agent):
-        x1 = x2 = agent.x
-        y1 = y2 = agent.y
-        while self.grid.occupied(x2, y2):
-            x2 = self.rng.randint(0, self.grid.width)
-            y2 = self.rng.randint(0, self.grid.height)
-        self.grid.move(x1, y1, x2, y2)
+        x2, y2 = self.grid.random_empty(self.rng)
+        self.grid.move(agent.x, agent.y, x2, y2)
         agent.x = x2
         agent.y = y2
 
     def step(self, new_time, agents):
         pass
 
+    def complete(self, now, agents):
+        # happiness of every household at once after the moves
+        similar, total = self.grid.similar_neighbors('color')
+        happy = similar >= self.similarity * total
+        for agent in agents:
+            agent.happy = bool(happy[agent.x, agent.y])
+        self.num_unhappy = np.count_nonzero(~happy & self.grid.occupancy())
+
 
 class SegObserver(dworp.Observer):
     """Writes simulation state to stdout"""
@@ -109,7 +113,7 @@ class SegObserver(dworp.Observer):
 class SegTerminator(dworp.Terminator):
     """Stop when everyone is happy"""
     def test(self, now, agents, env):
-        return SegObserver.get_happiness(agents) >= 100
+        return env.num_unhappy == 0
 
 
 class PyGameRenderer(dworp.Observer):
@@ -173,13 +177,13 @@ class SegregationSimulation(dworp.TwoStageSimulation):
         terminator = SegTerminator()
 
         agents = []
-        grid = dworp.Grid(params.grid_width, params.grid_height)
-        env = SegregationEnvironment(grid, self.rng)
+        grid = dworp.Grid(params.grid_width, params.grid_height, {'color': np.int8})
+        env = SegregationEnvironment(grid, self.rng, params.similarity)
         for x in range(params.grid_width):
             for y in range(params.grid_height):
                 if self.rng.uniform() < params.density:
                     agent = factory.create(x, y)
-                    grid.add(agent, x, y)
+                    grid.add(agent, x, y, color=params.colors.index(agent.color))
                     agents.append(agent)
 
         super().__init__(agents, env, time, scheduler, observer, terminator)
@@ -10,18 +10,16 @@ import numpy as np
 class CollegeStudent(dworp.TwoStageAgent):
     SHORTS = 0
 
-    def __init__(self, vertex):
-        super().__init__(vertex.index, 1)
-        vertex['agent'] = self
-        self.vertex = vertex
+    def __init__(self, index):
+        super().__init__(index, 1)
 
     def init(self, now, env):
         self.state.fill(0)
 
     def step(self, now, env):
-        neighbors = self.vertex.neighbors()
-        count = sum([v['agent'].wearing_shorts for v in neighbors])
-        probability = 0.6 * env.temp / float(env.MAX_TEMP) + 0.4 * count / float(len(neighbors) + 0.00001)
+        # fraction of friends wearing shorts is computed for every agent once per step
+        fractions = env.aggregate('shorts', now, lambda: env.neighbor_mean(env.agents.state[:, self.SHORTS]))
+        probability = 0.6 * env.temp / float(env.MAX_TEMP) + 0.4 * fractions[self.agent_id]
         self.next_state[self.SHORTS] = np.random.uniform() < probability
         self.logger.info("Agent {} has shorts status {}".format(self.agent_id, self.next_state[self.SHORTS]))
 
@@ -35,13 +33,15 @@ class WeatherEnvironment(dworp.NetworkEnvironment):
     MIN_TEMP = 0
     MAX_TEMP = 30
 
-    def __init__(self, graph):
-        super().__init__(1, graph)
+    def __init__(self, network):
+        super().__init__(1, network)
+        self.agents = None
 
     def init(self, now):
         self.state.fill(0)
 
     def step(self, now, agents):
+        self.agents = agents
         self.state[self.TEMP] = np.random.randint(self.MIN_TEMP, self.MAX_TEMP)
         self.logger.info("Temperature is now {}".format(self.state[self.TEMP]))
 
@@ -61,8 +61,9 @@ class ShortsObserver(dworp.Observer):
 
 logging.basicConfig(level=logging.WARN)
 g = igraph.Graph.Erdos_Renyi(n=100, p=0.05, directed=False)
-agents = [CollegeStudent(v) for v in g.vs]
-env = WeatherEnvironment(g)
+network = dworp.CSRNetwork.from_network(g)
+agents = dworp.AgentStore(1, [CollegeStudent(i) for i in range(len(network))], two_stage=True)
+env = WeatherEnvironment(network)
 time = dworp.BasicTime(10)
 scheduler = dworp.BasicScheduler()
 observer = ShortsObserver()
@@ -19,22 +19,6 @@ import pygame
 from sugarscape_map import DEFAULT_SUGAR_MAP
 
 
-class Patch:
-    def __init__(self, max_sugar):
-        self.sugar = max_sugar
-        self.max_sugar = max_sugar
-
-    def growback(self):
-        # immediate growback model
-        # self.sugar = self.max_sugar
-
-        # constant growback model
-        self.sugar = min(self.sugar + 1, self.max_sugar)
-
-    def __repr__(self):
-        return 'Patch({}, {})'.format(self.sugar, self.max_sugar)
-
-
 class SugarAgent(dworp.SelfNamingAgent):
     def __init__(self, sugar, metabolism, vision):
         super().__init__(0)
@@ -51,7 +35,7 @@ class SugarAgent(dworp.SelfNamingAgent):
     def move(self, env):
         # get empty locations nearby, and their sugar & distance
         empty_locations = env.empty_locations_nearby(self, self.vision)
-        sugar_by_location = {location: env.get_patch_at(location).sugar for location in empty_locations}
+        sugar_by_location = {location: env.sugar.values[location] for location in empty_locations}
         distance_by_location = {location: env.distance_from(self, location) for location in empty_locations}
 
         # pick the best locations (the ones with the most sugar)
@@ -66,9 +50,8 @@ class SugarAgent(dworp.SelfNamingAgent):
         env.move(self, winners[env.rng.choice(range(len(winners)))])
 
     def eat(self, env):
-        patch = env.get_patch_for(self)
-        self.sugar += patch.sugar
-        patch.sugar = 0
+        x, y = env.location_by_agent[self]
+        self.sugar += env.sugar.harvest(x, y)
 
     def metabolize(self):
         self.sugar -= self.metabolism
@@ -86,20 +69,21 @@ class SugarscapeEnvironment(dworp.Environment):
         self.width = len(sugar_map[0])
         self.height = len(sugar_map)
 
-        self.patch_by_location = {}
+        # the map is indexed by row (y) and the layer by (x, y)
+        max_sugar = np.array(sugar_map).T
+        self.sugar = dworp.FieldLayer(self.width, self.height, max_sugar, max_sugar, dtype=int)
         self.agent_by_location = {}
         for x in range(self.width):
             for y in range(self.height):
-                self.patch_by_location[(x, y)] = Patch(sugar_map[y][x])
                 self.agent_by_location[(x, y)] = None
 
-        self.max_sugar = max(map(lambda patch: patch.max_sugar, self.patch_by_location.values()))
+        self.max_sugar = max_sugar.max()
 
         self.location_by_agent = {}
 
     def step(self, now, agents):
-        for location in self.patch_by_location:
-            self.patch_by_location[location].growback()
+        # constant growback model (immediate growback would be a rate of max_sugar)
+        self.sugar.growback(1)
 
     def complete(self, now, agents):
         to_remove = []
@@ -111,7 +95,7 @@ class SugarscapeEnvironment(dworp.Environment):
             agents.pop(i)
 
     def is_valid_location(self, location):
-        return location in self.patch_by_location
+        return location in self.agent_by_location
 
     def move(self, agent, location):
         if agent in self.location_by_agent:
@@ -120,12 +104,6 @@ class SugarscapeEnvironment(dworp.Environment):
         self.location_by_agent[agent] = location
         self.agent_by_location[location] = agent
 
-    def get_patch_for(self, agent):
-        return self.get_patch_at(self.location_by_agent[agent])
-
-    def get_patch_at(self, location):
-        return self.patch_by_location[location]
-
     def distance_from(self, agent, location):
         agent_location = self.location_by_agent[agent]
 
@@ -138,7 +116,7 @@ class SugarscapeEnvironment(dworp.Environment):
         return self.agent_by_location[location] is None
 
     def empty_locations(self):
-        return list(filter(self.is_empty, self.patch_by_location))
+        return list(filter(self.is_empty, self.agent_by_location))
 
     def empty_locations_nearby(self, agent, distance):
         x, y = self.location_by_agent[agent]
@@ -227,8 +205,8 @@ class PyGameRenderer(dworp.Observer):
         offset = radius
         self.background.fill((0, 0, 0))
 
-        for (x, y), patch in env.patch_by_location.items():
-            color = (0, round(255 * patch.sugar / self.max_sugar), 0)
+        for (x, y), sugar in np.ndenumerate(env.sugar.values):
+            color = (0, round(255 * sugar / self.max_sugar), 0)
             pygame.draw.rect(self.background, color, (self.zoom * x, self.zoom * y, self.zoom - 1, self.zoom - 1), 0)
 
         for agent in agents:
@@ -16,10 +16,13 @@ setup(
     license='BSD',
     packages=['dworp'],
     install_requires=[
-        'numpy',
+        'numpy>=1.17',
     ],
     extras_require={
-        'plot': ['matplotlib']
+        'plot': ['matplotlib'],
+        'kdtree': ['scipy'],
+        'parquet': ['pyarrow'],
+        'hdf5': ['h5py'],
     },
     python_requires='>=3.5',
     keywords='agents ABM modeling simulation agent-based',
@@ -4,6 +4,7 @@
 
 from dworp.agent import *
 import unittest
+import numpy as np
 
 
 class IdentifierHelperTest(unittest.TestCase):
@@ -51,3 +52,152 @@ class TwoStageAgentTest(unittest.TestCase):
         agent.complete(0, None)
         self.assertEqual(0, agent.state[0])
         self.assertEqual(42, agent.state[1])
+
+
+class AgentStoreTest(unittest.TestCase):
+    class MockAgent(Agent):
+        def step(self, now, env):
+            self.state[0] += 1
+
+    class MockTwoStageAgent(TwoStageAgent):
+        def step(self, now, env):
+            self.next_state[0] = self.state[0] + 1
+
+    def test_state_is_row_view(self):
+        agents = [AgentStoreTest.MockAgent(x, 3) for x in range(4)]
+        agents[2].state[1] = 7
+        store = AgentStore(3, agents)
+        self.assertEqual((4, 3), store.state.shape)
+        self.assertEqual(7, store.state[2, 1])
+        store[1].state[0] = 5
+        self.assertEqual(5, store.state[1, 0])
+        store.state[3, 2] = 9
+        self.assertEqual(9, agents[3].state[2])
+
+    def test_append_grows_and_keeps_views(self):
+        store = AgentStore(2, capacity=1)
+        for x in range(10):
+            agent = AgentStoreTest.MockAgent(x, 2)
+            agent.state[0] = x
+            store.append(agent)
+        self.assertEqual(10, len(store))
+        np.testing.assert_array_equal(np.arange(10), store.state[:, 0])
+        store[0].state[1] = 3
+        self.assertEqual(3, store.state[0, 1])
+
+    def test_append_with_wrong_size(self):
+        store = AgentStore(2)
+        with self.assertRaises(AssertionError):
+            store.append(AgentStoreTest.MockAgent(1, 3))
+
+    def test_pop(self):
+        agents = [AgentStoreTest.MockAgent(x, 1) for x in range(4)]
+        store = AgentStore(1, agents)
+        store.state[:, 0] = [0, 1, 2, 3]
+        agent = store.pop(1)
+        self.assertEqual(1, agent.state[0])
+        self.assertEqual([0, 2, 3], [a.agent_id for a in store])
+        np.testing.assert_array_equal([0, 2, 3], store.state[:, 0])
+        store[1].state[0] = 10
+        self.assertEqual(10, store.state[1, 0])
+        agent.state[0] = 20
+        self.assertNotIn(20, store.state)
+
+    def test_with_two_stage_agents(self):
+        store = AgentStore(1, [AgentStoreTest.MockTwoStageAgent(x, 1) for x in range(3)])
+        for agent in store:
+            agent.step(0, None)
+        for agent in store:
+            agent.complete(0, None)
+        np.testing.assert_array_equal([1, 1, 1], store.state[:, 0])
+
+
+class TwoStageAgentStoreTest(unittest.TestCase):
+    class MockAgent(TwoStageAgent):
+        def step(self, now, env):
+            self.next_state[0] = self.state[0] + 1
+
+    class CompletingAgent(MockAgent):
+        def complete(self, now, env):
+            super().complete(now, env)
+            self.completed = now
+
+    def test_complete_publishes_next_state(self):
+        store = AgentStore(2, [self.MockAgent(x, 2) for x in range(3)], two_stage=True)
+        store.sync()
+        for agent in store:
+            agent.step(1, None)
+        self.assertEqual(0, store[0].state[0])
+        np.testing.assert_array_equal([1, 1, 1], store.next_state[:, 0])
+        store.complete(1, None, np.arange(3))
+        np.testing.assert_array_equal([1, 1, 1], store.state[:, 0])
+        np.testing.assert_array_equal(store.state, store.next_state)
+        self.assertEqual(1, store[2].state[0])
+
+    def test_unscheduled_rows_unchanged(self):
+        store = AgentStore(1, [self.MockAgent(x, 1) for x in range(3)], two_stage=True)
+        store.state[:, 0] = [5, 6, 7]
+        store.sync()
+        store[1].step(1, None)
+        store.complete(1, None, np.array([1]))
+        np.testing.assert_array_equal([5, 7, 7], store.state[:, 0])
+        np.testing.assert_array_equal([5, 7, 7], store.next_state[:, 0])
+
+    def test_only_custom_complete_called(self):
+        agents = [self.MockAgent(0, 1), self.CompletingAgent(1, 1)]
+        store = AgentStore(1, agents, two_stage=True)
+        store.complete(4, None, np.array([0, 1]))
+        self.assertEqual(4, agents[1].completed)
+        self.assertFalse(hasattr(agents[0], 'completed'))
+
+    def test_pop_and_grow(self):
+        store = AgentStore(1, capacity=1, two_stage=True)
+        for x in range(5):
+            agent = self.MockAgent(x, 1)
+            agent.state[0] = x
+            store.append(agent)
+        agent = store.pop(0)
+        self.assertEqual(0, agent.state[0])
+        agent.next_state[0] = 99
+        self.assertNotIn(99, store.next_state)
+        np.testing.assert_array_equal([1, 2, 3, 4], store.state[:, 0])
+        store[0].next_state[0] = 10
+        self.assertEqual(10, store.next_state[0, 0])
+
+    def test_rejects_single_stage_agents(self):
+        with self.assertRaises(AssertionError):
+            AgentStore(1, [AgentStoreTest.MockAgent(1, 1)], two_stage=True)
+
+
+class BatchAgentTest(unittest.TestCase):
+    class MockBatchAgent(BatchAgent):
+        calls = []
+
+        @classmethod
+        def step_batch(cls, now, env, agents, indices):
+            cls.calls.append(indices.tolist())
+            agents.state[indices, 0] += now
+
+    class MockAgent(Agent):
+        def step(self, now, env):
+            self.state[0] -= 1
+
+    def setUp(self):
+        self.MockBatchAgent.calls = []
+
+    def test_scalar_step_uses_batch(self):
+        store = AgentStore(1, [self.MockBatchAgent(x, 1) for x in range(3)])
+        store[1].step(5, None)
+        np.testing.assert_array_equal([0, 5, 0], store.state[:, 0])
+
+    def test_store_groups_by_class(self):
+        agents = [self.MockBatchAgent(0, 1), self.MockAgent(1, 1), self.MockBatchAgent(2, 1)]
+        store = AgentStore(1, agents)
+        self.assertTrue(store.batched)
+        store.step(2, None, np.array([2, 1, 0]))
+        self.assertEqual([[2, 0]], self.MockBatchAgent.calls)
+        np.testing.assert_array_equal([2, -1, 2], store.state[:, 0])
+
+    def test_not_batched(self):
+        store = AgentStore(1, [self.MockAgent(0, 1)])
+        self.assertFalse(store.batched)
@@ -0,0 +1,65 @@
+# Copyright 2018, The Johns Hopkins University Applied Physics Laboratory LLC
+# All rights reserved.
+# Distributed under the terms of the Modified BSD License.
+
+from dworp.analysis import *
+from dworp.network import CSRNetwork
+from dworp.space import Grid, VonNeumannNeighborhood
+import unittest
+import unittest.mock as mock
+import numpy as np
+
+
+class RegionCounterTest(unittest.TestCase):
+    def path(self, n):
+        return CSRNetwork.from_edges([(i, i + 1) for i in range(n - 1)], n)
+
+    def test_count(self):
+        counter = RegionCounter(self.path(6))
+        self.assertEqual(3, counter.count(np.array([1, 1, 2, 2, 2, 1])))
+        self.assertEqual(2, counter.count(np.array([1, 1, 2, 2, 2, 1]), active=[True] * 5 + [False]))
+
+    def test_multiple_features(self):
+        counter = RegionCounter(self.path(3))
+        states = np.array([[1, 2], [1, 2], [1, 3]])
+        self.assertEqual(2, counter.update(states))
+        self.assertEqual(counter.labels[0], counter.labels[1])
+        self.assertNotEqual(counter.labels[1], counter.labels[2])
+
+    def test_incremental_split_and_merge(self):
+        counter = RegionCounter(self.path(5))
+        states = np.array([1, 1, 1, 1, 1])
+        self.assertEqual(1, counter.update(states))
+        states[2] = 2
+        self.assertEqual(3, counter.update(states))
+        states[2] = 1
+        self.assertEqual(1, counter.update(states, changed=[2]))
+
+    def test_incremental_matches_full_count(self):
+        rng = np.random.RandomState(3)
+        network = CSRNetwork.from_edges(rng.randint(0, 60, size=(90, 2)), 60)
+        counter = RegionCounter(network)
+        states = rng.randint(0, 3, size=(60, 2))
+        counter.update(states)
+        for step in range(20):
+            changed = rng.randint(0, 60, size=3)
+            states[changed] = rng.randint(0, 3, size=(3, 2))
+            self.assertEqual(counter.count(states), counter.update(states))
+            for region, members in counter.members.items():
+                self.assertEqual(np.flatnonzero(counter.labels == region).tolist(), members.tolist())
+
+    def test_incremental_only_labels_affected_regions(self):
+        counter = RegionCounter(self.path(1000))
+        states = np.repeat(np.arange(100), 10)
+        self.assertEqual(100, counter.update(states))
+        states[55] = 7
+        with mock.patch.object(counter, '_label', wraps=counter._label) as label:
+            self.assertEqual(102, counter.update(states, changed=[55]))
+            self.assertEqual(list(range(50, 60)), label.call_args[0][0].tolist())
+
+    def test_from_grid(self):
+        grid = Grid(3, 3, {'color': int}, neighborhood=VonNeumannNeighborhood())
+        for x, y, color in [(0, 0, 1), (1, 1, 1), (2, 2, 2), (2, 1, 2)]:
+            grid.add(object(), x, y, color=color)
+        counter = RegionCounter.from_grid(grid)
+        self.assertEqual(3, counter.update(grid.layers['color'].ravel(), grid.occupancy().ravel()))
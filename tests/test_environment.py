@@ -3,7 +3,11 @@
 # Distributed under the terms of the Modified BSD License.
 
 from dworp.environment import *
+from dworp.network import CSRNetwork
 import unittest
+import unittest.mock as mock
+import numpy as np
+import tempfile
 
 
 class EnvironmentTest(unittest.TestCase):
@@ -18,3 +22,51 @@ class EnvironmentTest(unittest.TestCase):
     def test_creation_without_size(self):
         a = EnvironmentTest.MockEnvironment(0)
         self.assertIsNone(a.state)
+
+
+class NetworkEnvironmentTest(unittest.TestCase):
+    class MockEnvironment(NetworkEnvironment):
+        def step(self, now, agents):
+            pass
+
+    def setUp(self):
+        # path 0 - 1 - 2 and isolated node 3
+        self.network = CSRNetwork.from_edges([(0, 1), (1, 2)], num_nodes=4, weights=[2, 3])
+        self.env = self.MockEnvironment(0, self.network)
+
+    def test_neighbor_sum(self):
+        values = np.array([1, 10, 100, 1000])
+        np.testing.assert_array_equal([10, 101, 10, 0], self.env.neighbor_sum(values))
+        np.testing.assert_array_equal([20, 302, 30, 0], self.env.neighbor_sum(values, weighted=True))
+
+    def test_neighbor_mean(self):
+        values = np.array([1, 10, 100, 1000])
+        np.testing.assert_array_equal([10, 50.5, 10, 0], self.env.neighbor_mean(values))
+
+    def test_neighbor_count_equal(self):
+        values = np.array([1, 1, 2, 1])
+        np.testing.assert_array_equal([1, 1, 0, 0], self.env.neighbor_count_equal(values))
+        np.testing.assert_array_equal([0, 1, 0, 0], self.env.neighbor_count_equal(values, 2))
+
+    def test_aggregate_is_computed_once_per_time(self):
+        compute = mock.Mock(return_value=5)
+        self.assertEqual(5, self.env.aggregate('x', 1, compute))
+        self.assertEqual(5, self.env.aggregate('x', 1, compute))
+        self.assertEqual(1, compute.call_count)
+        self.env.aggregate('x', 2, compute)
+        self.assertEqual(2, compute.call_count)
+
+    def test_converts_other_networks(self):
+        graph = mock.Mock()
+        graph.get_edgelist.return_value = [(0, 1)]
+        graph.vcount.return_value = 2
+        graph.is_directed.return_value = False
+        env = self.MockEnvironment(0, graph)
+        np.testing.assert_array_equal([2, 1], env.neighbor_sum(np.array([1, 2])))
+
+    def test_opens_saved_network(self):
+        with tempfile.TemporaryDirectory() as path:
+            self.network.save(path)
+            env = self.MockEnvironment(0, path)
+            np.testing.assert_array_equal([10, 101, 10, 0], env.neighbor_sum(np.array([1, 10, 100, 1000])))
+            del env
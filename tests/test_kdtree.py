@@ -0,0 +1,48 @@
+# Copyright 2018, The Johns Hopkins University Applied Physics Laboratory LLC
+# All rights reserved.
+# Distributed under the terms of the Modified BSD License.
+
+from dworp.kdtree import *
+from dworp.space import ContinuousSpace
+import unittest
+import numpy as np
+
+
+class KDTreeIndexTest(unittest.TestCase):
+    # let developers filter the tests that require scipy
+    kdtree = True
+
+    def brute_force(self, space, k):
+        positions = space.positions
+        d = space.distance(positions[:, np.newaxis], positions[np.newaxis])
+        np.fill_diagonal(d, np.inf)
+        d[:, ~space.active] = np.inf
+        return np.sort(d, axis=1)[:, :k]
+
+    def test_query_agents_on_torus(self):
+        space = ContinuousSpace((30, 20), 2, torus=True)
+        space.extend(np.random.RandomState(1).uniform(0, 1, size=(200, 2)) * [30, 20])
+        distances, neighbors = KDTreeIndex(space).query_agents(3)
+        np.testing.assert_allclose(self.brute_force(space, 3), distances)
+        d = space.distance(space.positions[:, np.newaxis], space.positions[neighbors])
+        np.testing.assert_allclose(distances, d)
+
+    def test_exact_with_old_tree(self):
+        rng = np.random.RandomState(2)
+        space = ContinuousSpace((20, 20), 2)
+        space.extend(rng.uniform(0, 20, size=(150, 2)))
+        space.remove(7)
+        index = KDTreeIndex(space, tolerance=1)
+        for step in range(4):
+            distances, neighbors = index.query_agents(2)
+            np.testing.assert_allclose(self.brute_force(space, 2), distances)
+            self.assertFalse(np.any(neighbors == 7))
+            space.set_positions(space.positions + rng.uniform(-0.2, 0.2, size=(150, 2)))
+        self.assertLess(index.builds, 4)
+
+    def test_fewer_agents_than_k(self):
+        space = ContinuousSpace((10, 10), 2)
+        space.extend([[1, 1], [2, 2]])
+        distances, neighbors = KDTreeIndex(space).query([[0, 0]], 3)
+        np.testing.assert_array_equal([[0, 1, -1]], neighbors)
+        self.assertTrue(np.isinf(distances[0, 2]))
@@ -0,0 +1,102 @@
+# Copyright 2018, The Johns Hopkins University Applied Physics Laboratory LLC
+# All rights reserved.
+# Distributed under the terms of the Modified BSD License.
+
+from dworp.network import *
+import unittest
+import unittest.mock as mock
+import numpy as np
+import tempfile
+
+
+class CSRNetworkTest(unittest.TestCase):
+    def test_from_edges_undirected(self):
+        network = CSRNetwork.from_edges([(0, 1), (1, 2), (0, 2)], num_nodes=4)
+        self.assertEqual(4, len(network))
+        self.assertEqual(6, network.num_edges)
+        self.assertEqual([1, 2], sorted(network.neighbors(0).tolist()))
+        self.assertEqual([0, 1], sorted(network.neighbors(2).tolist()))
+        self.assertEqual([], network.neighbors(3).tolist())
+        np.testing.assert_array_equal([2, 2, 2, 0], network.degree())
+
+    def test_from_edges_directed_with_weights(self):
+        network = CSRNetwork.from_edges([(1, 0), (0, 2), (0, 1)], weights=[3, 4, 5], directed=True)
+        np.testing.assert_array_equal([2, 1], network.neighbors(0))
+        np.testing.assert_array_equal([4, 5], network.neighbor_weights(0))
+        np.testing.assert_array_equal([0], network.neighbors(1))
+        self.assertEqual(0, network.degree(2))
+        np.testing.assert_array_equal([0, 0, 1], network.sources())
+
+    def test_reverse(self):
+        net = CSRNetwork.from_edges([(0, 1), (0, 2), (2, 1)], weights=[1., 2., 3.], directed=True)
+        rev = net.reverse()
+        self.assertEqual([], rev.neighbors(0).tolist())
+        self.assertEqual([0, 2], rev.neighbors(1).tolist())
+        self.assertEqual([1., 3.], rev.neighbor_weights(1).tolist())
+        self.assertEqual([0], rev.neighbors(2).tolist())
+
+    def test_neighbors_is_a_view(self):
+        network = CSRNetwork.from_edges([(0, 1)])
+        self.assertIs(network.indices, network.neighbors(0).base)
+
+    def test_from_igraph(self):
+        graph = mock.Mock()
+        graph.get_edgelist.return_value = [(0, 1), (1, 2)]
+        graph.vcount.return_value = 3
+        graph.is_directed.return_value = False
+        network = CSRNetwork.from_network(graph)
+        self.assertEqual([0, 2], sorted(network.neighbors(1).tolist()))
+
+    def test_from_networkx_maps_labels(self):
+        graph = mock.Mock(spec=['nodes', 'edges', 'is_directed'])
+        graph.nodes.return_value = ['a', 'b', 'c']
+        graph.edges.return_value = [('c', 'a')]
+        graph.is_directed.return_value = True
+        network = CSRNetwork.from_network(graph)
+        np.testing.assert_array_equal([0], network.neighbors(2))
+        self.assertEqual(1, network.index_of('b'))
+        self.assertEqual('c', network.node_of(2))
+
+    def test_save_and_load(self):
+        network = CSRNetwork.from_edges([(0, 1), (1, 2)], weights=[0.5, 2], nodes=['a', 'b', 'c'])
+        with tempfile.TemporaryDirectory() as path:
+            network.save(path)
+            loaded = CSRNetwork.load(path)
+            self.assertIsInstance(loaded.indices.base, np.memmap)
+            np.testing.assert_array_equal(network.indptr, loaded.indptr)
+            np.testing.assert_array_equal(network.indices, loaded.indices)
+            np.testing.assert_array_equal(network.weights, loaded.weights)
+            self.assertEqual(2, loaded.index_of('c'))
+            del loaded
+
+    def test_save_and_load_preserves_labels(self):
+        nodes = [(0, 0), (0, 1), 2, 'a', 2.5, (1, ('b', None)), True]
+        network = CSRNetwork.from_edges([(0, 1), (2, 3)], nodes=nodes)
+        with tempfile.TemporaryDirectory() as path:
+            network.save(path)
+            loaded = CSRNetwork.load(path, mmap=False)
+            self.assertEqual(nodes, loaded.nodes)
+            self.assertEqual(1, loaded.index_of((0, 1)))
+            self.assertEqual(2, loaded.index_of(2))
+            self.assertEqual(4, loaded.index_of(2.5))
+
+    def test_pickled_labels_need_allow_pickle(self):
+        network = CSRNetwork.from_edges([(0, 1)], nodes=[frozenset([1]), frozenset([2])])
+        with tempfile.TemporaryDirectory() as path:
+            with self.assertRaises(ValueError):
+                network.save(path)
+            network.save(path, allow_pickle=True)
+            with self.assertRaises(ValueError):
+                CSRNetwork.load(path)
+            loaded = CSRNetwork.load(path, mmap=False, allow_pickle=True)
+            self.assertEqual(1, loaded.index_of(frozenset([2])))
+
+    def test_load_without_weights_into_memory(self):
+        network = CSRNetwork.from_edges([(0, 1)], num_nodes=3)
+        with tempfile.TemporaryDirectory() as path:
+            network.save(path)
+            loaded = CSRNetwork.from_network(path)
+            self.assertIsNone(loaded.weights)
+            self.assertIsNone(loaded.nodes)
+            self.assertEqual(3, len(CSRNetwork.load(path, mmap=False)))
+            del loaded
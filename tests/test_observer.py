@@ -6,7 +6,22 @@ from dworp.observer import *
 import unittest
 import unittest.mock as mock
 import builtins
+import importlib.util
+import numpy as np
+import os
+import tempfile
+import threading
 import time
+from dworp.agent import Agent, AgentStore
+
+
+def state_total(agents, env):
+    return agents.sum()
+
+
+class StateAgent(Agent):
+    def step(self, now, env):
+        pass
 
 
 class ChainedObserverTest(unittest.TestCase):
@@ -127,3 +142,232 @@ class PauseAtEndObserverTest(unittest.TestCase):
         obs = PauseAtEndObserver(1)
         obs.stop(99, [], None)
         self.assertTrue(time.sleep.called)
+
+
+class RecorderObserverTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'run')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def run_recorder(self, format='npz', num_steps=7, **kwargs):
+        metrics = {'total': lambda agents, env: sum(agents), 'count': lambda agents, env: len(agents)}
+        obs = RecorderObserver(metrics, self.path, chunk_size=3, format=format, **kwargs)
+        agents = [1]
+        obs.start(0, agents, None)
+        for t in range(1, num_steps):
+            agents.append(t)
+            obs.step(t, agents, None)
+        obs.stop(num_steps - 1, agents, None)
+        return obs
+
+    def test_chunks_round_trip(self):
+        obs = self.run_recorder()
+        self.assertEqual(7, len(obs))
+        self.assertEqual(3, obs.num_chunks)
+        self.assertEqual(3, len(os.listdir(self.path)))
+        data = RecorderObserver.load(self.path)
+        self.assertEqual(list(range(7)), data['time'].tolist())
+        self.assertEqual([1, 2, 4, 7, 11, 16, 22], data['total'].tolist())
+        self.assertEqual(list(range(1, 8)), data['count'].tolist())
+
+    def test_columns_are_reused(self):
+        obs = self.run_recorder(num_steps=6)
+        self.assertEqual(3, len(obs.columns['total']))
+        self.assertEqual(0, obs.size)
+        self.assertEqual(2, obs.num_chunks)
+
+    def test_dtypes(self):
+        self.run_recorder(dtypes={'count': np.int32})
+        data = RecorderObserver.load(self.path)
+        self.assertEqual(np.int32, data['count'].dtype)
+        self.assertEqual(np.float64, data['total'].dtype)
+
+    def test_load_empty_directory(self):
+        self.assertEqual({}, RecorderObserver.load(self.dir.name))
+
+    def test_missing_library_fails_on_creation(self):
+        with mock.patch('importlib.util.find_spec', return_value=None):
+            for format in ['parquet', 'hdf5']:
+                with self.assertRaises(ImportError):
+                    RecorderObserver({'x': len}, self.path, format=format)
+            RecorderObserver({'x': len}, self.path)
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), "requires pyarrow")
+    def test_parquet(self):
+        self.run_recorder('parquet')
+        data = RecorderObserver.load(self.path)
+        self.assertEqual([1, 2, 4, 7, 11, 16, 22], data['total'].tolist())
+
+    @unittest.skipUnless(importlib.util.find_spec('h5py'), "requires h5py")
+    def test_hdf5(self):
+        self.run_recorder('hdf5')
+        data = RecorderObserver.load(self.path)
+        self.assertEqual([1, 2, 4, 7, 11, 16, 22], data['total'].tolist())
+
+
+class AsyncObserverTest(unittest.TestCase):
+    class Blocked(Observer):
+        def __init__(self):
+            self.entered = threading.Event()
+            self.release = threading.Event()
+            self.calls = []
+
+        def start(self, now, agents, env):
+            self.calls.append(('start', now))
+
+        def step(self, now, agents, env):
+            self.calls.append(('step', now))
+            self.entered.set()
+            self.release.wait(5)
+
+        def stop(self, now, agents, env):
+            self.calls.append(('stop', now))
+
+    def capture(self, now, agents, env):
+        return list(agents), env
+
+    def run_policy(self, policy):
+        inner = self.Blocked()
+        obs = AsyncObserver(inner, self.capture, maxsize=1, policy=policy)
+        obs.start(0, [], None)
+        obs.step(1, [], None)
+        inner.entered.wait(5)
+        for t in range(2, 5):
+            obs.step(t, [], None)
+        inner.release.set()
+        obs.stop(4, [], None)
+        return obs, inner.calls
+
+    def test_block_observes_every_step(self):
+        observed = []
+        inner = mock.create_autospec(spec=Observer)
+        inner.step.side_effect = lambda now, agents, env: observed.append((now, agents))
+        obs = AsyncObserver(inner, self.capture, maxsize=2)
+        agents = [0]
+        obs.start(0, agents, None)
+        for t in range(1, 20):
+            agents.append(t)
+            obs.step(t, agents, None)
+        obs.stop(19, agents, None)
+        self.assertEqual(list(range(1, 20)), [now for now, _ in observed])
+        self.assertEqual([0, 1, 2], observed[1][1])
+        self.assertEqual(0, obs.num_dropped)
+        self.assertEqual(mock.call(19, agents, None), inner.stop.call_args)
+
+    def test_drop(self):
+        obs, calls = self.run_policy('drop')
+        self.assertEqual([('start', 0), ('step', 1), ('step', 2), ('stop', 4)], calls)
+        self.assertEqual(2, obs.num_dropped)
+
+    def test_coalesce(self):
+        obs, calls = self.run_policy('coalesce')
+        self.assertEqual([('start', 0), ('step', 1), ('step', 4), ('stop', 4)], calls)
+        self.assertEqual(2, obs.num_dropped)
+
+    def test_copies_state_of_agent_store(self):
+        states = []
+        inner = mock.create_autospec(spec=Observer)
+        inner.step.side_effect = lambda now, agents, env: states.append(agents.tolist())
+        store = AgentStore(1, [StateAgent(x, 1) for x in range(2)])
+        obs = AsyncObserver(inner, maxsize=3)
+        obs.start(0, store, None)
+        for t in range(1, 4):
+            store.state[:, 0] = t
+            obs.step(t, store, None)
+        obs.stop(3, store, None)
+        self.assertEqual([[[1], [1]], [[2], [2]], [[3], [3]]], states)
+
+    def test_error_raised_from_stop(self):
+        inner = mock.create_autospec(spec=Observer)
+        inner.step.side_effect = ValueError("bad")
+        obs = AsyncObserver(inner, self.capture)
+        obs.start(0, [], None)
+        obs.step(1, [], None)
+        obs.step(2, [], None)
+        with self.assertRaises(ValueError):
+            obs.stop(2, [], None)
+        self.assertEqual(1, inner.step.call_count)
+        self.assertFalse(inner.stop.called)
+
+    def test_process(self):
+        with tempfile.TemporaryDirectory() as path:
+            store = AgentStore(1, [StateAgent(x, 1) for x in range(3)])
+            obs = AsyncObserver(RecorderObserver({'total': state_total}, path), process=True)
+            obs.start(0, store, None)
+            for t in range(1, 4):
+                store.state[:, 0] = t
+                obs.step(t, store, None)
+            obs.stop(3, store, None)
+            data = RecorderObserver.load(path)
+            self.assertEqual([0, 3, 6, 9], data['total'].tolist())
+
+
+class TrajectoryObserverTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'trajectory')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def run_observer(self, agents, num_steps=5, **kwargs):
+        obs = TrajectoryObserver(self.path, **kwargs)
+        obs.start(0, agents, None)
+        for t in range(1, num_steps):
+            for i, agent in enumerate(agents):
+                agent.state[:] = [t, i]
+            obs.step(t, agents, None)
+        obs.stop(num_steps - 1, agents, None)
+        return obs
+
+    def test_agent_store_round_trip(self):
+        agents = AgentStore(2, [StateAgent(x, 2) for x in range(3)])
+        self.run_observer(agents, num_steps=5)
+        reader = TrajectoryReader(self.path)
+        self.assertEqual((5, 3, 2), reader.data.shape)
+        self.assertEqual(np.float32, reader.data.dtype)
+        self.assertEqual([0, 1, 2, 3, 4], reader.times.tolist())
+        self.assertEqual([[0, 0]] * 3, reader[0].tolist())
+        self.assertEqual([[2, 0], [2, 1], [2, 2]], reader[2].tolist())
+        self.assertEqual([[1, 1], [2, 1], [3, 1], [4, 1]], reader[1:, 1].tolist())
+
+    def test_grows_in_chunks_and_trims(self):
+        agents = [StateAgent(x, 2) for x in range(2)]
+        obs = self.run_observer(agents, num_steps=7, chunk_steps=3)
+        self.assertEqual(7, obs.size)
+        self.assertEqual(7 * 2 * 2 * 4, os.path.getsize(os.path.join(self.path, 'trajectory.dat')))
+        reader = TrajectoryReader(self.path)
+        self.assertEqual(7, len(reader))
+        self.assertEqual([[6, 0], [6, 1]], reader[6].tolist())
+
+    def test_presized(self):
+        agents = [StateAgent(x, 2) for x in range(2)]
+        obs = TrajectoryObserver(self.path, num_steps=4, chunk_steps=1, dtype=np.float64)
+        obs.start(0, agents, None)
+        self.assertEqual((4, 2, 2), obs.data.shape)
+        obs.step(1, agents, None)
+        obs.stop(1, agents, None)
+        reader = TrajectoryReader(self.path)
+        self.assertEqual((2, 2, 2), reader.data.shape)
+        self.assertEqual(np.float64, reader.data.dtype)
+
+    def test_readable_before_stop(self):
+        agents = [StateAgent(x, 2) for x in range(2)]
+        obs = TrajectoryObserver(self.path, chunk_steps=2)
+        obs.start(0, agents, None)
+        self.assertEqual(1, len(TrajectoryReader(self.path)))
+        for t in range(1, 5):
+            obs.step(t, agents, None)
+        # a crash here leaves the first 4 states readable
+        reader = TrajectoryReader(self.path)
+        self.assertEqual([0, 1, 2, 3], reader.times.tolist())
+
+    def test_window(self):
+        agents = [StateAgent(x, 2) for x in range(2)]
+        self.run_observer(agents, num_steps=10)
+        times, states = TrajectoryReader(self.path).window(3, 6)
+        self.assertEqual([3, 4, 5], times.tolist())
+        self.assertEqual([3, 4, 5], states[:, 0, 0].tolist())
@@ -0,0 +1,62 @@
+# Copyright 2018, The Johns Hopkins University Applied Physics Laboratory LLC
+# All rights reserved.
+# Distributed under the terms of the Modified BSD License.
+
+from dworp.runner import *
+from dworp.agent import Agent
+from dworp.environment import NullEnvironment
+from dworp.observer import Observer
+from dworp.scheduling import BasicScheduler
+from dworp.simulation import BasicSimulation
+from dworp.time import BasicTime
+import unittest
+import numpy as np
+
+
+class Walker(Agent):
+    def __init__(self, agent_id, rng):
+        super().__init__(agent_id, 1)
+        self.rng = rng
+
+    def step(self, now, env):
+        self.state[0] += self.rng.uniform() + np.random.uniform()
+
+
+class NullObserver(Observer):
+    def step(self, now, agents, env):
+        pass
+
+
+def create(params, rng):
+    agents = [Walker(x, rng) for x in range(params['agents'])]
+    return BasicSimulation(agents, NullEnvironment(), BasicTime(5), BasicScheduler(), NullObserver())
+
+
+def measure(sim):
+    return sum(agent.state[0] for agent in sim.agents)
+
+
+class RunnerTest(unittest.TestCase):
+    def test_shapes(self):
+        runner = Runner(create, measure, max_workers=1, seed=5)
+        output = runner.run([{'agents': 1}, {'agents': 3}], 4)
+        self.assertEqual((2, 4), output.results.shape)
+        self.assertEqual((2, 4), output.timings.shape)
+        self.assertTrue(np.all(output.results[1] > output.results[0]))
+        # every run has its own stream
+        self.assertEqual(8, len(set(output.results.ravel().tolist())))
+
+    def test_without_measure(self):
+        output = Runner(create, max_workers=1).run([{'agents': 1}], 2)
+        self.assertEqual([[None, None]], output.results.tolist())
+
+    def test_parallel_matches_serial(self):
+        params = [{'agents': 2}, {'agents': 4}]
+        serial = Runner(create, measure, max_workers=1, seed=42).run(params, 3)
+        parallel = Runner(create, measure, max_workers=2, seed=42).run(params, 3)
+        np.testing.assert_array_equal(serial.results, parallel.results)
+
+    def test_rerun_with_seed(self):
+        output = Runner(create, measure, max_workers=1, seed=1).run([{'agents': 2}], 2)
+        result, _ = run_once(create, measure, {'agents': 2}, output.seeds[0][1])
+        self.assertEqual(output.results[0, 1], result)
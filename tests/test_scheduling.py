@@ -73,3 +73,306 @@ class FastBernoulliSchedulerTest(unittest.TestCase):
         scheduler = FastBernoulliScheduler(0.4, np.random.RandomState(), 2, 0, 5)
         scheduler.schedule = {2: [0], 3: [1], 4: [0, 1]}
         self.assertEqual([2, 3, 4], scheduler.get_times())
+
+    def test_next_time(self):
+        scheduler = FastBernoulliScheduler(0.4, np.random.RandomState(), 2, 0, 5)
+        scheduler.schedule = {2: [0], 3: [1], 4: [0, 1]}
+        self.assertEqual(2, scheduler.next_time())
+        scheduler.step(3, [], None)
+        self.assertEqual(4, scheduler.next_time())
+        scheduler.step(4, [], None)
+        self.assertIsNone(scheduler.next_time())
+
+
+class EventSchedulerTest(unittest.TestCase):
+    def test_order(self):
+        scheduler = EventScheduler()
+        scheduler.push(5, 1)
+        scheduler.push(2, 3)
+        scheduler.push(5, 0)
+        self.assertEqual(2, scheduler.next_time())
+        self.assertEqual([3], scheduler.step(2, [], None))
+        self.assertEqual([1, 0], scheduler.step(6, [], None))
+        self.assertIsNone(scheduler.next_time())
+
+    def test_push_many(self):
+        scheduler = EventScheduler()
+        scheduler.push_many([3, 1, 2], [0, 1, 2])
+        self.assertEqual(3, len(scheduler))
+        self.assertEqual([1, 2], scheduler.step(2, [], None))
+
+    def test_push_many_into_large_queue(self):
+        scheduler = EventScheduler()
+        scheduler.push_many(list(range(10, 20)), list(range(10)))
+        scheduler.push_many([15, 1], [10, 11])
+        self.assertEqual([11], scheduler.step(9, [], None))
+        self.assertEqual([0, 1, 2, 3, 4, 5, 10], scheduler.step(15, [], None))
+
+
+class StreamingBernoulliSchedulerTest(unittest.TestCase):
+    def test_arrival_time_distribution(self):
+        p = 0.4
+        scheduler = StreamingBernoulliScheduler(p, np.random.RandomState(), 1, window=7)
+        wait_times = []
+        current_wait = 0
+        for t in range(1, 20000):
+            current_wait += 1
+            if len(scheduler.step(t, ['mock agent'], None)):
+                wait_times.append(current_wait)
+                current_wait = 0
+
+        self.assertTrue(abs(1/p - np.mean(wait_times)) < 0.1)
+
+    def test_window_bounds_memory(self):
+        scheduler = StreamingBernoulliScheduler(0.5, np.random.RandomState(), 100, window=10)
+        for t in range(1, 100):
+            scheduler.step(t, [None] * 100, None)
+            self.assertLessEqual(len(scheduler.schedule), 10)
+
+    def test_remove(self):
+        scheduler = StreamingBernoulliScheduler(1, np.random.RandomState(), 3)
+        self.assertEqual([0, 1, 2], scheduler.step(1, [None] * 3, None).tolist())
+        scheduler.remove(1)
+        self.assertEqual([0, 2], scheduler.step(2, [None] * 3, None).tolist())
+
+    def test_add(self):
+        scheduler = StreamingBernoulliScheduler(1, np.random.RandomState(), 2)
+        scheduler.step(1, [None] * 2, None)
+        self.assertEqual([2], scheduler.add().tolist())
+        self.assertEqual([0, 1, 2], scheduler.step(2, [None] * 3, None).tolist())
+        # agents appended to the list are added automatically
+        self.assertEqual([0, 1, 2, 3], scheduler.step(3, [None] * 4, None).tolist())
+
+    def test_next_time_skips_empty_steps(self):
+        scheduler = StreamingBernoulliScheduler(0.001, np.random.RandomState(5), 1, window=10)
+        first = scheduler.next_arrivals[0]
+        self.assertEqual(first, scheduler.next_time())
+        self.assertEqual([0], scheduler.step(first, [None], None).tolist())
+        scheduler.remove(0)
+        self.assertIsNone(scheduler.next_time())
+
+    def test_shrunken_agents_are_not_scheduled(self):
+        scheduler = StreamingBernoulliScheduler(1, np.random.RandomState(1), 5)
+        self.assertEqual([0, 1, 2], scheduler.step(1, [None] * 3, None).tolist())
+
+
+class IndexedPriorityQueueTest(unittest.TestCase):
+    def test_update(self):
+        rng = np.random.RandomState(2)
+        times = rng.uniform(size=50).tolist()
+        queue = IndexedPriorityQueue(times)
+        for x in range(200):
+            index = rng.randint(0, 50)
+            times[index] = rng.uniform()
+            queue.update(index, times[index])
+            self.assertEqual((min(times), int(np.argmin(times))), queue.top())
+
+    def test_append(self):
+        queue = IndexedPriorityQueue([3, 2])
+        self.assertEqual(2, queue.append(1))
+        self.assertEqual((1, 2), queue.top())
+
+
+class NextReactionSchedulerTest(unittest.TestCase):
+    def test_rates(self):
+        scheduler = NextReactionScheduler([1, 4, 0], np.random.RandomState(1))
+        counts = np.bincount(scheduler.step(5000, None, None), minlength=3)
+        self.assertTrue(abs(counts[0] / 5000 - 1) < 0.1)
+        self.assertTrue(abs(counts[1] / 5000 - 4) < 0.2)
+        self.assertEqual(0, counts[2])
+
+    def test_time_order(self):
+        scheduler = NextReactionScheduler([1, 2, 3], np.random.RandomState(1))
+        times = []
+        while scheduler.next_time() < 10:
+            times.append(scheduler.next_time())
+            self.assertEqual(1, len(scheduler.step(times[-1], None, None)))
+        self.assertEqual(sorted(times), times)
+
+    def test_set_rate(self):
+        scheduler = NextReactionScheduler([1, 1], np.random.RandomState(1))
+        scheduler.set_rate(0, 0)
+        scheduler.set_rate(1, 10, now=0)
+        counts = np.bincount(scheduler.step(1000, None, None), minlength=2)
+        self.assertEqual(0, counts[0])
+        self.assertTrue(abs(counts[1] / 1000 - 10) < 0.5)
+        scheduler.remove(1)
+        self.assertIsNone(scheduler.next_time())
+
+    def test_from_agents(self):
+        class A:
+            pass
+
+        class B:
+            pass
+
+        scheduler = NextReactionScheduler.from_agents([A(), B(), A()], {A: 2, B: 0.5}, np.random.RandomState())
+        self.assertEqual([2, 0.5, 2], scheduler.rates)
+
+    def test_add(self):
+        scheduler = NextReactionScheduler([0], np.random.RandomState())
+        self.assertEqual(1, scheduler.add(5))
+        self.assertEqual([1], list(set(scheduler.step(10, None, None))))
+
+
+class SampleWithoutReplacementTest(unittest.TestCase):
+    def test_sparse(self):
+        rng = np.random.RandomState(4)
+        sample = sample_without_replacement(1000000, 10, rng)
+        self.assertEqual(10, len(set(sample.tolist())))
+        self.assertTrue(np.all((sample >= 0) & (sample < 1000000)))
+
+    def test_uniform(self):
+        rng = np.random.RandomState(4)
+        counts = np.zeros(40)
+        for x in range(4000):
+            sample = sample_without_replacement(40, 5, rng)
+            self.assertEqual(5, len(set(sample.tolist())))
+            counts[sample] += 1
+        self.assertTrue(np.all(np.abs(counts / 4000 - 5 / 40) < 0.03))
+
+    def test_all(self):
+        sample = sample_without_replacement(10, 10, np.random.RandomState())
+        self.assertEqual(list(range(10)), sorted(sample.tolist()))
+
+
+class WeightedSampleSchedulerTest(unittest.TestCase):
+    def test_distribution(self):
+        scheduler = WeightedSampleScheduler([1, 0, 3], 40000, np.random.RandomState(1))
+        counts = np.bincount(scheduler.step(0, None, None), minlength=3) / 40000
+        np.testing.assert_allclose([0.25, 0, 0.75], counts, atol=0.01)
+
+    def test_table_rebuilt_on_change(self):
+        scheduler = WeightedSampleScheduler([1, 1], 1000, np.random.RandomState(1))
+        scheduler.step(0, None, None)
+        scheduler.set_weight(0, 0)
+        self.assertEqual([1], np.unique(scheduler.step(1, None, None)).tolist())
+        self.assertEqual(2, scheduler.add(5))
+        self.assertEqual([1, 2], np.unique(scheduler.step(2, None, None)).tolist())
+        scheduler.set_weights([0, 0, 1])
+        self.assertEqual([2], np.unique(scheduler.step(3, None, None)).tolist())
+
+
+class EpochSampleSchedulerTest(unittest.TestCase):
+    def test_each_agent_once_per_epoch(self):
+        scheduler = EpochSampleScheduler(3, np.random.RandomState(1))
+        agents = [None] * 7
+        steps = [scheduler.step(t, agents, None).tolist() for t in range(3)]
+        self.assertEqual([3, 3, 1], [len(s) for s in steps])
+        self.assertEqual(list(range(7)), sorted(sum(steps, [])))
+        self.assertEqual(3, len(scheduler.step(3, agents, None)))
+
+
+class ColoringSchedulerTest(unittest.TestCase):
+    def ring(self, n):
+        return [[(i - 1) % n, (i + 1) % n] for i in range(n)]
+
+    def test_neighbors_in_different_batches(self):
+        neighbors = self.ring(9)
+        s = ColoringScheduler(neighbors, distance=1)
+        for i, adjacent in enumerate(neighbors):
+            for j in adjacent:
+                self.assertNotEqual(s.colors[i], s.colors[j])
+
+    def test_distance_2_separates_shared_neighbors(self):
+        neighbors = self.ring(9)
+        s = ColoringScheduler(neighbors)
+        for i in range(9):
+            self.assertNotEqual(s.colors[i], s.colors[(i + 2) % 9])
+        self.assertEqual(3, s.num_colors)
+
+    def test_one_sided_neighbors_are_symmetrized(self):
+        s = ColoringScheduler([[1], [], []], distance=1)
+        self.assertNotEqual(s.colors[0], s.colors[1])
+
+    def test_step_schedules_every_agent_once(self):
+        s = ColoringScheduler(self.ring(10), np.random.RandomState(4))
+        schedule = s.step(0, None, None)
+        self.assertEqual(10, len(schedule))
+        self.assertEqual(list(range(10)), sorted(schedule))
+
+    def test_from_grid(self):
+        from dworp.space import Grid
+        grid = Grid(3, 1)
+        agents = [mock.Mock() for x in range(3)]
+        for x, agent in enumerate(agents):
+            grid.add(agent, x, 0)
+        s = ColoringScheduler.from_grid(grid, agents, distance=1)
+        self.assertEqual(2, s.num_colors)
+        self.assertEqual(s.colors[0], s.colors[2])
+
+
+class ActiveSetSchedulerTest(unittest.TestCase):
+    def path(self, n):
+        from dworp.network import CSRNetwork
+        return CSRNetwork.from_edges([(i, i + 1) for i in range(n - 1)], n)
+
+    def test_first_step_schedules_everyone(self):
+        s = ActiveSetScheduler(self.path(4))
+        self.assertEqual([0, 1, 2, 3], s.step(0, [mock.Mock()] * 4, None).tolist())
+
+    def test_wakes_neighbors_of_changed(self):
+        agents = [mock.Mock(stable=None) for x in range(6)]
+        s = ActiveSetScheduler(self.path(6))
+        s.step(0, agents, None)
+        s.record_changes(0, agents, np.array([2]))
+        self.assertEqual([1, 2, 3], s.step(1, agents, None).tolist())
+        s.record_changes(1, agents, np.array([], dtype=int))
+        self.assertEqual([], s.step(2, agents, None).tolist())
+
+    def test_directed_network_wakes_in_neighbors(self):
+        from dworp.network import CSRNetwork
+        # agent 0 looks at agent 1, so a change to 1 wakes 0
+        agents = [mock.Mock(stable=True) for x in range(3)]
+        s = ActiveSetScheduler(CSRNetwork.from_edges([(0, 1)], 3, directed=True))
+        s.step(0, agents, None)
+        s.record_changes(0, agents, np.array([1]))
+        self.assertEqual([0], s.step(1, agents, None).tolist())
+
+    def test_unstable_agents_stay_awake(self):
+        agents = [mock.Mock(stable=None) for x in range(4)]
+        agents[3].stable = False
+        s = ActiveSetScheduler(self.path(4))
+        s.step(0, agents, None)
+        s.record_changes(0, agents, np.array([], dtype=int))
+        self.assertEqual([3], s.step(1, agents, None).tolist())
+
+    def test_added_agents_are_scheduled(self):
+        agents = [mock.Mock(stable=None) for x in range(2)]
+        s = ActiveSetScheduler(lambda indices: indices)
+        s.step(0, agents, None)
+        s.record_changes(0, agents, np.array([], dtype=int))
+        agents.append(mock.Mock())
+        self.assertEqual([2], s.step(1, agents, None).tolist())
+
+    def test_shuffles_with_rng(self):
+        s = ActiveSetScheduler(self.path(20), np.random.RandomState(7))
+        schedule = s.step(0, [mock.Mock()] * 20, None)
+        self.assertEqual(list(range(20)), sorted(schedule.tolist()))
+        self.assertNotEqual(list(range(20)), schedule.tolist())
+
+    def test_from_grid(self):
+        from dworp.space import Grid
+        grid = Grid(5, 1)
+        agents = [mock.Mock(agent_id=x, stable=True) for x in range(5)]
+        for x, agent in enumerate(agents):
+            grid.add(agent, x, 0)
+        s = ActiveSetScheduler.from_grid(grid, lambda i: (i, 0))
+        s.step(0, agents, None)
+        s.record_changes(0, agents, np.array([4]))
+        self.assertEqual([3], s.step(1, agents, None).tolist())
+
+    def test_from_grid_wakes_old_neighbors_of_moved_agent(self):
+        from dworp.space import Grid
+        grid = Grid(6, 1)
+        agents = [mock.Mock(agent_id=x, stable=True) for x in range(2)]
+        locations = {0: (0, 0), 1: (1, 0)}
+        for i, agent in enumerate(agents):
+            grid.add(agent, *locations[i])
+        s = ActiveSetScheduler.from_grid(grid, lambda i: locations[i])
+        s.step(0, agents, None)
+        grid.move(0, 0, 4, 0)
+        locations[0] = (4, 0)
+        s.record_changes(0, agents, np.array([], dtype=int))
+        self.assertEqual([0, 1], s.step(1, agents, None).tolist())
+
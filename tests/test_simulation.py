@@ -5,7 +5,11 @@
 from dworp.simulation import *
 import unittest
 import unittest.mock as mock
-from dworp.scheduling import BasicScheduler
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from dworp.agent import Agent, AgentStore, TwoStageAgent, BatchAgent
+from dworp.scheduling import BasicScheduler, RandomSampleScheduler, FastBernoulliScheduler, \
+    ColoringScheduler
 from dworp.time import Terminator, BasicTime
 
 
@@ -33,3 +37,235 @@ class BasicSimulationTest(unittest.TestCase):
         sim.run()
 
         self.assertEqual(2, observer.step.call_count)
+
+
+class AgentStoreSimulationTest(unittest.TestCase):
+    class Counter(Agent):
+        def step(self, now, env):
+            self.state[0] += 1
+
+    def test_agents_update_store(self):
+        agents = AgentStore(1, [self.Counter(x, 1) for x in range(5)])
+        sim = BasicSimulation(agents, mock.Mock(), BasicTime(3), BasicScheduler(), mock.Mock())
+
+        sim.run()
+
+        self.assertEqual(15, agents.state.sum())
+
+    class Follower(TwoStageAgent):
+        def step(self, now, env):
+            # copy the left neighbor, which should not see this time step's updates
+            self.next_state[0] = env.agents[self.agent_id - 1].state[0]
+
+    def test_two_stage_store_matches_two_stage_list(self):
+        results = []
+        for store in [False, True]:
+            agents = [self.Follower(x, 1) for x in range(6)]
+            agents[0].state[0] = 1
+            if store:
+                agents = AgentStore(1, agents, two_stage=True)
+            env = mock.Mock()
+            env.agents = agents
+            scheduler = RandomSampleScheduler(4, np.random.RandomState(7))
+            sim = TwoStageSimulation(agents, env, BasicTime(5), scheduler, mock.Mock())
+            sim.run()
+            results.append([agent.state[0] for agent in agents])
+        self.assertEqual(results[0], results[1])
+
+    class Keeper(TwoStageAgent):
+        def step(self, now, env):
+            self.next_state[:] = self.state
+
+    def test_environment_writes_to_unscheduled_agents_persist(self):
+        results = []
+        for store in [False, True]:
+            agents = [self.Keeper(x, 2) for x in range(4)]
+            if store:
+                agents = AgentStore(2, agents, two_stage=True)
+            env = mock.Mock()
+
+            def step(now, agents):
+                for agent in agents:
+                    agent.state[1] += 1
+            env.step.side_effect = step
+            scheduler = RandomSampleScheduler(1, np.random.RandomState(2))
+            sim = TwoStageSimulation(agents, env, BasicTime(4), scheduler, mock.Mock())
+            sim.run()
+            results.append([agent.state[1] for agent in agents])
+        self.assertEqual([4.0] * 4, results[0])
+        self.assertEqual(results[0], results[1])
+
+    class BatchFollower(BatchAgent, TwoStageAgent):
+        @classmethod
+        def step_batch(cls, now, env, agents, indices):
+            agents.next_state[indices, 0] = agents.state[indices - 1, 0]
+
+    def test_two_stage_batch_matches_scalar(self):
+        results = []
+        for cls in [self.Follower, self.BatchFollower]:
+            agents = [cls(x, 1) for x in range(6)]
+            agents[0].state[0] = 1
+            agents = AgentStore(1, agents, two_stage=True)
+            env = mock.Mock()
+            env.agents = agents
+            scheduler = RandomSampleScheduler(4, np.random.RandomState(7))
+            sim = TwoStageSimulation(agents, env, BasicTime(5), scheduler, mock.Mock())
+            sim.run()
+            results.append(agents.state[:, 0].tolist())
+        self.assertEqual(results[0], results[1])
+
+    class Spreader(Agent):
+        def step(self, now, env):
+            # move the state of the agent to its right neighbor
+            right = env.agents[(self.agent_id + 1) % len(env.agents)]
+            right.state[0] += self.state[0]
+            self.state[0] = 0
+
+    def test_coloring_batches_with_executor_match_sequential(self):
+        neighbors = [[(i - 1) % 6, (i + 1) % 6] for i in range(6)]
+        results = []
+        for executor in [None, ThreadPoolExecutor(max_workers=3)]:
+            agents = AgentStore(1, [self.Spreader(x, 1) for x in range(6)])
+            agents.state[:, 0] = np.arange(6)
+            env = mock.Mock()
+            env.agents = agents
+            scheduler = ColoringScheduler(neighbors)
+            sim = BasicSimulation(agents, env, BasicTime(4), scheduler, mock.Mock(), executor=executor)
+            sim.run()
+            results.append(agents.state[:, 0].tolist())
+            if executor:
+                executor.shutdown()
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(15, sum(results[1]))
+
+
+class ChangeTrackingTest(unittest.TestCase):
+    class Copier(TwoStageAgent):
+        def step(self, now, env):
+            # copy the left neighbor, so the first agent's state spreads right one agent per step
+            if self.agent_id > 0:
+                self.next_state[0] = env.agents[self.agent_id - 1].state[0]
+
+    class Recorder(Terminator):
+        def __init__(self):
+            self.changes = []
+
+        def record_changes(self, now, agents, changed):
+            self.changes.append(changed.tolist())
+
+        def test(self, now, agents, env):
+            return False
+
+    def run_copiers(self, store):
+        agents = [self.Copier(x, 1) for x in range(4)]
+        agents[0].state[0] = agents[0].next_state[0] = 1
+        if store:
+            agents = AgentStore(1, agents, two_stage=True)
+        env = mock.Mock()
+        env.agents = agents
+        terminator = self.Recorder()
+        sim = TwoStageSimulation(agents, env, BasicTime(4), BasicScheduler(), mock.Mock(), terminator)
+        sim.run()
+        return terminator.changes
+
+    def test_two_stage_changes(self):
+        expected = [[1], [2], [3], []]
+        self.assertEqual(expected, self.run_copiers(False))
+        self.assertEqual(expected, self.run_copiers(True))
+
+    def test_one_stage_changes(self):
+        class Once(Agent):
+            def step(self, now, env):
+                if now == self.agent_id:
+                    self.state[0] += 1
+
+        agents = [Once(x, 1) for x in range(5)]
+        sim = BasicSimulation(agents, mock.Mock(), BasicTime(3), BasicScheduler(), mock.Mock(),
+                              track_changes=True)
+        sim.run()
+        self.assertEqual([3], sim.changed.tolist())
+
+    def test_not_tracked_by_default(self):
+        agents = [mock.Mock() for x in range(2)]
+        sim = BasicSimulation(agents, mock.Mock(), BasicTime(2), BasicScheduler(), mock.Mock())
+        sim.run()
+        self.assertIsNone(sim.changed)
+
+    def test_active_set_scheduler_steps_only_near_changes(self):
+        from dworp.network import CSRNetwork
+        from dworp.scheduling import ActiveSetScheduler
+        stepped = []
+
+        class Copier(Agent):
+            stable = True
+
+            def step(self, now, env):
+                stepped.append((now, self.agent_id))
+                if self.agent_id > 0:
+                    self.state[0] = env.agents[self.agent_id - 1].state[0]
+
+        agents = [Copier(x, 1) for x in range(5)]
+        agents[0].state[0] = 1
+        env = mock.Mock()
+        env.agents = agents
+        network = CSRNetwork.from_edges([(i, i - 1) for i in range(1, 5)], 5, directed=True)
+        sim = BasicSimulation(agents, env, BasicTime(4), ActiveSetScheduler(network), mock.Mock())
+        sim.run()
+        # the state spreads right through all the agents at the first step
+        self.assertEqual(5, len([s for s in stepped if s[0] == 1]))
+        self.assertEqual([2, 3, 4], [s[1] for s in stepped if s[0] == 2])
+        self.assertEqual([], [s for s in stepped if s[0] > 2])
+
+
+class EventSimulationTest(unittest.TestCase):
+    class Periodic(Agent):
+        def __init__(self, agent_id, period):
+            super().__init__(agent_id, 1)
+            self.period = period
+
+        def step(self, now, env):
+            self.state[0] += 1
+            return now + self.period
+
+    def test_skips_empty_times(self):
+        agents = [self.Periodic(0, 100), self.Periodic(1, 250)]
+        observer = mock.Mock()
+        sim = EventSimulation(agents, mock.Mock(), None, observer, stop=1000)
+        sim.schedule(100, 0)
+        sim.schedule(250, 1)
+
+        sim.run()
+
+        times = [c[0][0] for c in observer.step.call_args_list]
+        self.assertEqual([100, 200, 250, 300, 400, 500, 600, 700, 750, 800, 900, 1000], times)
+        self.assertEqual([10, 4], [agent.state[0] for agent in agents])
+
+    def test_stops_when_queue_empty(self):
+        agent = mock.Mock()
+        agent.step.return_value = None
+        sim = EventSimulation([agent], mock.Mock(), None, mock.Mock())
+        sim.schedule(5, 0)
+        sim.run()
+        self.assertEqual(1, agent.step.call_count)
+
+    def test_batch_agents_reschedule(self):
+        class Batch(BatchAgent):
+            @classmethod
+            def step_batch(cls, now, env, agents, indices):
+                agents.state[indices, 0] += 1
+                return now + 1.0 + indices
+
+        agents = AgentStore(1, [Batch(x, 1) for x in range(2)])
+        sim = EventSimulation(agents, mock.Mock(), None, mock.Mock(), stop=4)
+        sim.scheduler.push_many([1, 1], [0, 1])
+        sim.run()
+        np.testing.assert_array_equal([4, 2], agents.state[:, 0])
+
+    def test_with_fast_bernoulli_scheduler(self):
+        scheduler = FastBernoulliScheduler(0.01, np.random.RandomState(3), 2, 0, 1000)
+        observer = mock.Mock()
+        agents = [mock.Mock(**{'step.return_value': None}) for x in range(2)]
+        sim = EventSimulation(agents, mock.Mock(), scheduler, observer)
+        sim.run()
+        times = [c[0][0] for c in observer.step.call_args_list]
+        self.assertEqual(scheduler.get_times(), times)
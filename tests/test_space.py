@@ -5,6 +5,7 @@
 from dworp.space import *
 import unittest
 import unittest.mock as mock
+import numpy as np
 
 
 class GridTest(unittest.TestCase):
@@ -39,3 +40,211 @@ class GridTest(unittest.TestCase):
 
         self.assertEqual(2, len(n))
         self.assertSetEqual(set(neighbors), set(n))
+
+    def test_ids_and_layers_follow_agent(self):
+        grid = Grid(4, 4, {'color': int})
+        agent = mock.Mock(agent_id=7)
+        grid.add(agent, 1, 1, color=2)
+        grid.move(1, 1, 3, 2)
+        self.assertEqual(Grid.EMPTY, grid.ids[1, 1])
+        self.assertEqual(0, grid.layers['color'][1, 1])
+        self.assertEqual(7, grid.ids[3, 2])
+        self.assertEqual(2, grid.layers['color'][3, 2])
+        self.assertEqual(agent, grid.get(3, 2))
+
+    def test_non_integer_id(self):
+        grid = Grid(2, 2)
+        grid.add(mock.Mock(), 0, 0)
+        self.assertEqual(Grid.NO_ID, grid.ids[0, 0])
+        self.assertTrue(grid.occupied(0, 0))
+
+    def test_neighbor_count(self):
+        grid = Grid(3, 3)
+        grid.add(mock.Mock(), 0, 0)
+        grid.add(mock.Mock(), 2, 2)
+        counts = grid.neighbor_count()
+        self.assertEqual(2, counts[1, 1])
+        self.assertEqual(0, counts[0, 0])
+        self.assertEqual(1, counts[0, 1])
+        self.assertEqual(1, grid.neighbor_count(MooreNeighborhood(torus=True))[0, 0])
+
+    def test_similar_neighbors_matches_neighbors(self):
+        rng = np.random.RandomState(5)
+        grid = Grid(6, 5, {'color': int})
+        for x in range(6):
+            for y in range(5):
+                if rng.uniform() < 0.7:
+                    color = rng.randint(2)
+                    grid.add(mock.Mock(color=color), x, y, color=color)
+        similar, total = grid.similar_neighbors('color')
+        for x in range(6):
+            for y in range(5):
+                if grid.occupied(x, y):
+                    neighbors = grid.neighbors(x, y)
+                    expected = sum(n.color == grid.get(x, y).color for n in neighbors)
+                    self.assertEqual(expected, similar[x, y])
+                    self.assertEqual(len(neighbors), total[x, y])
+                    self.assertEqual((expected, len(neighbors)), grid.similar_neighbors_at('color', x, y))
+
+    def test_empty_index_follows_add_remove_move(self):
+        grid = Grid(3, 2)
+        grid.add(mock.Mock(), 0, 0)
+        grid.add(mock.Mock(), 2, 1)
+        grid.move(2, 1, 1, 0)
+        grid.remove(0, 0)
+        expected = {(x, y) for x in range(3) for y in range(2) if not grid.occupied(x, y)}
+        self.assertEqual(5, grid.num_empty)
+        cells = grid.empties[:grid.num_empty]
+        self.assertSetEqual(expected, {(c // 2, c % 2) for c in cells.tolist()})
+
+    def test_random_empty(self):
+        grid = Grid(2, 2)
+        for x, y in [(0, 0), (0, 1), (1, 1)]:
+            grid.add(mock.Mock(), x, y)
+        self.assertEqual((1, 0), grid.random_empty(np.random.RandomState(1)))
+        grid.add(mock.Mock(), 1, 0)
+        self.assertIsNone(grid.random_empty(np.random.RandomState(1)))
+
+    def test_random_empties(self):
+        grid = Grid(10, 10)
+        for x in range(10):
+            grid.add(mock.Mock(), x, 3)
+        xs, ys = grid.random_empties(20, np.random.RandomState(2))
+        self.assertEqual(20, len(set(zip(xs.tolist(), ys.tolist()))))
+        self.assertFalse(np.any(grid.occupancy()[xs, ys]))
+
+    def test_neighbors_of_pads_outside_cells(self):
+        grid = Grid(4, 3)
+        cells = grid.neighbors_of(np.array([0, 1]), np.array([0, 1]))
+        self.assertEqual((2, 8), cells.shape)
+        self.assertEqual(5, np.count_nonzero(cells[0] == -1))
+        self.assertSetEqual({0, 1, 2, 3, 5, 6, 7, 8}, set(cells[1].tolist()))
+
+    def test_neighbors_with_von_neumann_torus(self):
+        grid = Grid(5, 5, neighborhood=VonNeumannNeighborhood(torus=True))
+        agents = {(x, y): mock.Mock() for x, y in [(4, 0), (0, 4), (1, 1)]}
+        for (x, y), agent in agents.items():
+            grid.add(agent, x, y)
+        self.assertSetEqual({agents[(4, 0)], agents[(0, 4)]}, set(grid.neighbors(0, 0)))
+
+
+class NeighborhoodTest(unittest.TestCase):
+    def test_sizes(self):
+        self.assertEqual(8, len(MooreNeighborhood()))
+        self.assertEqual(24, len(MooreNeighborhood(2)))
+        self.assertEqual(4, len(VonNeumannNeighborhood()))
+        self.assertEqual(12, len(VonNeumannNeighborhood(2)))
+
+    def test_table_is_cached(self):
+        n = MooreNeighborhood(torus=True)
+        self.assertIs(n.table(3, 4), n.table(3, 4))
+        self.assertFalse(np.any(n.table(3, 4) < 0))
+
+    def test_cells_match_table_without_building_it(self):
+        for neighborhood in [MooreNeighborhood(2), VonNeumannNeighborhood(torus=True)]:
+            for x, y in [(0, 0), (2, 3), (4, 6)]:
+                cells = neighborhood.cells(x, y, 5, 7)
+                self.assertEqual({}, neighborhood.tables)
+                row = neighborhood.table(5, 7)[x * 7 + y]
+                self.assertEqual(sorted(row[row >= 0].tolist()), sorted(cells.tolist()))
+                neighborhood.tables.clear()
+        self.assertEqual(np.int32, MooreNeighborhood().table(3, 3).dtype)
+
+    def test_grid_neighbors_do_not_build_table(self):
+        grid = Grid(100, 100)
+        grid.add(mock.Mock(), 1, 1)
+        self.assertEqual(1, len(grid.neighbors(0, 0)))
+        self.assertEqual({}, grid.neighborhood.tables)
+
+    def test_neighbor_sum_matches_table(self):
+        rng = np.random.RandomState(3)
+        values = rng.randint(0, 5, size=(6, 7))
+        for neighborhood in [MooreNeighborhood(2), VonNeumannNeighborhood(3, torus=True),
+                             Neighborhood([(1, 0), (2, 2)])]:
+            grid = Grid(6, 7, neighborhood=neighborhood)
+            table = neighborhood.table(6, 7)
+            padded = np.append(values.ravel(), 0)
+            expected = padded[table].sum(axis=1).reshape(6, 7)
+            np.testing.assert_array_equal(expected, grid.neighbor_sum(values))
+
+
+class FieldLayerTest(unittest.TestCase):
+    def test_growback_is_capped(self):
+        field = FieldLayer(2, 2, value=[[0, 3], [1, 4]], capacity=[[4, 4], [1, 4]], dtype=int)
+        field.growback(2)
+        np.testing.assert_array_equal([[2, 4], [1, 4]], field.values)
+
+    def test_decay(self):
+        field = FieldLayer(2, 3, value=10)
+        field.decay(0.1)
+        np.testing.assert_allclose(np.full((2, 3), 9), field.values)
+
+    def test_diffuse_conserves_total(self):
+        field = FieldLayer(5, 4)
+        field.values[0, 0] = 8
+        field.diffuse(0.5)
+        self.assertAlmostEqual(8, field.values.sum())
+        # corner keeps the shares of its 5 missing neighbors
+        self.assertAlmostEqual(4 + 5 * 0.5, field.values[0, 0])
+        self.assertAlmostEqual(0.5, field.values[1, 1])
+
+    def test_diffuse_on_torus(self):
+        field = FieldLayer(4, 4, neighborhood=VonNeumannNeighborhood(torus=True))
+        field.values[0, 0] = 4
+        field.diffuse(1)
+        self.assertAlmostEqual(1, field.values[3, 0])
+        self.assertAlmostEqual(0, field.values[0, 0])
+
+    def test_harvest(self):
+        field = FieldLayer.from_grid(Grid(3, 3), value=5)
+        taken = field.harvest(np.array([0, 2]), np.array([1, 2]), amount=np.array([2, 7]))
+        np.testing.assert_array_equal([2, 5], taken)
+        self.assertEqual(3, field.values[0, 1])
+        self.assertEqual(0, field.values[2, 2])
+
+
+class ContinuousSpaceTest(unittest.TestCase):
+    def brute_force(self, space, radius):
+        positions = space.positions
+        d = space.distance(positions[:, np.newaxis], positions[np.newaxis])
+        np.fill_diagonal(d, np.inf)
+        d[:, ~space.active] = np.inf
+        return [np.flatnonzero(row <= radius).tolist() for row in d]
+
+    def check(self, space, radius):
+        offsets, neighbors = space.query_agents(radius)
+        expected = self.brute_force(space, radius)
+        for i in range(len(space)):
+            self.assertEqual(expected[i], sorted(neighbors[offsets[i]:offsets[i + 1]].tolist()))
+
+    def test_query_agents_on_torus(self):
+        space = ContinuousSpace((20, 10), 2, torus=True)
+        space.extend(np.random.RandomState(1).uniform(0, 10, size=(200, 2)) * [2, 1])
+        self.check(space, 2)
+
+    def test_query_agents_bounded_3d(self):
+        space = ContinuousSpace((5, 5, 5), 1)
+        space.extend(np.random.RandomState(2).uniform(0, 5, size=(150, 3)))
+        self.check(space, 1.5)
+
+    def test_torus_smaller_than_radius_counts_once(self):
+        space = ContinuousSpace((4, 4), 3, torus=True)
+        space.extend([[0.5, 0.5], [3.5, 3.5], [2, 2]])
+        self.check(space, 5)
+
+    def test_move_and_remove(self):
+        space = ContinuousSpace((10, 10), 1, torus=True)
+        a = space.add((1, 1))
+        b = space.add((5, 5))
+        self.assertEqual([a], space.neighbors((2, 1), 1).tolist())
+        space.move(b, (11.5, 1))
+        self.assertEqual([a, b], sorted(space.neighbors((2, 1), 1).tolist()))
+        space.remove(a)
+        self.assertEqual([b], space.neighbors((2, 1), 1).tolist())
+
+    def test_query_points(self):
+        space = ContinuousSpace((10, 10), 2)
+        space.extend([[1, 1], [9, 9]])
+        offsets, neighbors = space.query([[0, 0], [5, 5], [8, 8]], 2)
+        np.testing.assert_array_equal([0, 1, 1, 2], offsets)
+        np.testing.assert_array_equal([0, 1], neighbors)
@@ -0,0 +1,169 @@
+# Copyright 2018, The Johns Hopkins University Applied Physics Laboratory LLC
+# All rights reserved.
+# Distributed under the terms of the Modified BSD License.
+
+from dworp.sweep import *
+from dworp.runner import Runner
+from dworp.agent import Agent
+from dworp.environment import NullEnvironment
+from dworp.observer import Observer
+from dworp.scheduling import BasicScheduler
+from dworp.simulation import BasicSimulation
+from dworp.time import BasicTime, InfiniteTime
+import os
+import tempfile
+import time
+import unittest
+import numpy as np
+
+
+class Walker(Agent):
+    def __init__(self, agent_id, rng):
+        super().__init__(agent_id, 1)
+        self.rng = rng
+
+    def step(self, now, env):
+        self.state[0] += self.rng.uniform()
+
+
+class NullObserver(Observer):
+    def step(self, now, agents, env):
+        pass
+
+
+def create(params, rng):
+    if params['agents'] < 0:
+        raise ValueError("bad number of agents")
+    time = InfiniteTime() if params['agents'] == 0 else BasicTime(3)
+    agents = [Walker(x, rng) for x in range(params['agents'])]
+    return BasicSimulation(agents, NullEnvironment(), time, BasicScheduler(), NullObserver())
+
+
+def create_or_die(params, rng):
+    if params['agents'] == 0:
+        # kill the worker process
+        os._exit(1)
+    return create(params, rng)
+
+
+def create_or_hang(params, rng):
+    if params['agents'] == 0:
+        time.sleep(60)
+    return create(params, rng)
+
+
+def measure(sim):
+    return float(sum(agent.state[0] for agent in sim.agents))
+
+
+class FullFactorialDesignTest(unittest.TestCase):
+    def test(self):
+        design = FullFactorialDesign({'features': [5, 10], 'traits': [5, 10, 15]})
+        points = design.points()
+        self.assertEqual(6, len(design))
+        self.assertEqual({'features': 5, 'traits': 5}, points[0])
+        self.assertEqual({'features': 10, 'traits': 15}, points[-1])
+
+
+class LatinHypercubeDesignTest(unittest.TestCase):
+    def test_one_sample_per_interval(self):
+        design = LatinHypercubeDesign({'a': (0, 10), 'b': (-1, 1)}, 10, np.random.RandomState(3))
+        a = [p['a'] for p in design.points()]
+        b = [p['b'] for p in design.points()]
+        self.assertEqual(list(range(10)), sorted(int(x) for x in a))
+        self.assertEqual(list(range(10)), sorted(int((x + 1) * 5) for x in b))
+
+
+class SobolDesignTest(unittest.TestCase):
+    def test_first_points(self):
+        design = SobolDesign({'a': (0, 1), 'b': (0, 1), 'c': (0, 2)}, 4)
+        samples = [[p['a'], p['b'], p['c']] for p in design.points()]
+        np.testing.assert_array_almost_equal(
+            [[0, 0, 0], [0.5, 0.5, 1], [0.75, 0.25, 0.5], [0.25, 0.75, 1.5]], samples)
+
+    def test_skip(self):
+        design = SobolDesign({'a': (0, 1)}, 2, skip=1)
+        self.assertEqual([0.5, 0.75], [p['a'] for p in design.points()])
+
+    def test_stratified(self):
+        design = SobolDesign({str(x): (0, 1) for x in range(21)}, 256)
+        samples = np.array([list(p.values()) for p in design.points()])
+        # every dimension of the first 2^k points has one point in each interval of width 2^-k
+        for dim in range(21):
+            self.assertEqual(list(range(256)), sorted((samples[:, dim] * 256).astype(int).tolist()))
+
+
+class ResultTableTest(unittest.TestCase):
+    def test_columns(self):
+        table = ResultTable(3)
+        table.append({'run': 0, 'status': 'ok', 'result': 1.5})
+        table.append({'run': 1, 'status': 'error', 'message': 'failed'})
+        self.assertEqual(2, len(table))
+        np.testing.assert_array_equal([0, 1], table['run'])
+        self.assertTrue(np.isnan(table['result'][1]))
+        self.assertEqual([None, 'failed'], table['message'].tolist())
+
+    def test_upcast(self):
+        table = ResultTable(2)
+        table.append({'x': 1})
+        table.append({'x': 2.5})
+        np.testing.assert_array_equal([1, 2.5], table['x'])
+
+    def test_save(self):
+        table = ResultTable(2)
+        table.append({'run': 0, 'result': 2.0, 'message': None})
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'table.npz')
+            table.save(path)
+            data = np.load(path)
+            self.assertEqual([2.0], data['result'].tolist())
+
+
+class SweepTest(unittest.TestCase):
+    def test_records_failures(self):
+        sweep = Sweep(create, measure, max_workers=1, seed=1, timeout=0.2)
+        table = sweep.run([{'agents': 2}, {'agents': -1}, {'agents': 0}], replicates=2)
+        self.assertEqual(6, len(table))
+        status = dict(zip(table['run'].tolist(), table['status'].tolist()))
+        self.assertEqual(['ok', 'ok', 'error', 'error', 'timeout', 'timeout'], [status[x] for x in range(6)])
+        self.assertIn('bad number', table['message'][2])
+
+    def test_longest_first(self):
+        sweep = Sweep(create, measure, max_workers=1, cost=lambda p: p['agents'])
+        table = sweep.run(FullFactorialDesign({'agents': [1, 3, 2]}))
+        self.assertEqual([3, 2, 1], table['agents'].tolist())
+        self.assertEqual([1, 2, 0], table['param_set'].tolist())
+
+    def test_parallel(self):
+        design = FullFactorialDesign({'agents': [1, 2]})
+        serial = Sweep(create, measure, max_workers=1, seed=9).run(design, 2)
+        parallel = Sweep(create, measure, max_workers=2, seed=9).run(design, 2)
+        order = np.argsort(parallel['run'])
+        np.testing.assert_array_equal(serial['result'], parallel['result'][order])
+
+    def test_saves_table(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'sweep.npz')
+            Sweep(create, measure, max_workers=1).run([{'agents': 1}], 3, path=path, save_every=2)
+            self.assertEqual(3, len(np.load(path)['status']))
+
+    def test_dead_worker_only_fails_its_run(self):
+        sweep = Sweep(create_or_die, measure, max_workers=2, seed=3)
+        table = sweep.run([{'agents': 1}, {'agents': 0}, {'agents': 2}], replicates=3)
+        status = dict(zip(table['run'].tolist(), table['status'].tolist()))
+        self.assertEqual(['ok'] * 3 + ['error'] * 3 + ['ok'] * 3, [status[x] for x in range(9)])
+        self.assertIn('worker process died', table['message'][table['status'] == 'error'][0])
+
+    def test_uses_runner(self):
+        sweep = Sweep(create, measure, max_workers=1, seed=4)
+        self.assertIsInstance(sweep.runner, Runner)
+        self.assertEqual(4, sweep.runner.seed)
+
+    def test_hung_worker_is_killed(self):
+        sweep = Sweep(create_or_hang, measure, max_workers=2, seed=3, timeout=0.5, grace=0.2)
+        start = time.perf_counter()
+        table = sweep.run([{'agents': 1}, {'agents': 0}, {'agents': 2}], replicates=2)
+        self.assertLess(time.perf_counter() - start, 10)
+        status = dict(zip(table['run'].tolist(), table['status'].tolist()))
+        self.assertEqual(['ok', 'ok', 'timeout', 'timeout', 'ok', 'ok'], [status[x] for x in range(6)])
+
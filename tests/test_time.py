@@ -4,6 +4,9 @@
 
 from dworp.time import *
 import unittest
+import unittest.mock as mock
+import numpy as np
+from dworp.network import CSRNetwork
 
 
 class BasicTimeTest(unittest.TestCase):
@@ -44,3 +47,72 @@ class ScheduledTimeTest(unittest.TestCase):
         times = list(time)
         self.assertEqual(5, len(times))
         self.assertEqual(9, times[-1])
+
+
+class EventTimeTest(unittest.TestCase):
+    def test(self):
+        scheduler = mock.Mock()
+        scheduler.next_time.side_effect = [3, 10, 12, None]
+        times = list(EventTime(scheduler, stop=11))
+        self.assertEqual([3, 10], times)
+
+
+class DeadlineTerminatorTest(unittest.TestCase):
+    def test_expired(self):
+        term = DeadlineTerminator(-1)
+        self.assertTrue(term.test(1, [], None))
+        self.assertTrue(term.expired)
+
+    def test_wrapped_terminator(self):
+        inner = mock.create_autospec(spec=Terminator)
+        inner.test.return_value = True
+        term = DeadlineTerminator(60, inner)
+        self.assertTrue(term.test(1, [], None))
+        self.assertFalse(term.expired)
+
+    def test_forwards_changes(self):
+        inner = StableTerminator()
+        t = DeadlineTerminator(60, inner)
+        self.assertTrue(t.tracks_changes)
+        self.assertFalse(DeadlineTerminator(60).tracks_changes)
+        t.record_changes(1, [], [])
+        self.assertEqual(1, inner.stable_steps)
+
+
+class StableTerminatorTest(unittest.TestCase):
+    def test_stops_after_steps_without_changes(self):
+        t = StableTerminator(2)
+        self.assertTrue(t.tracks_changes)
+        self.assertFalse(NullTerminator().tracks_changes)
+        results = []
+        for changed in [[1], [], [3], [], []]:
+            t.record_changes(0, None, np.array(changed, dtype=int))
+            results.append(t.test(0, None, None))
+        self.assertEqual([False, False, False, False, True], results)
+
+
+class EdgeTerminatorTest(unittest.TestCase):
+    @staticmethod
+    def different(states1, states2):
+        return np.any(states1 != states2, axis=1)
+
+    def test_checks_edges_of_changed_agents(self):
+        agents = [mock.Mock(state=np.array([x])) for x in [1, 1, 2]]
+        env = mock.Mock(network=CSRNetwork.from_edges([(0, 1), (1, 2)]))
+        t = EdgeTerminator(self.different)
+        self.assertFalse(t.test(0, agents, env))
+        self.assertEqual(2, t.num_active)
+        agents[2].state = np.array([1])
+        t.record_changes(1, agents, np.array([2]))
+        self.assertTrue(t.test(1, agents, env))
+        agents[0].state = np.array([3])
+        t.record_changes(2, agents, np.array([0]))
+        self.assertFalse(t.test(2, agents, env))
+
+    def test_directed_edges_into_changed_agent(self):
+        agents = mock.Mock(state=np.array([[1], [2]]))
+        t = EdgeTerminator(self.different, CSRNetwork.from_edges([(0, 1)], directed=True))
+        self.assertFalse(t.test(0, agents, None))
+        agents.state[1] = 1
+        t.record_changes(1, agents, np.array([1]))
+        self.assertTrue(t.test(1, agents, None))